@@ -0,0 +1,140 @@
+"""
+Live table size and dashboard latency before and after ``archive_orders``.
+
+    python benchmarks/bench_archive.py --old 5000 --recent 200
+
+Runs in a subprocess against a throw-away SQLite database: ``--old``
+completed / cancelled orders from last year, ``--recent`` open orders from
+today, one line and one payment each. Pages are timed through the Django test
+client (median of ``--rounds``) before and after archiving.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = {
+    "admin dashboard": ("admin", "/dashboard/"),
+    "staff dashboard": ("staff", "/dashboard/"),
+    "orders page": ("student", "/orders/"),
+}
+
+
+def setup_django():
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.ALLOWED_HOSTS = ["testserver"]
+
+
+def seed(old, recent):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from my_canteen.models import Category, MenuItem, Order, OrderItem, Payment
+
+    users = {}
+    for role in ("admin", "staff", "student"):
+        users[role] = User.objects.create_user(f"bench_{role}", password="x")
+        profile = users[role].userprofile  # save through the cached instance: login re-saves it
+        profile.role, profile.email_verified = role, True
+        profile.save()
+    item = MenuItem.objects.create(name="Bench item", price=50, category=Category.objects.create(name="Bench"))
+
+    statuses = ["completed"] * 9 + ["cancelled"]
+    orders = Order.objects.bulk_create(
+        [
+            Order(user=users["student"], total_price=50, address="x", status=statuses[i % 10], payment_status="paid")
+            for i in range(old)
+        ]
+        + [Order(user=users["student"], total_price=50, address="x", status="accepted") for _ in range(recent)],
+        batch_size=1000,
+    )
+    OrderItem.objects.bulk_create(
+        [OrderItem(order=o, item=item, quantity=1, unit_price=50) for o in orders], batch_size=1000
+    )
+    Payment.objects.bulk_create(
+        [Payment(order=o, method="cash", amount=50, status="paid") for o in orders], batch_size=1000
+    )
+    # auto_now_add ignores explicit values, so age the old orders afterwards
+    last_year = timezone.now() - timedelta(days=365)
+    Order.objects.filter(id__in=[o.id for o in orders[:old]]).update(created_at=last_year)
+    return users
+
+
+def timed(client, path, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        assert client.get(path).status_code == 200
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure(clients, rounds):
+    from my_canteen import archive
+
+    sizes = archive.table_sizes()
+    print("  " + ", ".join(f"{name}: {live} live / {cold} archived" for name, (live, cold) in sizes.items()))
+    for label, (role, path) in PAGES.items():
+        print(f"  {label:16} {timed(clients[role], path, rounds):8.1f} ms")
+
+
+def run(old, recent, rounds):
+    setup_django()
+    from django.core.management import call_command
+    from django.test import Client
+
+    from my_canteen import archive
+
+    call_command("migrate", verbosity=0)
+    users = seed(old, recent)
+    clients = {}
+    for role, user in users.items():
+        clients[role] = Client()
+        clients[role].force_login(user)
+
+    print("before:")
+    measure(clients, rounds)
+    started = time.perf_counter()
+    moved = 0
+    while count := archive.archive_batch(archive.cutoff()):
+        moved += count
+    print(f"archived {moved} orders in {time.perf_counter() - started:.2f}s")
+    print("after:")
+    measure(clients, rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--old", type=int, default=5000)
+    parser.add_argument("--recent", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--run", action="store_true", help="run in-process against CANTEEN_DB_NAME")
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.old, args.recent, args.rounds)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "CANTEEN_DB_NAME": str(Path(tmp) / "bench.sqlite3")}
+        subprocess.run(
+            [sys.executable, __file__, "--run", "--old", str(args.old),
+             "--recent", str(args.recent), "--rounds", str(args.rounds)],
+            env=env, check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
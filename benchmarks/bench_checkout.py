@@ -0,0 +1,134 @@
+"""
+Concurrent checkout throughput under each database profile.
+
+    python benchmarks/bench_checkout.py --threads 8 --orders 400
+
+Every profile runs in its own subprocess against a throw-away database:
+
+- ``sqlite-default``: journal_mode=DELETE, no busy timeout tuning, reconnect per request
+- ``sqlite-tuned``:   WAL + pragmas + BEGIN IMMEDIATE + persistent connections
+- ``postgres-pool``:  only when CANTEEN_PG_NAME is set (psycopg pool)
+
+Each worker thread logs in as its own user and POSTs cash checkouts through the
+Django test client, so the full view + ORM path is exercised.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROFILES = {
+    "sqlite-default": {"CANTEEN_DB_ENGINE": "sqlite", "CANTEEN_SQLITE_TUNING": "0", "CANTEEN_CONN_MAX_AGE": "0"},
+    "sqlite-tuned": {"CANTEEN_DB_ENGINE": "sqlite", "CANTEEN_SQLITE_TUNING": "1"},
+    "postgres-pool": {"CANTEEN_DB_ENGINE": "postgres", "CANTEEN_PG_POOL": "1"},
+}
+
+
+def setup_django():
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    settings.ALLOWED_HOSTS = ["testserver"]
+    # pickup slots all day with room for every bench order
+    settings.CANTEEN_PICKUP_HOURS = (0, 24)
+    settings.CANTEEN_SLOT_CAPACITY = 10**9
+    # measure the database, not the admission gates (my_canteen/admission.py)
+    settings.CANTEEN_ADMISSION = {}
+
+
+def run_profile(threads, orders):
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+
+    from my_canteen import slots
+    from my_canteen.models import Category, MenuItem
+
+    call_command("migrate", verbosity=0)
+    cat = Category.objects.create(name="Bench")
+    items = [
+        MenuItem.objects.create(name=f"Bench item {i}", price=50, stock=10**6, category=cat)
+        for i in range(5)
+    ]
+    users = [User.objects.create_user(f"bench{i}", password="x") for i in range(threads)]
+    slot_ids = [row["id"] for row in slots.open_slots(1)]
+    connection.close()
+
+    per_thread = orders // threads
+    ok, failed = [0], [0]
+    lock = threading.Lock()
+
+    def worker(idx):
+        client = Client()
+        client.force_login(users[idx])
+        for n in range(per_thread):
+            item = items[(idx + n) % len(items)]
+            session = client.session
+            session["cart"] = {str(item.id): 1}
+            session.save()
+            try:
+                resp = client.post(
+                    "/checkout/", {"payment_method": "cash", "pickup_slot": slot_ids[(idx + n) % len(slot_ids)]}
+                )
+                good = resp.status_code == 302
+            except Exception:
+                good = False
+            with lock:
+                if good:
+                    ok[0] += 1
+                else:
+                    failed[0] += 1
+        from django.db import connections
+        connections.close_all()
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    print(f"{ok[0]} ok, {failed[0]} failed in {elapsed:.2f}s -> {ok[0] / elapsed:.1f} checkouts/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=400)
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="run one profile in-process")
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args.threads, args.orders)
+        return
+
+    for name, env in PROFILES.items():
+        if name.startswith("postgres") and not os.environ.get("CANTEEN_PG_NAME"):
+            print(f"{name:15} skipped (set CANTEEN_PG_* to enable)")
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            child_env = {**os.environ, **env, "CANTEEN_DB_NAME": str(Path(tmp) / "bench.sqlite3")}
+            out = subprocess.run(
+                [sys.executable, __file__, "--profile", name,
+                 "--threads", str(args.threads), "--orders", str(args.orders)],
+                env=child_env, capture_output=True, text=True,
+            )
+            result = out.stdout.strip().splitlines()[-1:] or [out.stderr.strip().splitlines()[-1]]
+            print(f"{name:15} {result[0]}")
+
+
+if __name__ == "__main__":
+    main()
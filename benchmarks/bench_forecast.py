@@ -0,0 +1,117 @@
+"""
+End-to-end time of ``forecast.run()`` over synthetic order history.
+
+    python benchmarks/bench_forecast.py --items 300 --days 365 --lines-per-day 300
+
+Runs in a subprocess against a throw-away SQLite database seeded with
+``--days`` of orders (skewed item popularity, lunch and evening peaks), then
+times the whole forecast: loading history, the fit and storing the rows.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, time as dt_time, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+LINES_PER_ORDER = 3
+
+
+def setup_django():
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+    import django
+
+    django.setup()
+
+
+def seed(items, days, lines_per_day, np):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from my_canteen.models import Category, MenuItem, Order, OrderItem
+
+    user = User.objects.create_user("bench_student")
+    category = Category.objects.create(name="Bench")
+    menu = MenuItem.objects.bulk_create(
+        [MenuItem(name=f"Bench item {i}", price=50, category=category) for i in range(items)], batch_size=1000
+    )
+
+    rng = np.random.default_rng(7)
+    n_orders = days * lines_per_day // LINES_PER_ORDER
+    day_idx = rng.integers(1, days + 1, n_orders)
+    minutes = np.clip(
+        np.where(rng.random(n_orders) < 0.6, rng.normal(13 * 60, 60, n_orders), rng.normal(19 * 60, 90, n_orders)),
+        0, 24 * 60 - 1,
+    ).astype(int)
+    today = datetime.combine(timezone.localdate(), dt_time.min)
+    orders = Order.objects.bulk_create(
+        [Order(user=user, total_price=150, address="x", status="completed") for _ in range(n_orders)],
+        batch_size=1000,
+    )
+    # auto_now_add ignores explicit values, so spread the orders over the history afterwards
+    for order, day, minute in zip(orders, day_idx, minutes):
+        order.created_at = timezone.make_aware(today - timedelta(days=int(day)) + timedelta(minutes=int(minute)))
+    Order.objects.bulk_update(orders, ["created_at"], batch_size=1000)
+
+    picks = np.minimum(rng.zipf(1.3, n_orders * LINES_PER_ORDER) - 1, items - 1)
+    quantities = rng.integers(1, 4, len(picks))
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order=orders[i // LINES_PER_ORDER], item=menu[pick], quantity=int(qty), unit_price=50)
+            for i, (pick, qty) in enumerate(zip(picks, quantities))
+        ],
+        batch_size=1000,
+    )
+    return len(picks)
+
+
+def run(items, days, lines_per_day, rounds):
+    setup_django()
+    from django.core.management import call_command
+
+    from my_canteen import forecast
+
+    if forecast.np is None:
+        sys.exit("NumPy is not installed: pip install numpy")
+
+    call_command("migrate", verbosity=0)
+    lines = seed(items, days, lines_per_day, forecast.np)
+    print(f"{lines:,} order lines, {items} items, {days} days")
+
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        stored = forecast.run(history_days=days)
+        timings.append(time.perf_counter() - started)
+    print(f"run: best {min(timings):.2f}s  ({stored} forecasts stored)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=300)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--lines-per-day", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--run", action="store_true", help="run in-process against CANTEEN_DB_NAME")
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.items, args.days, args.lines_per_day, args.rounds)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "CANTEEN_DB_NAME": str(Path(tmp) / "bench.sqlite3")}
+        subprocess.run(
+            [sys.executable, __file__, "--run", "--items", str(args.items), "--days", str(args.days),
+             "--lines-per-day", str(args.lines_per_day), "--rounds", str(args.rounds)],
+            env=env, check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Concurrent checkouts that all buy the same item, with and without stock shards.
+
+    python benchmarks/bench_hot_item.py --threads 16 --orders 800
+
+Each mode runs in its own subprocess against a throw-away database:
+
+- ``single-row``: ``stock_shards=0``, every sale decrements ``MenuItem.stock``
+- ``sharded``:    ``stock_shards=--shards``, a sale decrements one random shard
+
+Set CANTEEN_DB_ENGINE=postgres (and CANTEEN_PG_*) to see the difference: on
+SQLite the database lock serialises every writer, so both modes run alike.
+Afterwards the ledger is checked against the remaining stock.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STOCK = 10**6
+
+
+def setup_django():
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    settings.ALLOWED_HOSTS = ["testserver"]
+    # pickup slots all day with room for every bench order
+    settings.CANTEEN_PICKUP_HOURS = (0, 24)
+    settings.CANTEEN_SLOT_CAPACITY = 10**9
+    # measure the database, not the admission gates (my_canteen/admission.py)
+    settings.CANTEEN_ADMISSION = {}
+
+
+def run_mode(threads, orders, shards):
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection, connections
+    from django.test import Client
+
+    from my_canteen import slots, stock
+    from my_canteen.models import Category, MenuItem
+
+    call_command("migrate", verbosity=0)
+    item = MenuItem.objects.create(name="Hot item", price=50, stock=0, category=Category.objects.create(name="Bench"))
+    stock.adjust(item, STOCK, note="bench opening")  # through the ledger, so the drift check adds up
+    if shards:
+        stock.set_shards(item, shards)
+    users = [User.objects.create_user(f"bench{i}", password="x") for i in range(threads)]
+    slot_ids = [row["id"] for row in slots.open_slots(1)]
+    connection.close()
+
+    per_thread = orders // threads
+    ok, failed = [0], [0]
+    lock = threading.Lock()
+
+    def worker(idx):
+        client = Client()
+        client.force_login(users[idx])
+        for n in range(per_thread):
+            session = client.session
+            session["cart"] = {str(item.id): 1}
+            session.save()
+            try:
+                slot = slot_ids[(idx + n) % len(slot_ids)]
+                good = client.post("/checkout/", {"payment_method": "cash", "pickup_slot": slot}).status_code == 302
+            except Exception:
+                good = False
+            with lock:
+                if good:
+                    ok[0] += 1
+                else:
+                    failed[0] += 1
+        connections.close_all()
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    left = stock.levels([item.id])[item.id]
+    drift = "ok" if not stock.ledger_drift() and left == STOCK - ok[0] else "DRIFT"
+    print(f"{ok[0]} ok, {failed[0]} failed in {elapsed:.2f}s -> {ok[0] / elapsed:.1f} checkouts/s, ledger {drift}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=400)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--mode", choices=["single-row", "sharded"], help="run one mode in-process")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.threads, args.orders, args.shards if args.mode == "sharded" else 0)
+        return
+
+    for mode in ("single-row", "sharded"):
+        with tempfile.TemporaryDirectory() as tmp:
+            child_env = {**os.environ, "CANTEEN_DB_NAME": str(Path(tmp) / "bench.sqlite3")}
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--threads", str(args.threads),
+                 "--orders", str(args.orders), "--shards", str(args.shards)],
+                env=child_env, capture_output=True, text=True,
+            )
+            result = out.stdout.strip().splitlines()[-1:] or [out.stderr.strip().splitlines()[-1]]
+            print(f"{mode:11} {result[0]}")
+
+
+if __name__ == "__main__":
+    main()
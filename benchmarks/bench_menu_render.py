@@ -0,0 +1,105 @@
+"""
+Render time of menu.html with N items, with and without fragment caching.
+
+    python benchmarks/bench_menu_render.py --items 500 --rounds 20
+
+No database is touched: items are unsaved MenuItem instances with ids, so the
+numbers are pure template cost.
+
+- ``uncached``: template_fragments is a DummyCache (every card renders, as before)
+- ``cold``:     first render with an empty fragment cache
+- ``warm``:     all cards served from the fragment cache
+- ``warm+10``:  10 items changed stock since the last render
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.ALLOWED_HOSTS = ["testserver"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import AnonymousUser
+    from django.core.cache import caches
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory, override_settings
+    from django.urls import resolve
+    from django.utils import timezone
+
+    from my_canteen.models import Category, MenuItem
+
+    now = timezone.now()
+    cats = [Category(id=i, name=f"Category {i}") for i in range(1, 9)]
+    items = [
+        MenuItem(
+            id=i, name=f"Item {i}", price=Decimal("50.00") + i % 40, stock=i % 7,
+            category=cats[i % len(cats)], is_popular=i % 5 == 0,
+            rating_avg=(i % 50) / 10, rating_count=i % 30, updated_at=now,
+        )
+        for i in range(1, args.items + 1)
+    ]
+
+    request = RequestFactory().get("/menu/")
+    request.user = AnonymousUser()
+    request.session = {}
+    request.resolver_match = resolve("/menu/")
+    context = {
+        "items": items, "categories": cats, "active_cat": "", "q": "",
+        "min_price": "", "max_price": "", "sort": "", "recommended": items[:6],
+    }
+
+    def render():
+        started = time.perf_counter()
+        render_to_string("my_canteen/menu.html", context, request=request)
+        return (time.perf_counter() - started) * 1000
+
+    def report(label, samples):
+        print(f"{label:10} median {statistics.median(samples):7.2f} ms   min {min(samples):7.2f} ms")
+
+    render()  # compile templates once
+    dummy = {**caches.settings, "template_fragments": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    with override_settings(CACHES=dummy):
+        report("uncached", [render() for _ in range(args.rounds)])
+
+    fragments = caches["template_fragments"]
+    cold = []
+    for _ in range(args.rounds):
+        fragments.clear()
+        cold.append(render())
+    report("cold", cold)
+
+    render()
+    report("warm", [render() for _ in range(args.rounds)])
+
+    changed = []
+    for r in range(args.rounds):
+        for item in items[r * 10:(r + 1) * 10]:
+            item.stock += 1
+            item.updated_at = timezone.now()
+        changed.append(render())
+    report("warm+10", changed)
+
+
+if __name__ == "__main__":
+    main()
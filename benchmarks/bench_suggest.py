@@ -0,0 +1,67 @@
+"""
+Micro-benchmark for the menu suggest index.
+
+    python benchmarks/bench_suggest.py --items 50000
+
+Builds a SuggestIndex over synthetic item names (no database) and reports
+per-query latency for prefix, phonetic, multi-word and typo lookups.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DISHES = [
+    "Fuchka", "Chotpoti", "Singara", "Samosa", "Khichuri", "Biryani", "Tehari", "Paratha",
+    "Chicken Fried Rice", "Egg Khichuri", "Cold Coffee", "Tea", "Lassi", "Jhalmuri", "Halim",
+    "Beef Curry", "Dal", "Vegetable Roll", "Shawarma", "Burger", "Noodles", "Pakora", "Mishti Doi",
+]
+STYLES = ["Special", "Spicy", "Classic", "Mini", "Family", "Deluxe", "Home-style", "Dhaka", "Chittagong"]
+CATEGORIES = ["Snacks", "Rice", "Drinks", "Curry", "Street Food", "Desserts", "Breakfast"]
+QUERIES = ["f", "fu", "fuch", "phuchka", "chatpati", "shingara", "chick fri", "cofee", "biriyani", "spicy kh", "zzz"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+    import django
+
+    django.setup()
+    from my_canteen.search import SuggestIndex
+
+    rnd = random.Random(7)
+    rows = [
+        (i, f"{rnd.choice(STYLES)} {rnd.choice(DISHES)} {i}", rnd.choice(CATEGORIES), 10 + i % 300)
+        for i in range(1, args.items + 1)
+    ]
+    started = time.perf_counter()
+    index = SuggestIndex(rows)
+    print(f"built index over {len(index)} items ({len(index.keys)} keys) in {time.perf_counter() - started:.2f}s")
+
+    for q in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            results = index.suggest(q)
+            samples.append((time.perf_counter() - t) * 1e6)
+        samples.sort()
+        top = results[0]["name"] if results else "-"
+        print(
+            f"{q!r:14} p50 {statistics.median(samples):7.1f} us  p99 {samples[int(len(samples) * .99)]:7.1f} us"
+            f"  {len(results)} hit(s), first: {top}"
+        )
+
+
+if __name__ == "__main__":
+    main()
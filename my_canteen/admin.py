@@ -1,8 +1,20 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from .models import (
     MenuItem, Category, Order, OrderItem, Review,
-    UserProfile, Payment
+    UserProfile, Payment, StockMovement, PickupSlot, OrderEvent,
+    ArchivedOrder, ArchivedOrderItem
 )
+from .cache import bump_slots
+from .catalog_sync import record_bulk
+from . import catalog_io, exports, stock
+from .forms import CatalogImportForm
+from .paginators import EstimatedCountPaginator
 import re
 
 
@@ -13,11 +25,17 @@ import re
 class MenuItemAdmin(admin.ModelAdmin):
     list_display = (
         "name", "price", "stock", "category",
-        "is_popular", "is_active", "rating_avg", "rating_count"
+        "is_popular", "is_active", "rating_avg", "rating_count", "sales_score"
     )
+    list_select_related = ("category", "popularity")
     list_filter = ("is_popular", "category", "is_active")
     search_fields = ("name", "description")
-    actions = ["remove_popular_prefix", "mark_as_popular"]
+    actions = ["remove_popular_prefix", "mark_as_popular", "export_catalog_csv"]
+
+    @admin.display(description="Sales score", ordering="popularity__score")
+    def sales_score(self, obj):
+        popularity = getattr(obj, "popularity", None)
+        return round(popularity.score, 2) if popularity else 0
 
     def remove_popular_prefix(self, request, queryset):
         """
@@ -25,15 +43,19 @@ class MenuItemAdmin(admin.ModelAdmin):
         Remove 'Popular ' prefix from selected item names.
         """
         pattern = re.compile(r'^\s*(popular)\s+', re.IGNORECASE)
-        changed = 0
-        for item in queryset:
+        now = timezone.now()
+        changed = []
+        for item in queryset.select_related(None).only("id", "name"):
             new_name = pattern.sub('', item.name).strip()
             new_name = re.sub(r'\s{2,}', ' ', new_name)
             if new_name != item.name:
                 item.name = new_name
-                item.save(update_fields=["name"])
-                changed += 1
-        self.message_user(request, f"✅ Fixed {changed} item name(s).")
+                item.updated_at = now
+                changed.append(item)
+        if changed:
+            MenuItem.objects.bulk_update(changed, ["name", "updated_at"], batch_size=500)
+            record_bulk([item.pk for item in changed])  # bulk_update() skips post_save
+        self.message_user(request, f"✅ Fixed {len(changed)} item name(s).")
 
     remove_popular_prefix.short_description = "🧹 Remove 'Popular ' prefix from selected names"
 
@@ -41,21 +63,153 @@ class MenuItemAdmin(admin.ModelAdmin):
         """
         🌟 Mark selected items as popular.
         """
-        updated = queryset.update(is_popular=True)
+        ids = list(queryset.values_list("id", flat=True))
+        updated = queryset.update(is_popular=True, updated_at=timezone.now())
+        record_bulk(ids)  # queryset.update() skips post_save
         self.message_user(request, f"⭐ {updated} item(s) marked as popular.")
 
     mark_as_popular.short_description = "🌟 Mark as Popular"
 
+    def export_catalog_csv(self, request, queryset):
+        response = HttpResponse(
+            catalog_io.dump(catalog_io.export_rows(queryset), "csv"), content_type="text/csv; charset=utf-8"
+        )
+        response["Content-Disposition"] = 'attachment; filename="catalog.csv"'
+        return response
+
+    export_catalog_csv.short_description = "⬇️ Export selected items as catalog CSV"
+
+    def save_model(self, request, obj, form, change):
+        """Stock edits go through the ledger instead of overwriting the level."""
+        stock_fields = {"stock", "stock_shards"} & set(form.changed_data)
+        if not change or not stock_fields:  # new items: opening stock is logged by signals.py
+            super().save_model(request, obj, form, change)
+            return
+        level, shards = obj.stock, obj.stock_shards
+        other = [f for f in form.changed_data if f not in stock_fields]
+        if other:
+            obj.save(update_fields=[*other, "updated_at"])
+        if "stock_shards" in stock_fields:
+            stock.set_shards(obj, shards)
+        if "stock" in stock_fields:
+            stock.adjust(obj, level, user=request.user, note="admin edit")
+        record_bulk([obj.pk], stock_only=True)
+
+    # ---------- Catalog import page ----------
+    def get_urls(self):
+        custom = [
+            path(
+                "import/", self.admin_site.admin_view(self.import_view),
+                name="my_canteen_menuitem_import",
+            ),
+        ]
+        return custom + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_change_permission(request) or not self.has_add_permission(request):
+            return redirect("admin:my_canteen_menuitem_changelist")
+        result, errors = None, []
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            fmt = "json" if upload.name.lower().endswith(".json") else "csv"
+            try:
+                result, errors = catalog_io.import_catalog(
+                    upload.read().decode("utf-8-sig"), fmt,
+                    deactivate_missing=form.cleaned_data["deactivate_missing"],
+                    dry_run=form.cleaned_data["dry_run"],
+                )
+            except (UnicodeDecodeError, ValueError) as exc:
+                errors = [f"Could not read file: {exc}"]
+            if result is not None and not errors and not form.cleaned_data["dry_run"]:
+                messages.success(request, f"📥 Catalog imported: {result.summary()}.")
+                return redirect("admin:my_canteen_menuitem_changelist")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import catalog",
+            "form": form,
+            "result": result,
+            "errors": errors,
+        }
+        return TemplateResponse(request, "admin/my_canteen/menuitem/import.html", context)
+
+
+# --------------------------------------------------
+# 📒 Stock ledger (read-only)
+# --------------------------------------------------
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "item", "kind", "quantity", "order", "user", "note")
+    list_filter = ("kind", "created_at")
+    list_select_related = ("item", "order", "user")
+    search_fields = ("^item__name", "=order__id")
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# --------------------------------------------------
+# 🕒 Order status events (read-only)
+# --------------------------------------------------
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "order_id", "from_status", "to_status", "actor")
+    list_filter = ("to_status", "created_at")
+    list_select_related = ("actor",)
+    search_fields = ("=order__id", "^actor__username")
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 # --------------------------------------------------
 # 🧩 Category Admin
 # --------------------------------------------------
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("name",)
+    list_display = ("name", "prep_units")
+    list_editable = ("prep_units",)
     search_fields = ("name",)
 
 
+# --------------------------------------------------
+# ⏰ Pickup slots
+# --------------------------------------------------
+@admin.register(PickupSlot)
+class PickupSlotAdmin(admin.ModelAdmin):
+    list_display = ("starts_at", "capacity", "booked", "free")
+    list_editable = ("capacity",)
+    date_hierarchy = "starts_at"
+    readonly_fields = ("booked", "updated_at")
+
+    @admin.display(description="Free")
+    def free(self, obj):
+        return obj.free
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(bump_slots)
+
+
 # --------------------------------------------------
 # 💳 Payment Admin
 # --------------------------------------------------
@@ -63,7 +217,23 @@ class CategoryAdmin(admin.ModelAdmin):
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ("order", "method", "amount", "status", "transaction_id", "paid_at")
     list_filter = ("method", "status", "paid_at")
-    search_fields = ("transaction_id", "order__user__username")
+    list_select_related = ("order__user",)
+    search_fields = ("^transaction_id", "^order__user__username")
+    raw_id_fields = ("order",)
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["export_csv", "export_jsonl"]
+
+    def export_csv(self, request, queryset):
+        return exports.streaming_response("payments", "csv", queryset)
+
+    export_csv.short_description = "⬇️ Export selected payments (CSV)"
+
+    def export_jsonl(self, request, queryset):
+        return exports.streaming_response("payments", "jsonl", queryset)
+
+    export_jsonl.short_description = "⬇️ Export selected payments (JSONL)"
 
 
 # --------------------------------------------------
@@ -73,18 +243,41 @@ class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
     readonly_fields = ("line_total",)
+    autocomplete_fields = ("item",)
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = (
         "id", "user", "total_price", "status",
-        "payment_status", "payment_method", "created_at"
+        "payment_status", "payment_method", "payment_info", "created_at"
     )
     list_filter = ("status", "payment_status", "payment_method", "created_at")
-    search_fields = ("user__username", "id")
+    list_select_related = ("user", "payment")
+    search_fields = ("^user__username", "=id")
+    raw_id_fields = ("user", "pickup_slot")
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [OrderItemInline]
     readonly_fields = ("created_at",)
+    actions = ["export_csv", "export_jsonl", "export_lines_csv"]
+
+    def export_csv(self, request, queryset):
+        return exports.streaming_response("orders", "csv", queryset)
+
+    export_csv.short_description = "⬇️ Export selected orders (CSV)"
+
+    def export_jsonl(self, request, queryset):
+        return exports.streaming_response("orders", "jsonl", queryset)
+
+    export_jsonl.short_description = "⬇️ Export selected orders (JSONL)"
+
+    def export_lines_csv(self, request, queryset):
+        lines = OrderItem.objects.filter(order__in=queryset.values("id"))
+        return exports.streaming_response("order_items", "csv", lines)
+
+    export_lines_csv.short_description = "⬇️ Export order lines of selected orders (CSV)"
 
     def payment_info(self, obj):
         if hasattr(obj, 'payment'):
@@ -92,6 +285,38 @@ class OrderAdmin(admin.ModelAdmin):
         return "—"
     payment_info.short_description = "Payment Info"
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.refresh_summary()  # the inline may have changed lines
+
+
+# --------------------------------------------------
+# 🗄️ Archived orders (read-only)
+# --------------------------------------------------
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ("item", "quantity", "unit_price")
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "total_price", "status", "payment_status", "created_at", "archived_at")
+    list_filter = ("status", "payment_method")
+    list_select_related = ("user",)
+    search_fields = ("^user__username", "=id")
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 # --------------------------------------------------
 # 📦 OrderItem Admin
@@ -99,7 +324,32 @@ class OrderAdmin(admin.ModelAdmin):
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ("order", "item", "quantity", "unit_price", "line_total")
-    search_fields = ("order__user__username", "item__name")
+    list_select_related = ("order__user", "item")
+    search_fields = ("^order__user__username", "^item__name")
+    raw_id_fields = ("order",)
+    autocomplete_fields = ("item",)
+    date_hierarchy = "order__created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # keep Order.item_count / items_summary in step with line edits
+    def save_model(self, request, obj, form, change):
+        old_order_id = form.initial.get("order") if change else None
+        super().save_model(request, obj, form, change)
+        obj.order.refresh_summary()
+        if old_order_id and old_order_id != obj.order_id:
+            Order.objects.get(pk=old_order_id).refresh_summary()
+
+    def delete_model(self, request, obj):
+        order = obj.order
+        super().delete_model(request, obj)
+        order.refresh_summary()
+
+    def delete_queryset(self, request, queryset):
+        order_ids = set(queryset.values_list("order_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for order in Order.objects.filter(id__in=order_ids):
+            order.refresh_summary()
 
 
 # --------------------------------------------------
@@ -109,7 +359,13 @@ class OrderItemAdmin(admin.ModelAdmin):
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ("user", "item", "rating", "created_at")
     list_filter = ("rating", "created_at")
-    search_fields = ("user__username", "item__name", "comment")
+    list_select_related = ("user", "item")
+    search_fields = ("^user__username", "^item__name", "comment")
+    raw_id_fields = ("user",)
+    autocomplete_fields = ("item",)
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ("created_at", "updated_at")
 
 
@@ -120,4 +376,6 @@ class ReviewAdmin(admin.ModelAdmin):
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ("user", "role", "phone", "email_verified")
     list_filter = ("role", "email_verified")
-    search_fields = ("user__username", "user__email", "phone")
+    list_select_related = ("user",)
+    search_fields = ("^user__username", "^user__email", "^phone")
+    raw_id_fields = ("user",)
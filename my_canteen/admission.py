@@ -0,0 +1,175 @@
+# my_canteen/admission.py
+"""
+Admission control for the write-heavy customer endpoints.
+
+A rush on a lunch special sends far more ``checkout`` / ``add_to_cart``
+requests than SQLite can write, and once they pile up everything times out,
+staff clicks included. ``AdmissionControlMiddleware`` puts a gate in front of
+the URL names in ``ROUTES``; nothing else is ever gated, so the order
+lifecycle views (accept / preparing / ready / ...) and the dashboards always
+go straight through.
+
+Every gate has, in ``CACHES['default']`` so all workers share it:
+
+- a concurrency limit: ``concurrency`` lease keys taken with ``cache.add``.
+  A lease expires after ``LEASE`` seconds on its own, so a killed worker
+  cannot leak one
+- a token bucket per user (per IP when anonymous): ``rate`` requests per
+  second with bursts of ``burst``; an empty bucket answers 429
+
+When a gate with ``queue`` is full, the request gets a ticket from a FIFO
+counter and a waiting room page that re-polls. Tickets are served in order:
+only the ``concurrency`` oldest live tickets may try for a lease, newcomers
+queue behind them while anyone is waiting, and tickets that stop polling for
+``STALE`` seconds are skipped. Only page loads queue: an admitted page gets a
+pass for its POST, and a POST without one is shed while anyone is waiting. Queue depth, leases in use and shed counts
+come from ``stats()`` (``manage.py admission_status``).
+
+The backend's ``add`` / ``incr`` are atomic on memcached and good enough on the
+file and local-memory caches; the bucket is a plain read-modify-write, which
+only ever races against the same user.
+"""
+import random
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+
+LEASE = 30        # seconds; longer than any gated request should take
+STALE = 20        # a waiting ticket that has not polled for this long gives up its turn
+RETRY = 5         # waiting room re-poll interval
+PASS = 600        # an admitted checkout page may be submitted for this long
+
+
+@dataclass(frozen=True)
+class Gate:
+    name: str
+    concurrency: int
+    rate: float
+    burst: int
+    queue: bool = False
+
+
+GATES = {
+    name: Gate(name, **options)
+    for name, options in getattr(settings, "CANTEEN_ADMISSION", {
+        "checkout": {"concurrency": 4, "rate": 0.5, "burst": 3, "queue": True},
+        "cart": {"concurrency": 16, "rate": 5, "burst": 10},
+    }).items()
+}
+# url name -> gate
+ROUTES = {"checkout": "checkout", "add_to_cart": "cart", "add_to_cart_qty": "cart"}
+
+
+def _cache():
+    return caches["default"]
+
+
+def _incr(key, delta=1):
+    cache = _cache()
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key, delta)
+
+
+def count_shed(gate, reason):
+    _incr(f"adm:shed:{gate.name}:{reason}")
+
+
+# ---------- Token buckets ----------
+def take_token(gate, ident, now=None):
+    """``(True, 0)`` or ``(False, seconds until the next token)``."""
+    cache, now = _cache(), now or time.time()
+    key = f"adm:tb:{gate.name}:{ident}"
+    tokens, stamp = cache.get(key) or (gate.burst, now)
+    tokens = min(gate.burst, tokens + (now - stamp) * gate.rate)
+    if tokens < 1:
+        return False, max(1, int((1 - tokens) / gate.rate + 0.999))
+    cache.set(key, (tokens - 1, now), timeout=int(gate.burst / gate.rate) + 60)
+    return True, 0
+
+
+# ---------- Concurrency leases ----------
+def acquire(gate):
+    """A lease key, or ``None`` when all ``gate.concurrency`` are taken."""
+    cache = _cache()
+    start = random.randrange(gate.concurrency)
+    for i in range(gate.concurrency):
+        key = f"adm:lease:{gate.name}:{(start + i) % gate.concurrency}"
+        if cache.add(key, 1, timeout=LEASE):
+            return key
+    return None
+
+
+def release(lease):
+    if lease:
+        _cache().delete(lease)
+
+
+def in_use(gate):
+    keys = [f"adm:lease:{gate.name}:{i}" for i in range(gate.concurrency)]
+    return len(_cache().get_many(keys))
+
+
+# ---------- Waiting room ----------
+def join(gate):
+    ticket = _incr(f"adm:wr:{gate.name}:next")
+    touch(gate, ticket)
+    return ticket
+
+
+def touch(gate, ticket):
+    _cache().set(f"adm:wr:{gate.name}:seen:{ticket}", 1, timeout=STALE)
+
+
+def _serving(gate):
+    """Highest ticket served so far, first skipping abandoned tickets at the head."""
+    cache = _cache()
+    serving = cache.get(f"adm:wr:{gate.name}:serving", 0)
+    last = cache.get(f"adm:wr:{gate.name}:next", 0)
+    skipped = serving
+    for _ in range(100):  # bounded: a long run of dead tickets is cleared over a few polls
+        if skipped >= last or cache.get(f"adm:wr:{gate.name}:seen:{skipped + 1}"):
+            break
+        skipped += 1
+    if skipped != serving:
+        cache.set(f"adm:wr:{gate.name}:serving", skipped, timeout=None)
+    return skipped
+
+
+def position(gate, ticket):
+    """People ahead of ``ticket`` (0 = within the window that may try for a lease)."""
+    return max(ticket - _serving(gate) - gate.concurrency, 0)
+
+
+def served(gate, ticket):
+    cache = _cache()
+    if cache.get(f"adm:wr:{gate.name}:serving", 0) < ticket:
+        cache.set(f"adm:wr:{gate.name}:serving", ticket, timeout=None)
+    cache.delete(f"adm:wr:{gate.name}:seen:{ticket}")
+
+
+def depth(gate):
+    return max(_cache().get(f"adm:wr:{gate.name}:next", 0) - _serving(gate), 0)
+
+
+def stats():
+    """``{gate: {"in_use", "queue_depth", "shed_rate", "shed_busy", "queued"}}``."""
+    cache = _cache()
+    result = {}
+    for gate in GATES.values():
+        shed = {
+            reason: cache.get(f"adm:shed:{gate.name}:{reason}", 0) for reason in ("rate", "busy", "queued")
+        }
+        result[gate.name] = {
+            "in_use": in_use(gate),
+            "concurrency": gate.concurrency,
+            "queue_depth": depth(gate) if gate.queue else 0,
+            "shed_rate": shed["rate"],
+            "shed_busy": shed["busy"],
+            "queued": shed["queued"],
+        }
+    return result
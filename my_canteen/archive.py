@@ -0,0 +1,71 @@
+# my_canteen/archive.py
+"""
+Hot / cold split for orders.
+
+Completed and cancelled orders older than ``CANTEEN_ARCHIVE_AFTER_DAYS`` move,
+with their lines and payment, into ``ArchivedOrder`` / ``ArchivedOrderItem`` /
+``ArchivedPayment``: same columns, same ids. Each batch is one short
+transaction (copy, then delete the live rows), so locks stay short and an
+interrupted run simply resumes with the next batch.
+
+Readers of old data go through the archive too: ``Order.history.for_user(user,
+archived=True)`` backs the "older orders" page, the forecast reads both sides
+and exports have ``archived_*`` datasets.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, ArchivedPayment, Order, OrderItem, Payment
+
+BATCH_SIZE = 500
+FINAL_STATUSES = ("completed", "cancelled")
+
+# (live model, archive model, column holding the order id)
+TABLES = (
+    (Order, ArchivedOrder, "id"),
+    (OrderItem, ArchivedOrderItem, "order_id"),
+    (Payment, ArchivedPayment, "order_id"),
+)
+
+
+def after_days():
+    return getattr(settings, "CANTEEN_ARCHIVE_AFTER_DAYS", 90)
+
+
+def cutoff(days=None):
+    return timezone.now() - timedelta(days=after_days() if days is None else days)
+
+
+def candidates(before):
+    return Order.objects.filter(status__in=FINAL_STATUSES, created_at__lt=before)
+
+
+def _copy(live, cold, key, order_ids):
+    columns = [f.attname for f in live._meta.concrete_fields]
+    rows = live.objects.filter(**{f"{key}__in": order_ids}).values_list(*columns)
+    cold.objects.bulk_create([cold(**dict(zip(columns, row))) for row in rows], batch_size=BATCH_SIZE)
+
+
+def archive_batch(before, batch_size=BATCH_SIZE):
+    """Move the oldest ``batch_size`` eligible orders. Returns how many moved (0: nothing left)."""
+    with transaction.atomic():
+        ids = list(
+            candidates(before).select_for_update().order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        for live, cold, key in TABLES:
+            _copy(live, cold, key, ids)
+        Order.objects.filter(id__in=ids).delete()  # cascades to lines + payment
+    return len(ids)
+
+
+def table_sizes():
+    """Row counts, live and archived: ``{"orders": (live, archived), ...}``."""
+    return {
+        live._meta.model_name: (live.objects.count(), cold.objects.count())
+        for live, cold, _ in TABLES
+    }
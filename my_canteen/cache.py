@@ -0,0 +1,274 @@
+# my_canteen/cache.py
+"""
+Two-tier cache for the hot read paths.
+
+    request -> per-process LRU (bounded, no I/O) -> shared backend (CACHES['default']) -> DB
+
+- Keys are versioned per namespace (``catalog``, ``reviews:<item_id>``, ...);
+  ``bump(namespace)`` invalidates everything in it across all processes at once.
+- Entries carry their compute time and logical expiry, so readers refresh them
+  a little early with probability growing towards expiry (XFetch), and only the
+  worker holding the backend lock recomputes. Everyone else keeps serving the
+  stale copy, so the lunch menu expiring at 12:59 does not dog-pile the DB.
+- ``stats()`` exposes hit/miss counters per tier.
+"""
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+# How long a process trusts its local copy of a namespace version.
+VERSION_TTL = 1.0
+LOCK_TTL = 10
+
+
+class LocalLRU:
+    """Thread-safe, size bounded LRU with per entry expiry."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    def __init__(self, alias="default", maxsize=None):
+        self.alias = alias
+        self.local = LocalLRU(maxsize or getattr(settings, "CANTEEN_LOCAL_CACHE_SIZE", 1024))
+        self._counters = dict.fromkeys(
+            ("local_hits", "shared_hits", "misses", "early_refreshes", "stale_served", "lock_waits"), 0
+        )
+        self._counters_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _count(self, name):
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {**counters, "local_size": len(self.local)}
+
+    # ---------- versions ----------
+    def version(self, namespace):
+        vkey = f"v:{namespace}"
+        version = self.local.get(vkey)
+        if version is None:
+            version = self.shared.get(vkey)
+            if version is None:
+                self.shared.add(vkey, 1, timeout=None)
+                version = self.shared.get(vkey, 1)
+            self.local.set(vkey, version, VERSION_TTL)
+        return version
+
+    def bump(self, namespace):
+        vkey = f"v:{namespace}"
+        try:
+            version = self.shared.incr(vkey)
+        except ValueError:
+            self.shared.add(vkey, 1, timeout=None)
+            version = self.shared.incr(vkey)
+        self.local.set(vkey, version, VERSION_TTL)
+        return version
+
+    def key(self, namespace, *parts):
+        return ":".join([namespace, f"v{self.version(namespace)}", *map(str, parts)])
+
+    # ---------- read-through ----------
+    @staticmethod
+    def _fresh(entry, beta):
+        value, delta, expires_at = entry
+        # XFetch: recompute early with probability rising as expiry approaches
+        return time.time() - delta * beta * math.log(random.random() or 1e-12) < expires_at
+
+    def get_or_set(self, namespace, parts, producer, ttl=300, local_ttl=5, beta=1.0):
+        key = self.key(namespace, *parts)
+
+        entry = self.local.get(key)
+        if entry is not None and self._fresh(entry, beta):
+            self._count("local_hits")
+            return entry[0]
+
+        entry = self.shared.get(key)
+        if entry is not None:
+            if self._fresh(entry, beta):
+                self._count("shared_hits")
+                self.local.set(key, entry, min(local_ttl, ttl))
+                return entry[0]
+            self._count("early_refreshes")
+        else:
+            self._count("misses")
+
+        lock_key = f"lock:{key}"
+        locked = self.shared.add(lock_key, 1, timeout=LOCK_TTL)
+        if not locked:
+            if entry is not None:
+                # someone else is recomputing; the slightly stale copy is fine
+                self._count("stale_served")
+                return entry[0]
+            entry = self._wait_for(key)
+            if entry is not None:
+                return entry[0]
+
+        try:
+            started = time.time()
+            value = producer()
+            delta = time.time() - started
+            entry = (value, delta, time.time() + ttl)
+            # keep the entry around past its logical expiry so it can be served stale
+            self.shared.set(key, entry, timeout=ttl * 2)
+            self.local.set(key, entry, min(local_ttl, ttl))
+            return value
+        finally:
+            if locked:
+                self.shared.delete(lock_key)
+
+    def _wait_for(self, key, timeout=LOCK_TTL, step=0.05):
+        self._count("lock_waits")
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(step)
+            entry = self.shared.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+
+tiered = TieredCache()
+
+
+# ---------- Typed helpers for the hot spots ----------
+def catalog_version():
+    return tiered.version("catalog")
+
+
+def bump_catalog():
+    return tiered.bump("catalog")
+
+
+def bump_item_reviews(item_id):
+    return tiered.bump(f"reviews:{item_id}")
+
+
+def stock_version():
+    return tiered.version("stock")
+
+
+def bump_stock():
+    return tiered.bump("stock")
+
+
+def available_stock():
+    """
+    ``menu_page`` availability: ``{item_id: available}`` for held or sharded
+    items only; every other item's ``stock`` column is already right. Bumped on
+    every hold / ledger write; the short TTL covers holds that simply expire.
+    """
+    from .stock import availability_overrides
+
+    return tiered.get_or_set("stock", ("available",), availability_overrides, ttl=30, local_ttl=1)
+
+
+def sold_out_items():
+    """``menu_stock`` payload: the ids the menu script marks "Out of Stock"."""
+    from .stock import sold_out
+
+    return tiered.get_or_set("stock", ("sold_out",), sold_out, ttl=30, local_ttl=1)
+
+
+def bump_slots():
+    return tiered.bump("slots")
+
+
+def pickup_slots(day):
+    """``checkout`` slot picker: the day's ``slots.slot_rows``, bumped on every booking."""
+    from .slots import slot_rows
+
+    return tiered.get_or_set("slots", (day.isoformat(),), lambda: slot_rows(day), ttl=60, local_ttl=1)
+
+
+def popular_items(limit=6):
+    """``home`` popular block: manual picks first, then the sales rank."""
+    from .models import MenuItem
+    from .popularity import popular_filter, ranked
+
+    return tiered.get_or_set(
+        "catalog", ("popular", limit),
+        lambda: list(ranked(MenuItem.objects.filter(popular_filter(), is_active=True))[:limit]),
+    )
+
+
+def category_chips():
+    """``menu_page`` category chips."""
+    from .models import Category
+
+    return tiered.get_or_set(
+        "catalog", ("chips",),
+        lambda: list(Category.objects.all().order_by("name")),
+    )
+
+
+def item_review_summary(item_id):
+    """``item_detail`` rating aggregate: {"avg": float, "cnt": int}."""
+    from django.db.models import Avg, Count
+
+    from .models import Review
+
+    def compute():
+        agg = Review.objects.filter(item_id=item_id).aggregate(avg=Avg("rating"), cnt=Count("id"))
+        return {"avg": round(agg["avg"] or 0, 1), "cnt": agg["cnt"] or 0}
+
+    return tiered.get_or_set(f"reviews:{item_id}", ("summary",), compute)
+
+
+def save_cart(request, cart):
+    """Store the session cart with its navbar count and a version for fragment keys."""
+    request.session["cart"] = cart
+    request.session["cart_count"] = sum(cart.values())
+    request.session["cart_version"] = request.session.get("cart_version", 0) + 1
+
+
+def cart_count(request):
+    """Navbar ``cart_count``; counted once per cart change instead of per page."""
+    count = request.session.get("cart_count")
+    if count is None:
+        count = sum(request.session.get("cart", {}).values())
+    return count
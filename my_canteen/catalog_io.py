@@ -0,0 +1,264 @@
+# my_canteen/catalog_io.py
+"""
+Bulk catalog import / export (CSV or JSON).
+
+Import runs in three steps so a bad file never half-applies:
+
+1. ``parse``    rows -> validated dicts, every error collected with its line
+2. ``plan``     diff against the current items (matched by name, case-insensitive):
+                creates, per-field updates and, optionally, deactivation of
+                active items missing from the file
+3. ``apply``    one transaction: missing categories, ``bulk_create`` for new
+                items, ``bulk_update`` for changed fields other than stock,
+                ``stock.adjust`` (row lock + ledger row) per stock change,
+                then one catalog change-log / cache bump for the whole batch
+
+Only the columns present in the file are compared, so ``name,stock`` is a
+valid stock-take file; a blank cell also leaves the current value alone. ``name`` is always required, ``price`` for new items.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import catalog_sync, stock
+from .cache import bump_stock
+from .models import Category, MenuItem, StockMovement
+
+FIELDS = ("name", "category", "price", "stock", "is_active", "is_popular", "description", "image")
+MAX_PRICE = Decimal("9999.99")  # MenuItem.price: max_digits=6, decimal_places=2
+TRUE = {"1", "true", "yes", "y", "on"}
+FALSE = {"0", "false", "no", "n", "off"}
+
+
+class ImportPlan:
+    def __init__(self):
+        self.creates = []        # validated rows
+        self.updates = []        # (MenuItem, row, changed field names)
+        self.deactivate = []     # MenuItem
+        self.categories = {}     # lower-cased name -> name, to create
+
+    @property
+    def is_empty(self):
+        return not (self.creates or self.updates or self.deactivate)
+
+    def summary(self):
+        return (
+            f"{len(self.creates)} new, {len(self.updates)} updated, "
+            f"{len(self.deactivate)} deactivated, {len(self.categories)} new categories"
+        )
+
+
+# ---------- Export ----------
+def export_rows(queryset=None):
+    qs = MenuItem.objects.all() if queryset is None else queryset
+    for row in qs.order_by("name").values_list(
+        "name", "category__name", "price", "stock", "is_active", "is_popular", "description", "image"
+    ).iterator(chunk_size=2000):
+        yield dict(zip(FIELDS, row), price=str(row[2]), category=row[1] or "", image=row[7] or "")
+
+
+def dump(rows, fmt):
+    if fmt == "json":
+        return json.dumps(list(rows), indent=2, ensure_ascii=False)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+# ---------- Import ----------
+def read(text, fmt):
+    """Raw rows from CSV / JSON text."""
+    if fmt == "json":
+        data = json.loads(text)
+        if not isinstance(data, list):
+            raise ValueError("JSON catalog must be a list of objects")
+        return data
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _bool(value):
+    text = value.lower()
+    if text in TRUE:
+        return True
+    if text in FALSE:
+        return False
+    raise ValueError(f"not a yes/no value: {value!r}")
+
+
+def _clean_row(raw):
+    row = {}
+    for key, value in raw.items():
+        key = (key or "").strip().lower()
+        if key not in FIELDS:
+            continue
+        value = "" if value is None else str(value).strip()
+        if value == "":
+            continue  # blank cell: keep the current value (or the default for new items)
+        if key in ("name", "category", "description", "image"):
+            row[key] = value
+        elif key == "price":
+            try:
+                price = Decimal(value).quantize(Decimal("0.01"))
+            except InvalidOperation:
+                raise ValueError(f"price is not a number: {value}")
+            if not Decimal("0") <= price <= MAX_PRICE:
+                raise ValueError(f"price out of range: {value}")
+            row[key] = price
+        elif key == "stock":
+            stock = int(value)
+            if stock < 0:
+                raise ValueError(f"negative stock: {value}")
+            row[key] = stock
+        else:
+            row[key] = _bool(value)
+    if not row.get("name"):
+        raise ValueError("name is required")
+    image = row.get("image", "")
+    if image.startswith("/") or ".." in image.split("/"):
+        raise ValueError(f"image must be a path under MEDIA_ROOT: {image}")
+    return row
+
+
+def parse(raw_rows):
+    """Returns ``(rows, errors)``; ``errors`` are ``"line N: message"`` strings."""
+    rows, errors, seen = [], [], {}
+    for line, raw in enumerate(raw_rows, start=2):  # line 1 is the CSV header
+        try:
+            row = _clean_row(raw)
+        except (ValueError, AttributeError) as exc:
+            errors.append(f"line {line}: {exc}")
+            continue
+        key = row["name"].lower()
+        if key in seen:
+            errors.append(f"line {line}: duplicate of line {seen[key]} ({row['name']})")
+            continue
+        seen[key] = line
+        rows.append(row)
+    return rows, errors
+
+
+def plan(rows, deactivate_missing=False):
+    """Diff validated rows against the database. Returns ``(ImportPlan, errors)``."""
+    result, errors = ImportPlan(), []
+    categories = {c.name.lower(): c for c in Category.objects.all()}
+    existing = {}
+    for item in MenuItem.objects.select_related("category").order_by("id"):
+        existing.setdefault(item.name.lower(), item)
+
+    for row in rows:
+        cat_name = row.get("category")
+        if cat_name and cat_name.lower() not in categories:
+            result.categories.setdefault(cat_name.lower(), cat_name)
+        item = existing.pop(row["name"].lower(), None)
+        if item is None:
+            if "price" not in row:
+                errors.append(f"{row['name']}: price is required for new items")
+                continue
+            result.creates.append(row)
+            continue
+        changed = []
+        for field, value in row.items():
+            if field == "name":
+                if item.name != value:
+                    changed.append("name")
+            elif field == "category":
+                current = item.category.name if item.category else ""
+                if current.lower() != value.lower():
+                    changed.append("category")
+            elif field == "image":
+                if (item.image.name or "") != value:
+                    changed.append("image")
+            elif getattr(item, field) != value:
+                changed.append(field)
+        if changed:
+            result.updates.append((item, row, changed))
+
+    if deactivate_missing:
+        result.deactivate = [item for item in existing.values() if item.is_active]
+    return result, errors
+
+
+@transaction.atomic
+def apply(result):
+    """Write an ``ImportPlan``; returns the ids of every touched item."""
+    now = timezone.now()
+    new_categories = Category.objects.bulk_create(
+        Category(name=name) for name in sorted(result.categories.values())
+    )
+    if new_categories:
+        catalog_sync.record("category", [c.pk for c in new_categories], "upsert")
+    categories = {c.name.lower(): c for c in Category.objects.all()}
+
+    def category_for(name):
+        return categories[name.lower()] if name else None
+
+    created = MenuItem.objects.bulk_create(
+        [
+            MenuItem(
+                name=row["name"], category=category_for(row.get("category")), price=row["price"],
+                stock=row.get("stock", 0), is_active=row.get("is_active", True),
+                is_popular=row.get("is_popular", False), description=row.get("description", ""),
+                image=row.get("image", ""),
+            )
+            for row in result.creates
+        ],
+        batch_size=500,
+    )
+
+    movements = [
+        StockMovement(item=item, kind="restock", quantity=item.stock, note="catalog import")
+        for item in created if item.stock
+    ]
+    if movements:
+        StockMovement.objects.bulk_create(movements, batch_size=500)
+        transaction.on_commit(bump_stock)
+
+    # one bulk_update per distinct set of changed fields keeps the UPDATEs narrow;
+    # stock is never written from the plan: checkouts may have moved it since
+    by_fields, stock_takes, stock_only = {}, [], set()
+    for item, row, changed in result.updates:
+        if "stock" in changed:
+            stock_takes.append((item, row["stock"]))
+            changed = [f for f in changed if f != "stock"]
+            if not changed:
+                stock_only.add(item.pk)
+                continue
+        for field in changed:
+            value = row[field]
+            setattr(item, field, category_for(value) if field == "category" else value)
+        item.updated_at = now
+        by_fields.setdefault(tuple(sorted(changed)), []).append(item)
+    for fields, items in by_fields.items():
+        MenuItem.objects.bulk_update(items, [*fields, "updated_at"], batch_size=500)
+    for item, level in stock_takes:
+        stock.adjust(item, level, note="catalog import")
+
+    for item in result.deactivate:
+        item.is_active = False
+        item.updated_at = now
+    MenuItem.objects.bulk_update(result.deactivate, ["is_active", "updated_at"], batch_size=500)
+
+    touched = [i.pk for i in created] + [i.pk for i, _, _ in result.updates] + [i.pk for i in result.deactivate]
+    if stock_only:
+        catalog_sync.record_bulk(stock_only, stock_only=True)
+    if len(touched) > len(stock_only):
+        catalog_sync.record_bulk([pk for pk in touched if pk not in stock_only])
+    return touched
+
+
+def import_catalog(text, fmt, deactivate_missing=False, dry_run=False):
+    """Parse, plan and (unless ``dry_run``) apply. Returns ``(ImportPlan, errors)``."""
+    rows, errors = parse(read(text, fmt))
+    if not rows and not errors:
+        errors.append("the file has no rows")  # never let an empty file deactivate the menu
+    result, plan_errors = plan(rows, deactivate_missing=deactivate_missing)
+    errors += plan_errors
+    if not errors and not dry_run and not result.is_empty:
+        apply(result)
+    return result, errors
@@ -0,0 +1,156 @@
+# my_canteen/catalog_sync.py
+"""
+Versioned catalog for kiosk / mobile clients.
+
+- ``snapshot()``          full catalog + the version it corresponds to
+- ``changes_since(v)``    only what changed after version ``v``:
+  full rows for created/updated items and categories, ids for deletions,
+  and ``[id, stock]`` pairs for stock-only changes (the common case while
+  orders flow in), so a poll every few seconds is a few bytes.
+- ``compact()``           folds the log down to one row per object.
+
+Versions are ``CatalogChange`` ids. Signals record single-row edits; code
+that bypasses signals (``queryset.update``, ``bulk_update``) must call
+``record_bulk``.
+"""
+from django.db import transaction
+
+from .cache import bump_catalog
+from .models import CatalogChange, Category, MenuItem
+from .prerender import schedule_publish
+from .search import bump_search_index
+from .stock import levels
+
+# fields whose change is sent as a compact [id, stock] pair
+STOCK_ONLY_FIELDS = {"stock", "updated_at"}
+MAX_CHANGES = 5000
+
+ITEM_FIELDS = (
+    "id", "name", "description", "price", "stock", "category_id", "is_active",
+    "is_popular", "rating_avg", "rating_count", "image", "updated_at",
+)
+CATEGORY_FIELDS = ("id", "name")
+
+
+def record(kind, object_ids, action, stock=None):
+    CatalogChange.objects.bulk_create(
+        CatalogChange(kind=kind, object_id=oid, action=action, stock=stock) for oid in object_ids
+    )
+
+
+def record_item_save(item, update_fields=None):
+    if update_fields and set(update_fields) <= STOCK_ONLY_FIELDS:
+        record("item", [item.pk], "stock", stock=item.stock)
+    else:
+        record("item", [item.pk], "upsert")
+
+
+def record_bulk(item_ids, stock_only=False):
+    """
+    For bulk paths that skip post_save: log the rows and invalidate caches.
+    Stock-only changes leave the catalog version (and so the pre-rendered
+    pages) alone; the ledger in stock.py has already bumped ``stock``.
+    """
+    item_ids = list(item_ids)
+    if stock_only:
+        CatalogChange.objects.bulk_create(
+            CatalogChange(kind="item", object_id=i, action="stock", stock=s)
+            for i, s in levels(item_ids).items()
+        )
+        return
+    record("item", item_ids, "upsert")
+    transaction.on_commit(bump_catalog)
+    transaction.on_commit(bump_search_index)
+    transaction.on_commit(schedule_publish)
+
+
+def current_version():
+    return CatalogChange.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+def _serialize_items(qs):
+    rows = list(qs.values(*ITEM_FIELDS))
+    for row in rows:
+        row["price"] = str(row["price"])
+        row["updated_at"] = row["updated_at"].isoformat()
+    return rows
+
+
+def snapshot():
+    # version first: anything written while we read is re-sent by the next delta
+    version = current_version()
+    return {
+        "version": version,
+        "categories": list(Category.objects.order_by("id").values(*CATEGORY_FIELDS)),
+        "items": _serialize_items(MenuItem.objects.order_by("id")),
+    }
+
+
+def changes_since(since):
+    log = list(
+        CatalogChange.objects.filter(id__gt=since)
+        .order_by("id")
+        .values_list("id", "kind", "object_id", "action", "stock")[:MAX_CHANGES]
+    )
+    if not log:
+        return {"version": since, "more": False}
+
+    # collapse to the net effect per object
+    net = {}
+    for _id, kind, object_id, action, stock in log:
+        prev = net.get((kind, object_id))
+        if action == "stock" and prev and prev[0] == "upsert":
+            continue  # full row is sent anyway
+        net[(kind, object_id)] = (action, stock)
+
+    upserts = {"item": [], "category": []}
+    deleted = {"item": [], "category": []}
+    stock = []
+    for (kind, object_id), (action, value) in net.items():
+        if action == "delete":
+            deleted[kind].append(object_id)
+        elif action == "stock":
+            stock.append([object_id, value])
+        else:
+            upserts[kind].append(object_id)
+
+    result = {"version": log[-1][0], "more": len(log) == MAX_CHANGES}
+    if upserts["item"]:
+        result["items"] = _serialize_items(MenuItem.objects.filter(id__in=upserts["item"]))
+    if upserts["category"]:
+        result["categories"] = list(
+            Category.objects.filter(id__in=upserts["category"]).values(*CATEGORY_FIELDS)
+        )
+    if stock:
+        result["stock"] = stock
+    if deleted["item"] or deleted["category"]:
+        result["deleted"] = {k: v for k, v in deleted.items() if v}
+    return result
+
+
+@transaction.atomic
+def compact():
+    """
+    Keep only the newest row per object. A stock row that outlives an upsert is
+    promoted to ``upsert`` so clients syncing from before the upsert still get
+    the full row. Returns the number of rows removed.
+    """
+    latest = {}
+    promote = set()
+    drop = []
+    rows = CatalogChange.objects.order_by("id").values_list("id", "kind", "object_id", "action")
+    for row_id, kind, object_id, action in rows.iterator(chunk_size=5000):
+        key = (kind, object_id)
+        if key in latest:
+            prev_id, prev_action = latest[key]
+            drop.append(prev_id)
+            if action == "stock" and (prev_action == "upsert" or prev_id in promote):
+                promote.add(row_id)
+        latest[key] = (row_id, action)
+
+    for start in range(0, len(drop), 900):
+        CatalogChange.objects.filter(id__in=drop[start:start + 900]).delete()
+    promote_ids = [rid for rid, _ in latest.values() if rid in promote]
+    for start in range(0, len(promote_ids), 900):
+        CatalogChange.objects.filter(id__in=promote_ids[start:start + 900]).update(action="upsert", stock=None)
+    return len(drop)
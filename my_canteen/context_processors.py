@@ -1,3 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cache import cart_count as _cart_count
+
+
 def cart_count(request):
-    cart = request.session.get("cart", {})
-    return {"cart_count": sum(cart.values())}
+    return {"cart_count": _cart_count(request)}
+
+
+def _role(user):
+    if not user.is_authenticated:
+        return "anon"
+    profile = getattr(user, "userprofile", None)
+    return profile.role if profile else "guest"
+
+
+def fragment_keys(request):
+    """Vary-on values for {% cache %} blocks; the role is only looked up if a template asks."""
+    return {"nav_role": SimpleLazyObject(lambda: _role(request.user))}
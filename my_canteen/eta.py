@@ -0,0 +1,147 @@
+# my_canteen/eta.py
+"""
+Ready-time estimates behind ``order_status_api``.
+
+Each process holds a ``QueueModel`` rebuilt at most every
+``CANTEEN_ETA_REFRESH_SECONDS`` seconds from two compact reads:
+
+- the open queue: one row per line of every pending / accepted / preparing
+  order (``OrderItem`` joined to its order)
+- typical prep time per item: p50 of the last ``HISTORY_DAYS`` of
+  ``KitchenSla`` prep histograms (my_canteen/sla.py), re-read every
+  ``HISTORY_REFRESH`` seconds, falling back to the kitchen-wide p50 and then
+  ``DEFAULT_PREP``
+
+An order's own work is its slowest item (lines are cooked side by side). The
+kitchen works first-come first-served on ``CANTEEN_KITCHEN_PARALLEL`` orders
+at once, so an order is ready once the work queued ahead of it has drained
+through those stations and its own work is done; a preparing order only has
+its remaining prep left. Polls are answered from the model without touching the database.
+
+``signature`` changes only when the queue or the history does; it feeds the
+``order_status_api`` ETag so unchanged estimates still answer 304.
+"""
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import KitchenSla, OrderItem
+from .sla import BOUNDS, percentile
+
+HISTORY_REFRESH = 300
+HISTORY_DAYS = 14
+DEFAULT_PREP = 480.0        # seconds, until the kitchen has history
+QUEUED = ("pending", "accepted", "preparing")
+
+# suggested client poll interval, seconds
+RETRY_MIN, RETRY_MAX = 10, 120
+RETRY_READY = 60            # waiting at the counter: nothing changes until pickup
+
+
+def refresh_seconds():
+    return getattr(settings, "CANTEEN_ETA_REFRESH_SECONDS", 5)
+
+
+def parallel_stations():
+    return max(getattr(settings, "CANTEEN_KITCHEN_PARALLEL", 3), 1)
+
+
+def prep_history(days=HISTORY_DAYS):
+    """``({item_id: p50 seconds}, kitchen p50 or None)`` from the hourly prep histograms."""
+    since = timezone.now() - timedelta(days=days)
+    merged = defaultdict(lambda: [0] * (len(BOUNDS) + 1))
+    rows = KitchenSla.objects.filter(metric="prep", scope__in=("item", "all"), hour__gte=since).values_list(
+        "scope", "key", "buckets"
+    )
+    for scope, key, buckets in rows:
+        acc = merged[scope, key]
+        merged[scope, key] = [a + b for a, b in zip(acc, buckets)]
+    kitchen = merged.pop(("all", 0), None)
+    return (
+        {key: percentile(buckets, 0.5) for (_, key), buckets in merged.items()},
+        percentile(kitchen, 0.5) if kitchen else None,
+    )
+
+
+class QueueModel:
+    def __init__(self, lines, per_item, kitchen, now):
+        """``lines``: ``(order_id, status, created_at, updated_at, item_id)`` rows of the open queue."""
+        self.built_at = now
+        fallback = kitchen or DEFAULT_PREP
+        orders = {}
+        for order_id, status, created_at, updated_at, item_id in lines:
+            order = orders.setdefault(order_id, [created_at, status, updated_at, 0.0])
+            order[3] = max(order[3], per_item.get(item_id, fallback))
+
+        self.ready_in = {}   # order id -> seconds from built_at
+        ahead = 0.0          # work still queued in front, in seconds of one station
+        parallel = parallel_stations()
+        for order_id, (created_at, status, updated_at, work) in sorted(orders.items(), key=lambda kv: (kv[1][0], kv[0])):
+            if status == "preparing":
+                # already on a station: only the rest of its prep is left (updated_at ~ when it started)
+                left = max(work - (now - updated_at).total_seconds(), 0.0)
+                self.ready_in[order_id] = left
+                ahead += left
+            else:
+                self.ready_in[order_id] = ahead / parallel + work
+                ahead += work
+        latest = max((row[3] for row in lines), default=None)
+        self.signature = "{}-{}-{:x}".format(
+            len(orders), int(latest.timestamp()) if latest else 0,
+            zlib.crc32(repr((sorted(per_item.items()), kitchen)).encode()),
+        )
+
+    def estimate(self, order_id):
+        """Aware ``estimated_ready_at`` for an open order, or ``None`` if it is not queued."""
+        seconds = self.ready_in.get(order_id)
+        if seconds is None:
+            return None
+        return self.built_at + timedelta(seconds=seconds)
+
+
+_model, _model_at = None, 0.0
+_history, _history_at = None, 0.0
+_lock = threading.Lock()
+
+
+def build():
+    global _history, _history_at
+    if _history is None or time.monotonic() - _history_at >= HISTORY_REFRESH:
+        _history, _history_at = prep_history(), time.monotonic()
+    lines = OrderItem.objects.filter(order__status__in=QUEUED).values_list(
+        "order_id", "order__status", "order__created_at", "order__updated_at", "item_id"
+    )
+    return QueueModel(list(lines), *_history, timezone.now())
+
+
+def get_model(max_age=None):
+    global _model, _model_at
+    max_age = refresh_seconds() if max_age is None else max_age
+    if _model is None or time.monotonic() - _model_at >= max_age:
+        with _lock:
+            if _model is None or time.monotonic() - _model_at >= max_age:
+                _model, _model_at = build(), time.monotonic()
+    return _model
+
+
+def for_order(order):
+    """``(estimated_ready_at, retry_after)`` for ``order``; either may be ``None``."""
+    if order.status == "ready":
+        return None, RETRY_READY
+    if order.status not in QUEUED:
+        return None, None  # delivered / completed / cancelled: stop polling
+    model = get_model()
+    eta = model.estimate(order.pk)
+    if eta is None:  # placed or reopened after the last refresh
+        model = get_model(max_age=1)
+        eta = model.estimate(order.pk)
+    if eta is None:
+        return None, RETRY_MIN
+    left = (eta - timezone.now()).total_seconds()
+    # far off: check back halfway there (the queue may move); close: every RETRY_MIN
+    return eta, int(min(max(left / 2, RETRY_MIN), RETRY_MAX))
@@ -0,0 +1,128 @@
+# my_canteen/exports.py
+"""
+Streaming CSV / JSONL exports of orders, order lines and payments (live or
+``archived_*``).
+
+Rows come straight from ``values_list().iterator(chunk_size=CHUNK_SIZE)`` and
+are encoded as they arrive, so memory stays flat for a year of data. The same
+generator backs the ``exports/<dataset>/`` view (``StreamingHttpResponse``),
+the OrderAdmin / PaymentAdmin actions and ``manage.py export_data``.
+"""
+import csv
+import json
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, ArchivedPayment, Order, OrderItem, Payment
+
+CHUNK_SIZE = 2000   # rows per database fetch
+BATCH_ROWS = 500    # rows per chunk handed to the response / file
+
+DATASETS = {
+    "orders": {
+        "model": Order,
+        "columns": (
+            "id", "user__username", "status", "payment_status", "payment_method",
+            "total_price", "created_at", "updated_at",
+        ),
+        "date": "created_at", "status": "status", "method": "payment_method",
+    },
+    "order_items": {
+        "model": OrderItem,
+        "columns": (
+            "id", "order_id", "order__created_at", "order__status", "item_id", "item__name",
+            "quantity", "unit_price",
+        ),
+        "date": "order__created_at", "status": "order__status", "method": "order__payment_method",
+    },
+    "payments": {
+        "model": Payment,
+        "columns": (
+            "id", "order_id", "method", "status", "amount", "transaction_id",
+            "paid_at", "created_at",
+        ),
+        "date": "created_at", "status": "status", "method": "method",
+    },
+}
+# the archive tables have the same columns (my_canteen/archive.py)
+DATASETS["archived_orders"] = {**DATASETS["orders"], "model": ArchivedOrder}
+DATASETS["archived_order_items"] = {**DATASETS["order_items"], "model": ArchivedOrderItem}
+DATASETS["archived_payments"] = {**DATASETS["payments"], "model": ArchivedPayment}
+FORMATS = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+
+def filtered(dataset, queryset=None, date_from=None, date_to=None, status=None, method=None):
+    """``date_from`` / ``date_to`` are local dates, both inclusive."""
+    spec = DATASETS[dataset]
+    qs = spec["model"].objects.all() if queryset is None else queryset
+    tz = timezone.get_current_timezone()
+    if date_from:
+        qs = qs.filter(**{f"{spec['date']}__gte": timezone.make_aware(datetime.combine(date_from, dt_time.min), tz)})
+    if date_to:
+        end = datetime.combine(date_to + timedelta(days=1), dt_time.min)
+        qs = qs.filter(**{f"{spec['date']}__lt": timezone.make_aware(end, tz)})
+    if status:
+        qs = qs.filter(**{spec["status"]: status})
+    if method:
+        qs = qs.filter(**{spec["method"]: method})
+    return qs
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _Echo:
+    """File-like object whose ``write`` just returns the line (csv.writer needs one)."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_cell(v) for v in row])
+
+
+def _jsonl_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, map(_cell, row))), separators=(",", ":")) + "\n"
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= BATCH_ROWS:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def stream(dataset, fmt, queryset):
+    """Text chunks of ``queryset`` exported as ``fmt``."""
+    columns = DATASETS[dataset]["columns"]
+    rows = queryset.order_by("pk").values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+    lines = _csv_lines(columns, rows) if fmt == "csv" else _jsonl_lines(columns, rows)
+    return _batched(lines)
+
+
+def filename(dataset, fmt):
+    return f"{dataset}-{timezone.localdate():%Y%m%d}.{fmt}"
+
+
+def streaming_response(dataset, fmt, queryset):
+    response = StreamingHttpResponse(stream(dataset, fmt, queryset), content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename(dataset, fmt)}"'
+    response["Cache-Control"] = "no-store"
+    return response
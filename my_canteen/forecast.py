@@ -0,0 +1,179 @@
+# my_canteen/forecast.py
+"""
+Next-day demand forecast per item and quarter-hour slot.
+
+``OrderItem`` history is bucketed into two arrays, one row per item:
+
+- ``daily``  (items x days)       quantity sold per day
+- ``slots``  (items x 7 x 96)     quantity sold per weekday and 15-minute slot
+
+and every item is fitted at once with array operations, no per-item loop:
+
+1. day-of-week factors (mean of that weekday / overall mean), shrunk towards
+   flat for items with little history
+2. simple exponential smoothing of the de-seasonalised daily series, done as
+   one matrix-vector product with the smoothing weights
+3. forecast = level x factor for the target weekday, spread over the day by
+   the item's slot profile for that weekday (again shrunk towards its all-week
+   profile, then the canteen-wide one)
+
+NumPy is optional for the web app; only ``manage.py forecast_demand`` needs it.
+"""
+import math
+from datetime import datetime, time as dt_time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrderItem, DemandForecast, MenuItem, OrderItem
+
+try:  # optional dependency
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+SLOTS_PER_DAY = 96
+HISTORY_DAYS = 365
+ALPHA = 0.3     # smoothing weight of the newest day
+SHRINK = 20.0   # units sold at which an item's own profile gets half the weight
+SAFETY = 0.15   # prep buffer on top of the forecast
+
+
+def load_history(start, end):
+    """
+    Sales between local dates ``start`` (inclusive) and ``end`` (exclusive) as
+    parallel arrays: item id, day offset from ``start``, slot, quantity.
+
+    Columns come straight from ``values_list`` into arrays; the local day and
+    slot are worked out on the whole array, with the UTC offset looked up per
+    hour of the window so DST changes still land in the right slot.
+    """
+    tz = timezone.get_current_timezone()
+    first = timezone.make_aware(datetime.combine(start, dt_time.min), tz)
+    window = {
+        "order__created_at__gte": first,
+        "order__created_at__lt": timezone.make_aware(datetime.combine(end, dt_time.min), tz),
+    }
+    columns = ([], [], [])
+    # a year of history spans the live tables and the archive (my_canteen/archive.py)
+    for model in (OrderItem, ArchivedOrderItem):
+        rows = (
+            model.objects.filter(**window)
+            .exclude(order__status="cancelled")
+            .values_list("item_id", "quantity", "order__created_at")
+        )
+        for column, values in zip(columns, zip(*rows)):
+            column.extend(values)
+    item_ids, qty, created = columns
+
+    origin = first.timestamp()
+    elapsed = (np.fromiter(map(datetime.timestamp, created), np.float64, len(created)) - origin).astype(np.int64)
+    offsets = np.array(
+        [
+            datetime.fromtimestamp(origin + hour * 3600, tz).utcoffset().total_seconds()
+            for hour in range(((end - start).days + 1) * 24)
+        ],
+        dtype=np.int64,
+    )
+    local = elapsed + offsets[elapsed // 3600] - offsets[0]  # wall-clock seconds since midnight of ``start``
+    return (
+        np.array(item_ids, dtype=np.int64), local // 86400, local % 86400 // 900,
+        np.array(qty, dtype=np.float64),
+    )
+
+
+def _shrunk(own, fallback, volume):
+    """Blend each row of ``own`` towards ``fallback`` by how much history backs it."""
+    trust = (volume / (volume + SHRINK))[:, None]
+    return trust * own + (1 - trust) * fallback
+
+
+def _normalized(counts):
+    sums = counts.sum(axis=-1, keepdims=True)
+    return np.divide(counts, sums, out=np.zeros_like(counts), where=sums > 0), sums[..., 0]
+
+
+def fit(item_idx, day_idx, slot_idx, qty, n_items, n_days, first_weekday, target_weekday, alpha=ALPHA):
+    """
+    Vectorised fit over all items. Returns ``(total, slots)``: the forecast
+    quantity for the target day per item and its (n_items x 96) split.
+    """
+    weekday_of_day = (first_weekday + np.arange(n_days)) % 7
+
+    daily = np.bincount(item_idx * n_days + day_idx, weights=qty, minlength=n_items * n_days)
+    daily = daily.reshape(n_items, n_days)
+
+    # 1. day-of-week factors
+    onehot = np.eye(7)[weekday_of_day]                                # days x 7
+    weekday_mean = (daily @ onehot) / np.maximum(onehot.sum(axis=0), 1)
+    overall = daily.mean(axis=1, keepdims=True)
+    raw = np.divide(weekday_mean, overall, out=np.ones_like(weekday_mean), where=overall > 0)
+    factor = _shrunk(raw, np.ones(7), daily.sum(axis=1))
+
+    # 2. exponential smoothing as a weighted sum; the first day carries the initial level
+    seasonal = factor[:, weekday_of_day]
+    adjusted = np.divide(daily, seasonal, out=np.zeros_like(daily), where=seasonal > 0)
+    weights = alpha * (1 - alpha) ** np.arange(n_days - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - alpha) ** (n_days - 1)
+    level = adjusted @ weights
+
+    total = level * factor[:, target_weekday]
+
+    # 3. intraday shape
+    profile = np.bincount(
+        (item_idx * 7 + weekday_of_day[day_idx]) * SLOTS_PER_DAY + slot_idx,
+        weights=qty, minlength=n_items * 7 * SLOTS_PER_DAY,
+    ).reshape(n_items, 7, SLOTS_PER_DAY)
+    canteen, _ = _normalized(profile.sum(axis=(0, 1)))
+    week, week_volume = _normalized(profile.sum(axis=1))
+    week = _shrunk(week, canteen, week_volume)
+    day, day_volume = _normalized(profile[:, target_weekday, :])
+    shape = _shrunk(day, week, day_volume)
+
+    return total, total[:, None] * shape
+
+
+def run(target=None, history_days=HISTORY_DAYS):
+    """Fit and store forecasts for ``target`` (default: tomorrow). Returns the row count."""
+    today = timezone.localdate()
+    target = target or today + timedelta(days=1)
+    end = min(target, today)  # complete days only; today's partial sales would drag the level down
+    start = end - timedelta(days=history_days)
+    item_ids, days, slots, qty = load_history(start, end)
+    if not len(item_ids):
+        return 0
+
+    ids, item_idx = np.unique(item_ids, return_inverse=True)
+    total, split = fit(
+        item_idx, days, slots, qty, len(ids), history_days, start.weekday(), target.weekday()
+    )
+
+    active = set(MenuItem.objects.filter(is_active=True).values_list("id", flat=True))
+    peaks = split.argmax(axis=1)
+    rows = [
+        DemandForecast(
+            item_id=int(item_id), date=target, total=round(float(total[i]), 2),
+            prep=math.ceil(total[i] * (1 + SAFETY) - 1e-9), peak_slot=int(peaks[i]),
+            slots=np.round(split[i], 2).tolist(),
+        )
+        for i, item_id in enumerate(ids)
+        if item_id in active
+    ]
+    with transaction.atomic():
+        DemandForecast.objects.filter(date=target).delete()
+        DemandForecast.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def upcoming(today=None):
+    """``(date, forecasts)`` for the nearest forecast day from today, biggest prep first."""
+    today = today or timezone.localdate()
+    date = (
+        DemandForecast.objects.filter(date__gte=today)
+        .order_by("date").values_list("date", flat=True).first()
+    )
+    if date is None:
+        return None, []
+    return date, list(
+        DemandForecast.objects.filter(date=date).select_related("item").order_by("-prep", "item__name")
+    )
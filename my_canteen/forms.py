@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 from .models import Review, Payment
 
@@ -143,6 +144,20 @@ class CheckoutPaymentForm(forms.Form):
         label="CVC",
         widget=forms.TextInput(attrs={"class": "form-control", "placeholder": "123"})
     )
+    pickup_slot = forms.TypedChoiceField(
+        coerce=int,
+        label="Pickup Time",
+        error_messages={"invalid_choice": "That pickup time is full now. Please pick another."},
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
+    def __init__(self, *args, slots=(), **kwargs):
+        """``slots``: the open ``slots.open_slots()`` rows for this cart."""
+        super().__init__(*args, **kwargs)
+        self.fields["pickup_slot"].choices = [
+            (row["id"], f"{timezone.localtime(row['starts_at']):%H:%M}")
+            for row in slots
+        ]
 
     def clean(self):
         cleaned_data = super().clean()
@@ -159,3 +174,24 @@ class CheckoutPaymentForm(forms.Form):
             if not cvc.isdigit() or not (3 <= len(cvc) <= 4):
                 raise ValidationError("CVC must be 3 or 4 digits.")
         return cleaned_data
+
+
+# ------------------------------------------------
+# 📥 Catalog Import Form (admin)
+# ------------------------------------------------
+class CatalogImportForm(forms.Form):
+    """
+    Upload for MenuItemAdmin's "Import catalog" page (see my_canteen/catalog_io.py).
+    """
+    file = forms.FileField(label="Catalog file (.csv or .json)")
+    deactivate_missing = forms.BooleanField(
+        required=False,
+        label="Deactivate active items that are not in the file",
+    )
+    dry_run = forms.BooleanField(required=False, initial=True, label="Dry run (preview only)")
+
+    def clean_file(self):
+        upload = self.cleaned_data["file"]
+        if not upload.name.lower().endswith((".csv", ".json")):
+            raise ValidationError("Upload a .csv or .json file.")
+        return upload
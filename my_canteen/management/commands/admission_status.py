@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from my_canteen.admission import stats
+
+
+class Command(BaseCommand):
+    help = "Show admission-control leases in use, waiting room depth and shed counts per gate."
+
+    def handle(self, *args, **opts):
+        for name, row in stats().items():
+            self.stdout.write(
+                f"{name}: {row['in_use']}/{row['concurrency']} in flight, {row['queue_depth']} waiting, "
+                f"shed {row['shed_rate']} rate-limited / {row['shed_busy']} busy, {row['queued']} sent to the waiting room"
+            )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from my_canteen import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed / cancelled orders older than N days (with lines and payments) into the "
+        "archive tables, one short transaction per batch. Safe to stop and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=archive.after_days())
+        parser.add_argument("--batch-size", type=int, default=archive.BATCH_SIZE)
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches (resume later).")
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to pause between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would move.")
+
+    def handle(self, *args, **opts):
+        before = archive.cutoff(opts["days"])
+        self._sizes("Before")
+        if opts["dry_run"]:
+            self.stdout.write(f"{archive.candidates(before).count()} order(s) would be archived.")
+            return
+
+        moved = batches = 0
+        while opts["max_batches"] is None or batches < opts["max_batches"]:
+            count = archive.archive_batch(before, opts["batch_size"])
+            if not count:
+                break
+            moved += count
+            batches += 1
+            self.stdout.write(f"  batch {batches}: {count} order(s)")
+            if opts["sleep"]:
+                time.sleep(opts["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} order(s) in {batches} batch(es)."))
+        self._sizes("After")
+
+    def _sizes(self, label):
+        sizes = ", ".join(f"{name} {live} live / {cold} archived" for name, (live, cold) in archive.table_sizes().items())
+        self.stdout.write(f"{label}: {sizes}")
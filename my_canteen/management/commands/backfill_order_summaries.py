@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from my_canteen.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill Order.item_count / items_summary / customer_name (live and archived) from the "
+        "order lines, in batches. Only rows without a summary unless --all."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Recompute every order, not just empty ones.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        for orders, lines in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+            done = self.backfill(orders, lines, opts["batch_size"], opts["all"])
+            self.stdout.write(self.style.SUCCESS(f"{orders.__name__}: {done} order(s) summarised."))
+
+    def backfill(self, orders, lines, batch_size, everything):
+        qs = orders.objects.all() if everything else orders.objects.filter(customer_name="")
+        done, last_id = 0, 0
+        while True:
+            # keyset pagination on id: each batch is its own short transaction
+            batch = list(
+                qs.filter(id__gt=last_id).order_by("id").values_list("id", "user__username")[:batch_size]
+            )
+            if not batch:
+                return done
+            ids = [pk for pk, _ in batch]
+            by_order = {}
+            for order_id, name, qty in (
+                lines.objects.filter(order_id__in=ids).order_by("id").values_list("order_id", "item__name", "quantity")
+            ):
+                by_order.setdefault(order_id, []).append((name, qty))
+            rows = []
+            for pk, username in batch:
+                item_count, summary = Order.summarize(by_order.get(pk, []))
+                rows.append(orders(id=pk, item_count=item_count, items_summary=summary, customer_name=username))
+            with transaction.atomic():
+                orders.objects.bulk_update(rows, ["item_count", "items_summary", "customer_name"])
+            done += len(rows)
+            last_id = ids[-1]
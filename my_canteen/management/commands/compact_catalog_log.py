@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from my_canteen.catalog_sync import compact
+
+
+class Command(BaseCommand):
+    help = "Fold the catalog change log down to the newest row per item / category."
+
+    def handle(self, *args, **opts):
+        removed = compact()
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} superseded change row(s)."))
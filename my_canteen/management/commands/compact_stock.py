@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from my_canteen import stock
+
+
+class Command(BaseCommand):
+    help = "Rebalance hot-item stock shards and fold old stock-ledger rows into snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-days", type=int, default=30, help="Ledger rows newer than this stay (default 30).")
+
+    def handle(self, *args, **opts):
+        items = stock.rebalance()
+        folded = stock.compact(timezone.now() - timedelta(days=opts["keep_days"]))
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced {items} sharded item(s), folded {folded} ledger row(s)."))
+        for item_id, (ledger, level) in stock.ledger_drift().items():
+            self.stdout.write(self.style.WARNING(f"Item #{item_id}: ledger says {ledger}, stock is {level}"))
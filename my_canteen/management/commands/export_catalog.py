@@ -0,0 +1,26 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from my_canteen import catalog_io
+from my_canteen.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = "Write the menu catalog as CSV / JSON (the format import_catalog reads)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=["csv", "json"], default="csv")
+        parser.add_argument("--active-only", action="store_true")
+        parser.add_argument("-o", "--output", default="-", help="File to write (default: stdout).")
+
+    def handle(self, *args, **opts):
+        queryset = None
+        if opts["active_only"]:
+            queryset = MenuItem.objects.filter(is_active=True)
+        text = catalog_io.dump(catalog_io.export_rows(queryset), opts["format"])
+        if opts["output"] == "-":
+            sys.stdout.write(text)
+        else:
+            with open(opts["output"], "w", encoding="utf-8", newline="") as fh:
+                fh.write(text)
@@ -0,0 +1,36 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from my_canteen import exports
+
+
+class Command(BaseCommand):
+    help = "Stream orders, order lines or payments to CSV / JSONL with flat memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(exports.DATASETS))
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First day (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Last day, inclusive (YYYY-MM-DD).")
+        parser.add_argument("--status", help="Order / payment status to keep.")
+        parser.add_argument("--method", help="Payment method to keep.")
+        parser.add_argument("-o", "--output", default="-", help="File to write (default: stdout).")
+
+    def handle(self, *args, **opts):
+        queryset = exports.filtered(
+            opts["dataset"], date_from=opts["date_from"], date_to=opts["date_to"],
+            status=opts["status"], method=opts["method"],
+        )
+        started = time.perf_counter()
+        chunks = exports.stream(opts["dataset"], opts["format"], queryset)
+        if opts["output"] == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+        with open(opts["output"], "w", encoding="utf-8", newline="") as fh:
+            written = sum(fh.write(chunk) for chunk in chunks)
+        self.stderr.write(
+            f"Wrote {written:,} characters to {opts['output']} in {time.perf_counter() - started:.1f}s"
+        )
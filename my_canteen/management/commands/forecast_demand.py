@@ -0,0 +1,31 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from my_canteen import forecast
+
+
+class Command(BaseCommand):
+    help = (
+        "Forecast per-item demand by 15-minute slot for the next day from past "
+        "orders and store suggested prep quantities (run nightly)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", type=date.fromisoformat, help="Target day (YYYY-MM-DD); default tomorrow.")
+        parser.add_argument(
+            "--days", type=int, default=forecast.HISTORY_DAYS,
+            help="Days of order history to fit on (default: %(default)s).",
+        )
+
+    def handle(self, *args, **opts):
+        if forecast.np is None:
+            raise CommandError("forecast_demand needs NumPy: pip install numpy")
+        if opts["days"] < 7:
+            raise CommandError("--days must cover at least one week.")
+        started = time.perf_counter()
+        count = forecast.run(opts["date"], opts["days"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored forecasts for {count} item(s) in {time.perf_counter() - started:.2f}s"
+        ))
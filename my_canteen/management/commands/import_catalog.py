@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from my_canteen import catalog_io
+
+
+class Command(BaseCommand):
+    help = (
+        "Load menu items from CSV / JSON: validates everything first, then applies "
+        "creates, updates and deactivations in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Catalog file (.csv or .json).")
+        parser.add_argument(
+            "--deactivate-missing", action="store_true",
+            help="Deactivate active items that are not in the file.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Show what would change and exit.")
+
+    def handle(self, *args, **opts):
+        path = Path(opts["path"])
+        fmt = "json" if path.suffix.lower() == ".json" else "csv"
+        try:
+            text = path.read_text(encoding="utf-8-sig")
+            result, errors = catalog_io.import_catalog(
+                text, fmt, deactivate_missing=opts["deactivate_missing"], dry_run=opts["dry_run"]
+            )
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            raise CommandError(f"Could not read {path}: {exc}")
+        if errors:
+            for error in errors:
+                self.stderr.write(error)
+            raise CommandError(f"{len(errors)} error(s); nothing was imported.")
+        prefix = "Would apply" if opts["dry_run"] else "Applied"
+        self.stdout.write(self.style.SUCCESS(f"{prefix}: {result.summary()}"))
@@ -0,0 +1,53 @@
+import io
+import pstats
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from my_canteen import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the saved view profiles (optionally for one URL name / role) and list the top "
+        "cumulative functions; --token prints a header value that profiles one request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--view", help="URL name, e.g. dashboard.")
+        parser.add_argument("--role", help="e.g. vendor, staff, anon.")
+        parser.add_argument("--limit", type=int, default=25)
+        parser.add_argument("--dir", type=Path, help="Profile directory (default CANTEEN_PROFILE_DIR).")
+        parser.add_argument("--collapsed-out", type=Path, help="Write the merged stacks here for flamegraph.pl.")
+        parser.add_argument(
+            "--token", nargs="?", const=profiling.default_mode(), choices=profiling.MODES,
+            help=f"Print a signed {profiling.HEADER} header value instead (valid for an hour).",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["token"]:
+            self.stdout.write(f"{profiling.HEADER}: {profiling.make_token(opts['token'])}")
+            return
+        paths = list(profiling.profiles(opts["view"], opts["role"], opts["dir"]))
+        if not paths:
+            raise CommandError("No profiles match.")
+        collapsed = [p for p in paths if p.suffix == ".collapsed"]
+        cprofiled = [p for p in paths if p.suffix == ".pstats"]
+
+        if collapsed:
+            stacks = profiling.merge_collapsed(collapsed)
+            total, inclusive, own = profiling.cumulative(stacks)
+            self.stdout.write(f"Sampled: {len(collapsed)} request(s), {total} sample(s)")
+            self.stdout.write(f"{'cum %':>7} {'self %':>7}  function")
+            for name, n in inclusive.most_common(opts["limit"]):
+                self.stdout.write(f"{100 * n / total:7.1f} {100 * own[name] / total:7.1f}  {name}")
+            if opts["collapsed_out"]:
+                opts["collapsed_out"].write_text("".join(f"{s} {n}\n" for s, n in stacks.items()))
+                self.stdout.write(f"Merged stacks written to {opts['collapsed_out']}")
+
+        if cprofiled:
+            out = io.StringIO()
+            stats = pstats.Stats(*map(str, cprofiled), stream=out)
+            stats.strip_dirs().sort_stats("cumulative").print_stats(opts["limit"])
+            self.stdout.write(f"cProfile: {len(cprofiled)} request(s)")
+            self.stdout.write(out.getvalue())
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from my_canteen.prerender import publish
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render the anonymous home and menu pages (plus one page per category) "
+        "into PRERENDER_ROOT. After the first run the pages re-publish themselves "
+        "whenever the catalog changes."
+    )
+
+    def handle(self, *args, **opts):
+        manifest = publish()
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {len(manifest['pages'])} page(s) for catalog version {manifest['catalog_version']}"
+        ))
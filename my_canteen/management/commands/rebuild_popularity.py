@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from my_canteen import popularity
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute item popularity from the last 7 days of sales (nightly), "
+        "or with --decay just age the existing counters (hourly)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--decay", action="store_true",
+            help="Only decay existing rows to now; do not rescan orders.",
+        )
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        if opts["decay"]:
+            count, verb = popularity.decay_all(), "Decayed"
+        else:
+            count, verb = popularity.rebuild(), "Rebuilt"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} popularity for {count} item(s) in {(time.perf_counter() - started) * 1000:.0f} ms"
+        ))
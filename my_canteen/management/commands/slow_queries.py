@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from my_canteen import querylog
+
+
+class Command(BaseCommand):
+    help = "Rank the slow query log by fingerprint (total time first), optionally for one URL name."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--view", help="URL name, e.g. menu.")
+        parser.add_argument("--limit", type=int, default=15)
+        parser.add_argument("--file", type=Path, help="Log file (default CANTEEN_SLOW_QUERY_LOG); backups are read too.")
+        parser.add_argument("--explain", action="store_true", help="Print the captured plan and call site of each.")
+
+    def handle(self, *args, **opts):
+        paths = querylog.log_files(opts["file"])
+        if not paths:
+            raise CommandError("No slow query log yet.")
+        groups = querylog.rank(querylog.read(paths), opts["view"])
+        if not groups:
+            raise CommandError("No slow queries match.")
+        self.stdout.write(f"{'total ms':>10} {'count':>6} {'max ms':>8}  fingerprint   views")
+        for group in groups[:opts["limit"]]:
+            self.stdout.write(
+                f"{group['total_ms']:10.1f} {group['count']:6d} {group['max_ms']:8.1f}  "
+                f"{group['fingerprint']}  {', '.join(sorted(group['views']))}"
+            )
+            self.stdout.write(f"    {group['sql'][:300]}")
+            if opts["explain"]:
+                for frame in group["stack"]:
+                    self.stdout.write(f"      at {frame}")
+                for line in group["plan"] or ["(no plan captured)"]:
+                    self.stdout.write(f"      plan: {line}")
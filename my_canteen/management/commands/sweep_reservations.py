@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from my_canteen.stock import sweep
+
+
+class Command(BaseCommand):
+    help = "Release checkout stock holds whose time is up (run every minute or so)."
+
+    def handle(self, *args, **opts):
+        released = sweep()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired hold(s)."))
@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from my_canteen.routers import replica_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Replication stand-in for local SQLite replicas: copies the primary "
+        "database file onto every replica alias with the online backup API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep syncing every N seconds (0 = sync once and exit).",
+        )
+
+    def handle(self, *args, **opts):
+        primary = connections["default"].settings_dict
+        if not primary["ENGINE"].endswith("sqlite3"):
+            raise CommandError("sync_replicas only works with SQLite; use real replication elsewhere.")
+        replicas = replica_aliases()
+        if not replicas:
+            raise CommandError("No replicas configured (set CANTEEN_DB_REPLICAS).")
+
+        while True:
+            started = time.perf_counter()
+            for alias in replicas:
+                self._copy(primary["NAME"], connections[alias].settings_dict["NAME"])
+            self.stdout.write(
+                f"Synced {len(replicas)} replica(s) in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            if not opts["interval"]:
+                break
+            time.sleep(opts["interval"])
+
+    def _copy(self, source_path, target_path):
+        source = sqlite3.connect(str(source_path))
+        target = sqlite3.connect(str(target_path))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,267 @@
+# my_canteen/metrics.py
+"""
+Runtime metrics in the Prometheus text format, served at ``/metrics``.
+
+Writers never take a lock: every thread owns a shard of plain dicts
+(counters, fixed-bucket histograms) and ``inc`` / ``observe`` only touch their
+own. A scrape copies the shards (``dict.copy`` is atomic under the GIL) and adds
+them up. When a thread goes away its shard is folded into a process-level one,
+so servers that start a thread per connection do not grow the list.
+
+With several worker processes set ``CANTEEN_METRICS_DIR`` to a directory they
+all share: each process rewrites ``<pid>-<start>.json`` with its totals at most
+every ``FLUSH_INTERVAL`` seconds (after a request, atomically via rename), and
+a scrape sums every file in it. Files of dead workers are kept so counters
+never go backwards; clear the directory when the workers restart.
+
+Gauges that describe shared state (open orders by status, the admission
+waiting room) are read at scrape time instead of being counted.
+
+    inc("canteen_orders_created_total", method="cash")
+    observe("canteen_cart_items", 3)
+"""
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "canteen_http_requests_total": ("counter", "Requests by URL name and status class.", None),
+    "canteen_http_request_duration_seconds": ("histogram", "Request latency by URL name.", LATENCY),
+    "canteen_db_queries_total": ("counter", "Database queries run by each view.", None),
+    "canteen_db_query_seconds_total": ("counter", "Time spent in database queries by each view.", None),
+    "canteen_orders_created_total": ("counter", "Orders placed, by payment method.", None),
+    "canteen_order_transitions_total": ("counter", "Order status changes.", None),
+    "canteen_cart_items": ("histogram", "Items per order at checkout.", (1, 2, 3, 4, 5, 8, 13, 21)),
+    "canteen_emails_total": ("counter", "Emails handed to the mail backend, by kind and outcome.", None),
+    "canteen_email_send_seconds": ("histogram", "Time to hand one email to the mail backend.", LATENCY),
+    "canteen_emails_in_flight": ("gauge", "Emails currently being sent (requests blocked on SMTP).", None),
+    "canteen_open_orders": ("gauge", "Open orders by status.", None),
+    "canteen_admission_queue_depth": ("gauge", "Tickets waiting in the admission waiting room.", None),
+    "canteen_admission_in_use": ("gauge", "Admission leases in use.", None),
+    "canteen_admission_shed_total": ("counter", "Requests turned away or queued by admission control.", None),
+}
+
+FLUSH_INTERVAL = 1.0
+STARTED = int(time.time())
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters = {}      # (name, labels) -> value
+        self.histograms = {}    # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+
+_local = threading.local()
+_retired = _Shard()   # totals of finished threads, only touched under the lock
+_shards = [_retired]
+_shards_lock = threading.Lock()  # taken the first and last time a thread records something
+_last_flush = 0.0
+
+
+def _retire(shard):
+    """Fold a finished thread's shard into ``_retired``; nothing writes to it any more."""
+    with _shards_lock:
+        _shards.remove(shard)
+        for key, value in shard.counters.items():
+            _retired.counters[key] = _retired.counters.get(key, 0) + value
+        for key, row in shard.histograms.items():
+            acc = _retired.histograms.setdefault(key, [0] * len(row))
+            for i, v in enumerate(row):
+                acc[i] += v
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        with _shards_lock:
+            _shards.append(shard)
+        weakref.finalize(threading.current_thread(), _retire, shard)
+    return shard
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    counters = _shard().counters
+    key = _key(name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    histograms = _shard().histograms
+    key = _key(name, labels)
+    row = histograms.get(key)
+    if row is None:
+        row = histograms[key] = [0] * (len(buckets) + 2)
+    row[bisect_left(buckets, value)] += 1
+    row[-1] += value
+
+
+# ---------- Collection ----------
+def snapshot():
+    """This process's totals: ``{"counters": {key: v}, "histograms": {key: row}}``."""
+    counters, histograms = defaultdict(float), {}
+    with _shards_lock:  # copied together, so a shard being retired is never counted twice
+        copies = [
+            (shard.counters.copy(), {key: list(row) for key, row in shard.histograms.copy().items()})
+            for shard in _shards
+        ]
+    for shard_counters, shard_histograms in copies:
+        for key, value in shard_counters.items():
+            counters[key] += value
+        for key, row in shard_histograms.items():
+            acc = histograms.setdefault(key, [0] * len(row))
+            for i, v in enumerate(row):
+                acc[i] += v
+    return {"counters": dict(counters), "histograms": histograms}
+
+
+def _directory():
+    path = getattr(settings, "CANTEEN_METRICS_DIR", None)
+    return Path(path) if path else None
+
+
+def _encode(snap):
+    return {
+        kind: [[name, list(labels), value] for (name, labels), value in rows.items()]
+        for kind, rows in snap.items()
+    }
+
+
+def flush(force=False):
+    """Write this process's totals to the shared directory (multiprocess mode)."""
+    global _last_flush
+    directory = _directory()
+    now = time.monotonic()
+    if directory is None or (not force and now - _last_flush < FLUSH_INTERVAL):
+        return
+    _last_flush = now
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f"{os.getpid()}-{STARTED}.json"
+    tmp = target.with_suffix(".tmp")
+    tmp.write_text(json.dumps(_encode(snapshot())))
+    os.replace(tmp, target)
+
+
+def collect():
+    """Totals across every worker (or just this one without ``CANTEEN_METRICS_DIR``)."""
+    directory = _directory()
+    if directory is None:
+        return snapshot()
+    flush(force=True)
+    counters, histograms = defaultdict(float), {}
+    for path in directory.glob("*.json"):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):  # being replaced right now; next scrape gets it
+            continue
+        for name, labels, value in data.get("counters", []):
+            counters[name, tuple(map(tuple, labels))] += value
+        for name, labels, row in data.get("histograms", []):
+            acc = histograms.setdefault((name, tuple(map(tuple, labels))), [0] * len(row))
+            for i, v in enumerate(row):
+                acc[i] += v
+    return {"counters": dict(counters), "histograms": histograms}
+
+
+def scrape_gauges():
+    """Shared-state gauges, read once per scrape: ``{(name, labels): value}``."""
+    from django.db.models import Count
+
+    from . import admission
+    from .models import Order
+    from .slots import OPEN_STATUSES
+
+    rows = {(("status", status),): 0 for status in OPEN_STATUSES}
+    for row in Order.objects.filter(status__in=OPEN_STATUSES).values("status").annotate(n=Count("id")):
+        rows[(("status", row["status"]),)] = row["n"]
+    gauges = {("canteen_open_orders", labels): n for labels, n in rows.items()}
+    for gate, row in admission.stats().items():
+        labels = (("gate", gate),)
+        gauges["canteen_admission_queue_depth", labels] = row["queue_depth"]
+        gauges["canteen_admission_in_use", labels] = row["in_use"]
+        for reason in ("rate", "busy", "queued"):
+            key = "queued" if reason == "queued" else f"shed_{reason}"
+            gauges["canteen_admission_shed_total", (*labels, ("reason", reason))] = row[key]
+    return gauges
+
+
+# ---------- Exposition ----------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(data=None, gauges=None):
+    data = collect() if data is None else data
+    values = dict(data["counters"])
+    values.update(scrape_gauges() if gauges is None else gauges)
+    by_name = defaultdict(list)
+    for (name, labels), value in values.items():
+        by_name[name].append((labels, value))
+    for (name, labels), row in data["histograms"].items():
+        by_name[name].append((labels, row))
+
+    lines = []
+    for name, (kind, text, buckets) in METRICS.items():
+        samples = sorted(by_name.get(name, []), key=lambda s: s[0])
+        if not samples:
+            continue
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            running = 0
+            for bound, count in zip((*buckets, "+Inf"), value[:-1]):
+                running += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{name}_bucket{_labels(labels, [('le', le)])} {running}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {running}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Email ----------
+class timed_email:
+    """``with timed_email("verification"): send_mail(...)`` counts and times one send."""
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def __enter__(self):
+        inc("canteen_emails_in_flight")
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        inc("canteen_emails_in_flight", -1)
+        observe("canteen_email_send_seconds", time.perf_counter() - self.started)
+        inc("canteen_emails_total", kind=self.kind, outcome="error" if exc_type else "sent")
+        return False
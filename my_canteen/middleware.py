@@ -0,0 +1,342 @@
+# my_canteen/middleware.py
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseNotModified
+from django.shortcuts import render
+
+from . import admission, metrics, prerender, profiling, querylog
+from .cache import catalog_version
+from .routers import replica_aliases, use_primary
+
+
+# ---------- Read-your-writes pinning ----------
+class ReplicaPinningMiddleware:
+    """
+    Unsafe requests (POST, ...) run entirely on the primary and leave a short
+    lived cookie behind; while it is valid the same browser keeps reading from
+    the primary, so e.g. the orders page right after checkout shows the new order
+    even if the replicas lag behind.
+    """
+
+    cookie_name = "canteen_pin"
+    safe_methods = {"GET", "HEAD", "OPTIONS", "TRACE"}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrote = request.method not in self.safe_methods
+        try:
+            pinned_until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            pinned_until = 0
+
+        if wrote or pinned_until > time.time():
+            with use_primary():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+
+        if wrote and replica_aliases():
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                self.cookie_name, str(time.time() + seconds),
+                max_age=seconds, httponly=True, samesite="Lax",
+            )
+        return response
+
+
+# ---------- Pre-rendered anonymous pages ----------
+class PrerenderedPageMiddleware:
+    """
+    Serves pre-rendered pages to anonymous GET/HEAD requests for ``/`` and
+    ``/menu/`` (optionally ``?cat=<id>`` only). Anyone with a session or
+    pending flash messages goes through the normal stack.
+    """
+
+    encodings = ("br", "gzip")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._manifest = None
+        self._manifest_mtime = None
+        self._files = {}
+
+    def __call__(self, request):
+        response = self._serve(request)
+        return response if response is not None else self.get_response(request)
+
+    def _manifest_now(self):
+        try:
+            mtime = os.stat(prerender.root() / prerender.MANIFEST).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._manifest_mtime:
+            self._manifest, self._manifest_mtime, self._files = prerender.load_manifest(), mtime, {}
+        return self._manifest
+
+    def _read(self, name):
+        data = self._files.get(name)
+        if data is None:
+            data = self._files[name] = (prerender.root() / name).read_bytes()
+        return data
+
+    def _serve(self, request):
+        if request.method not in ("GET", "HEAD") or request.path_info not in ("/", "/menu/"):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES or "messages" in request.COOKIES:
+            return None
+        cat = None
+        if request.GET:
+            if request.path_info != "/menu/" or list(request.GET) != ["cat"] or not request.GET["cat"].isdigit():
+                return None
+            cat = request.GET["cat"]
+
+        manifest = self._manifest_now()
+        if not manifest or manifest["catalog_version"] != catalog_version():
+            return None
+        files = manifest["pages"].get(prerender.page_key(request.path_info, cat))
+        if not files:
+            return None
+
+        etag = f'"pre-{manifest["catalog_version"]}-{files["identity"]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return HttpResponseNotModified(headers={"ETag": etag})
+
+        accept = request.headers.get("Accept-Encoding", "")
+        encoding = next((e for e in self.encodings if e in files and e in accept), "identity")
+        try:
+            body = self._read(files[encoding])
+        except FileNotFoundError:
+            return None
+
+        response = HttpResponse(body, content_type="text/html; charset=utf-8")
+        if encoding != "identity":
+            response["Content-Encoding"] = encoding
+        response["Vary"] = "Accept-Encoding, Cookie"
+        response["ETag"] = etag
+        response["X-Prerendered"] = "1"
+        return response
+
+
+
+# ---------- Admission control ----------
+class AdmissionControlMiddleware:
+    """
+    Gates the URL names in ``admission.ROUTES`` (checkout, add to cart): a
+    per-user token bucket, then a concurrency lease held for the length of
+    the request. A checkout page that finds every lease taken waits its turn
+    in the waiting room (ticket in a signed cookie); once admitted, a pass
+    cookie lets the form's POST skip the queue. POSTs are never queued, since
+    the waiting room's refresh would replay them as GETs; like the other
+    gates they answer 503 when busy. Must come after AuthenticationMiddleware.
+    """
+
+    cookie_name = "canteen_wr"
+    pass_cookie_name = "canteen_wr_pass"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            admission.release(getattr(request, "_admission_lease", None))
+        gate = getattr(request, "_admission_admitted", None)
+        if gate is not None:
+            response.delete_cookie(self.cookie_name, samesite="Lax")
+            response.set_signed_cookie(
+                self.pass_cookie_name, "1", salt=gate.name, max_age=admission.PASS, httponly=True, samesite="Lax"
+            )
+        if getattr(request, "_admission_pass_used", False):
+            response.delete_cookie(self.pass_cookie_name, samesite="Lax")
+        return response
+
+    @staticmethod
+    def _busy(gate):
+        admission.count_shed(gate, "busy")
+        response = HttpResponse("The kitchen is very busy, please try again in a moment.", status=503)
+        response["Retry-After"] = str(admission.RETRY)
+        return response
+
+    @staticmethod
+    def _rate_limited(request, gate):
+        user = request.user
+        ident = f"u{user.pk}" if user.is_authenticated else request.META.get("REMOTE_ADDR", "")
+        ok, wait = admission.take_token(gate, ident)
+        if ok:
+            return None
+        admission.count_shed(gate, "rate")
+        response = HttpResponse("Too many requests, slow down a little.", status=429)
+        response["Retry-After"] = str(wait)
+        return response
+
+    def _admit_post(self, request, gate):
+        """A queue gate's POST: admitted pages go first, anyone else only while nobody waits."""
+        try:
+            admitted = request.get_signed_cookie(self.pass_cookie_name, salt=gate.name, max_age=admission.PASS) == "1"
+        except (KeyError, ValueError):
+            admitted = False
+        if not admitted:
+            limited = self._rate_limited(request, gate)
+            if limited is not None:
+                return limited
+            if admission.depth(gate):
+                return self._busy(gate)
+        request._admission_lease = admission.acquire(gate)
+        if request._admission_lease is None:
+            return self._busy(gate)
+        request._admission_pass_used = admitted
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        gate = admission.GATES.get(admission.ROUTES.get(match.url_name if match else None))
+        if gate is None:
+            return None
+        if gate.queue and request.method == "POST":
+            return self._admit_post(request, gate)
+
+        ticket = None
+        if gate.queue:
+            try:
+                ticket = int(request.get_signed_cookie(self.cookie_name, salt=gate.name, max_age=600))
+            except (KeyError, ValueError):
+                ticket = None
+
+        if ticket is None:  # waiting room polls do not spend tokens
+            limited = self._rate_limited(request, gate)
+            if limited is not None:
+                return limited
+
+        if not gate.queue:
+            request._admission_lease = admission.acquire(gate)
+            if request._admission_lease is None:
+                return self._busy(gate)
+            return None
+
+        # FIFO: nobody skips the queue while someone is waiting in it
+        if ticket is None and not admission.depth(gate):
+            request._admission_lease = admission.acquire(gate)
+            if request._admission_lease is not None:
+                return None
+        if ticket is None:
+            ticket = admission.join(gate)
+            admission.count_shed(gate, "queued")
+        ahead = admission.position(gate, ticket)
+        if not ahead:
+            request._admission_lease = admission.acquire(gate)
+            if request._admission_lease is not None:
+                admission.served(gate, ticket)
+                request._admission_admitted = gate
+                return None
+        admission.touch(gate, ticket)
+        response = render(
+            request, "my_canteen/waiting_room.html",
+            {"ahead": ahead, "retry": admission.RETRY, "next_url": request.get_full_path()},
+            status=503,
+        )
+        response["Retry-After"] = str(admission.RETRY)
+        response["Cache-Control"] = "no-store"
+        response.set_signed_cookie(self.cookie_name, str(ticket), salt=gate.name, max_age=600, httponly=True, samesite="Lax")
+        return response
+
+
+
+# ---------- Metrics ----------
+class MetricsMiddleware:
+    """
+    Request latency, status class and database queries / time per URL name
+    (my_canteen/metrics.py). Goes first so the latency covers the whole stack;
+    the query counter is a ``connection.execute_wrapper`` on every alias.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0, 0.0]
+
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        if match:
+            view = match.url_name or match.view_name
+        else:
+            view = "prerendered" if response.has_header("X-Prerendered") else "unmatched"
+        metrics.observe("canteen_http_request_duration_seconds", elapsed, view=view)
+        metrics.inc("canteen_http_requests_total", view=view, code=f"{response.status_code // 100}xx")
+        if queries[0]:
+            metrics.inc("canteen_db_queries_total", queries[0], view=view)
+            metrics.inc("canteen_db_query_seconds_total", queries[1], view=view)
+        metrics.flush()
+        return response
+
+
+
+# ---------- Slow query log ----------
+class SlowQueryMiddleware:
+    """Tags slow-query log entries (my_canteen/querylog.py) with the URL name of the request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = querylog.current_view.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            querylog.current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        querylog.current_view.set(match.url_name or match.view_name)
+
+
+# ---------- On-demand profiling ----------
+class ProfilingMiddleware:
+    """
+    Runs the view under my_canteen/profiling.py when the signed header or the
+    per-view sampling rate asks for it. Must be last in ``MIDDLEWARE``: it
+    calls the view itself (rendering included) from ``process_view``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        mode = profiling.requested_mode(request, url_name)
+        if mode is None:
+            return None
+        profile = getattr(request.user, "userprofile", None) if request.user.is_authenticated else None
+        role = profile.role if profile else "anon"
+
+        def call():
+            response = view_func(request, *view_args, **view_kwargs)
+            if callable(getattr(response, "render", None)) and not response.is_rendered:
+                response.render()  # TemplateResponse: count the template too
+            return response
+
+        return profiling.run(mode, url_name, role, call)
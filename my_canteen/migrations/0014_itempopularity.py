@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_canteen', '0013_catalogchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemPopularity',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='my_canteen.menuitem')),
+                ('hour_score', models.FloatField(default=0)),
+                ('day_score', models.FloatField(default=0)),
+                ('week_score', models.FloatField(default=0)),
+                ('score', models.FloatField(db_index=True, default=0)),
+                ('scored_at', models.DateTimeField()),
+            ],
+        ),
+    ]
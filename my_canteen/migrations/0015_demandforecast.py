@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_canteen', '0014_itempopularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total', models.FloatField()),
+                ('prep', models.PositiveIntegerField()),
+                ('peak_slot', models.PositiveSmallIntegerField()),
+                ('slots', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='my_canteen.menuitem')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'item'), name='uniq_forecast_date_item')],
+            },
+        ),
+    ]
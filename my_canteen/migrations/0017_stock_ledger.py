@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """Start the ledger from today's stock so ledger totals match MenuItem.stock."""
+    MenuItem = apps.get_model("my_canteen", "MenuItem")
+    StockMovement = apps.get_model("my_canteen", "StockMovement")
+    StockMovement.objects.bulk_create(
+        StockMovement(item_id=item_id, kind="adjustment", quantity=stock, note="opening balance")
+        for item_id, stock in MenuItem.objects.filter(stock__gt=0).values_list("id", "stock")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_canteen', '0016_index_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_snapshot', serialize=False, to='my_canteen.menuitem')),
+                ('quantity', models.IntegerField(default=0)),
+                ('through_id', models.PositiveBigIntegerField(default=0)),
+                ('folded', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('cancel', 'Order cancelled'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], max_length=12)),
+                ('quantity', models.IntegerField()),
+                ('note', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='my_canteen.menuitem')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='my_canteen.order')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'id'], name='my_canteen__item_id_36f56f_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_shard_rows', to='my_canteen.menuitem')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('item', 'slot'), name='uniq_stock_shard_slot')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_canteen', '0021_order_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitchenSla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('metric', models.CharField(choices=[('queue', 'Queue wait'), ('prep', 'Prep time'), ('ready', 'Time to ready')], max_length=5)),
+                ('scope', models.CharField(choices=[('all', 'All orders'), ('item', 'Item'), ('staff', 'Staff member')], max_length=5)),
+                ('key', models.PositiveBigIntegerField(default=0)),
+                ('label', models.CharField(blank=True, max_length=150)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('buckets', models.JSONField(default=list)),
+                ('p50', models.FloatField(default=0)),
+                ('p90', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'hour'], name='my_canteen__scope_ba6865_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'metric', 'scope', 'key'), name='uniq_kitchen_sla_row')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('preparing', 'Preparing'), ('ready', 'Ready'), ('delivered', 'Delivered'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('to_status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('preparing', 'Preparing'), ('ready', 'Ready'), ('delivered', 'Delivered'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='my_canteen.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order', 'created_at'], name='my_canteen__order_i_9ee569_idx')],
+            },
+        ),
+    ]
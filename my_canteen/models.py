@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models import Avg, Count
+from django.db.models import Avg, Count, F
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 # ---------------------------
@@ -51,6 +52,8 @@ def save_user_profile(sender, instance, **kwargs):
 # ---------------------------
 class Category(models.Model):
     name = models.CharField(max_length=50)
+    # kitchen effort per portion, counted against pickup slot capacity
+    prep_units = models.PositiveSmallIntegerField(default=1)
 
     def __str__(self):
         return self.name
@@ -70,13 +73,69 @@ class MenuItem(models.Model):
     rating_avg = models.FloatField(default=0)
     rating_count = models.PositiveIntegerField(default=0)
 
+    # ✅ Cheap validator for ETag / Last-Modified and fragment cache keys
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # ✅ Hot items: >0 splits stock over that many StockShard rows (see my_canteen/stock.py)
+    stock_shards = models.PositiveSmallIntegerField(default=0)
+
+    # ✅ Prep units per portion; blank = the category's (see my_canteen/slots.py)
+    prep_units = models.PositiveSmallIntegerField(blank=True, null=True)
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # partial saves (stock, rating) still have to move updated_at
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+        super().save(*args, **kwargs)
+
+
+# ---------------------------
+# Catalog change log (delta sync for kiosks / mobile)
+# ---------------------------
+class CatalogChange(models.Model):
+    """
+    Append-only log of catalog edits; the auto id doubles as the catalog version
+    clients pass back as ``?since=``. Written from signals and bulk admin paths
+    (see my_canteen/catalog_sync.py).
+    """
+    KIND_CHOICES = [('item', 'Menu item'), ('category', 'Category')]
+    ACTION_CHOICES = [
+        ('upsert', 'Created / updated'),
+        ('stock', 'Stock only'),
+        ('delete', 'Deleted'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    stock = models.PositiveIntegerField(blank=True, null=True)  # only for 'stock'
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'object_id'])]
+
+    def __str__(self):
+        return f"v{self.id} {self.kind}#{self.object_id} {self.action}"
+
 
 # ---------------------------
 # Orders
 # ---------------------------
+class OrderHistoryManager(models.Manager):
+    """
+    ``Order.history``: a user's orders for listing, live or archived. Both
+    models share their columns (including the list-page summary), so
+    templates render either from the row alone.
+    """
+    def for_user(self, user, archived=False):
+        model = ArchivedOrder if archived else self.model
+        return model.objects.filter(user=user).order_by("-created_at")
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -101,15 +160,64 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='unpaid')
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHOD_CHOICES, default='cash')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # ✅ bumped on every save; drives the order_status_api ETag
+    version = models.PositiveIntegerField(default=1)
+    # ✅ Pickup slot chosen at checkout and the prep units booked into it
+    pickup_slot = models.ForeignKey(
+        'PickupSlot', on_delete=models.SET_NULL, blank=True, null=True, related_name='orders'
+    )
+    prep_units = models.PositiveIntegerField(default=0)
+    # ✅ Denormalised for list pages: written at checkout, refreshed by the admin
+    #    paths that edit an order or its lines (refresh_summary) and by
+    #    backfill_order_summaries
+    item_count = models.PositiveIntegerField(default=0)
+    items_summary = models.CharField(max_length=255, blank=True)
+    customer_name = models.CharField(max_length=150, blank=True)
+
+    objects = models.Manager()
+    history = OrderHistoryManager()
 
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "updated_at", "version"}
+        super().save(*args, **kwargs)
+
     @property
     def is_paid(self) -> bool:
         return self.payment_status == 'paid'
 
+    @staticmethod
+    def summarize(lines):
+        """``[(name, qty), ...]`` -> ``(item_count, "2× Fuchka, 1× Tea")``."""
+        text = ", ".join(f"{qty}× {name}" for name, qty in lines)
+        if len(text) > 255:
+            text = text[:254] + "…"
+        return sum(qty for _, qty in lines), text
+
+    def refresh_summary(self):
+        """
+        Recompute ``item_count`` / ``items_summary`` / ``customer_name`` after the
+        lines or the owner changed. Moves ``updated_at`` and ``version`` like a
+        save, so the dashboard change cursor and the order ETags see the edit.
+        """
+        lines = list(self.orderitem_set.order_by("id").values_list("item__name", "quantity"))
+        self.item_count, self.items_summary = self.summarize(lines)
+        self.customer_name = self.user.username
+        self.updated_at = timezone.now()
+        Order.objects.filter(pk=self.pk).update(
+            item_count=self.item_count, items_summary=self.items_summary, customer_name=self.customer_name,
+            updated_at=self.updated_at, version=F("version") + 1,
+        )
+        self.refresh_from_db(fields=["version"])
+
 
 # ---------------------------
 # Payment (moved out of Order)
@@ -135,7 +243,7 @@ class Payment(models.Model):
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
     gateway_payload = models.JSONField(blank=True, null=True)
     paid_at = models.DateTimeField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"Payment for Order #{self.order_id} - {self.method} - {self.status}"
@@ -151,6 +259,291 @@ class OrderItem(models.Model):
         return self.unit_price * self.quantity
 
 
+# ---------------------------
+# Order archive (cold copies of old completed / cancelled orders)
+# ---------------------------
+class ArchivedOrder(models.Model):
+    """
+    Same columns (and ids) as ``Order``; rows are moved here in batches by
+    ``manage.py archive_orders`` (my_canteen/archive.py) and never change again.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    total_price = models.DecimalField(max_digits=8, decimal_places=2)
+    address = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=10, choices=Order.PAYMENT_STATUS_CHOICES)
+    payment_method = models.CharField(max_length=10, choices=Order.PAYMENT_METHOD_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    version = models.PositiveIntegerField()
+    pickup_slot = models.ForeignKey(
+        'PickupSlot', on_delete=models.SET_NULL, blank=True, null=True, related_name='+'
+    )
+    prep_units = models.PositiveIntegerField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    items_summary = models.CharField(max_length=255, blank=True)
+    customer_name = models.CharField(max_length=150, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at'])]
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
+    @property
+    def is_paid(self) -> bool:
+        return self.payment_status == 'paid'
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='orderitem_set')
+    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+
+class ArchivedPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.OneToOneField(ArchivedOrder, on_delete=models.CASCADE, related_name='payment')
+    method = models.CharField(max_length=20, choices=Payment.METHOD_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    gateway_payload = models.JSONField(blank=True, null=True)
+    paid_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived payment for order #{self.order_id}"
+
+
+# ---------------------------
+# Popularity ranking (derived from OrderItem sales)
+# ---------------------------
+class ItemPopularity(models.Model):
+    """
+    Time-decayed sales counters per item, maintained on checkout and rebuilt
+    nightly (see my_canteen/popularity.py). ``score`` is the blended rank that
+    ``home`` and the default ``menu_page`` sort read.
+    """
+    item = models.OneToOneField(
+        MenuItem, on_delete=models.CASCADE, primary_key=True, related_name='popularity'
+    )
+    hour_score = models.FloatField(default=0)
+    day_score = models.FloatField(default=0)
+    week_score = models.FloatField(default=0)
+    score = models.FloatField(default=0, db_index=True)
+    scored_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.item_id}: {self.score:.2f}"
+
+
+# ---------------------------
+# Demand forecast (prep planning)
+# ---------------------------
+class DemandForecast(models.Model):
+    """
+    Next-day demand per item, written by ``manage.py forecast_demand`` (see
+    my_canteen/forecast.py). ``slots`` holds 96 quarter-hour quantities
+    starting at 00:00 local time.
+    """
+    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='forecasts')
+    date = models.DateField()
+    total = models.FloatField()
+    prep = models.PositiveIntegerField()  # suggested quantity to have ready
+    peak_slot = models.PositiveSmallIntegerField()
+    slots = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'item'], name='uniq_forecast_date_item'),
+        ]
+
+    def __str__(self):
+        return f"{self.item} on {self.date}: {self.total:.1f}"
+
+    @property
+    def peak_time(self):
+        return f"{self.peak_slot // 4:02d}:{self.peak_slot % 4 * 15:02d}"
+
+    @property
+    def shortfall(self):
+        return max(self.prep - self.item.stock, 0)
+
+
+# ---------------------------
+# Stock ledger
+# ---------------------------
+class StockMovement(models.Model):
+    """
+    Append-only record of every stock change (negative = out). The sum of an
+    item's movements plus its ``StockSnapshot`` equals its stock; writes go
+    through my_canteen/stock.py.
+    """
+    KIND_CHOICES = [
+        ('sale', 'Sale'),
+        ('cancel', 'Order cancelled'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    # loose like OrderEvent.order: the ledger keeps the order id after archiving
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False, blank=True, null=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    note = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['item', 'id'])]
+
+    def __str__(self):
+        return f"{self.item_id} {self.kind} {self.quantity:+d}"
+
+
+class StockShard(models.Model):
+    """One slot of a hot item's stock; the item's stock is the sum of its shards."""
+    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='stock_shard_rows')
+    slot = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'slot'], name='uniq_stock_shard_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id}[{self.slot}] = {self.quantity}"
+
+
+class StockSnapshot(models.Model):
+    """Net of all ledger rows folded away by ``compact_stock``, up to ``through_id``."""
+    item = models.OneToOneField(
+        MenuItem, on_delete=models.CASCADE, primary_key=True, related_name='stock_snapshot'
+    )
+    quantity = models.IntegerField(default=0)
+    through_id = models.PositiveBigIntegerField(default=0)
+    folded = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.item_id}: {self.quantity:+d} through #{self.through_id}"
+
+
+class StockReservation(models.Model):
+    """
+    Soft hold placed on a cart's quantities when checkout opens. Available stock
+    is stock minus other users' unexpired holds; the order converts (deletes)
+    the holds and ``manage.py sweep_reservations`` drops expired ones.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'item'], name='uniq_reservation_user_item'),
+        ]
+        indexes = [models.Index(fields=['item', 'expires_at'])]
+
+    def __str__(self):
+        return f"{self.user} holds {self.quantity} × {self.item_id} until {self.expires_at:%H:%M}"
+
+
+# ---------------------------
+# Pickup slots
+# ---------------------------
+class PickupSlot(models.Model):
+    """
+    One pickup window (``CANTEEN_SLOT_MINUTES`` long) and its kitchen counter:
+    ``booked`` only moves through conditional updates in my_canteen/slots.py.
+    """
+    starts_at = models.DateTimeField(unique=True)
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['starts_at']
+
+    def __str__(self):
+        return f"{timezone.localtime(self.starts_at):%d %b %H:%M} ({self.booked}/{self.capacity})"
+
+    @property
+    def free(self):
+        return max(self.capacity - self.booked, 0)
+
+
+# ---------------------------
+# Order events & kitchen SLA
+# ---------------------------
+class OrderEvent(models.Model):
+    """
+    Append-only log of order status changes, written through my_canteen/sla.py.
+    The order reference is deliberately loose (no constraint, no cascade) so
+    events outlive archiving.
+    """
+    order = models.ForeignKey(
+        Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events'
+    )
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['order', 'created_at'])]
+
+    def __str__(self):
+        return f"#{self.order_id} {self.from_status or '-'} -> {self.to_status}"
+
+
+class KitchenSla(models.Model):
+    """
+    One hour of one SLA metric for the whole kitchen, one item or one staff
+    member: a fixed-bucket histogram plus the p50 / p90 read from it. Folded
+    in as events arrive, so dashboards never scan ``OrderEvent``.
+    """
+    METRIC_CHOICES = [
+        ('queue', 'Queue wait'),      # placed -> accepted / preparing
+        ('prep', 'Prep time'),        # preparing -> ready
+        ('ready', 'Time to ready'),   # placed -> ready
+    ]
+    SCOPE_CHOICES = [('all', 'All orders'), ('item', 'Item'), ('staff', 'Staff member')]
+
+    hour = models.DateTimeField()
+    metric = models.CharField(max_length=5, choices=METRIC_CHOICES)
+    scope = models.CharField(max_length=5, choices=SCOPE_CHOICES)
+    key = models.PositiveBigIntegerField(default=0)   # item / user id, 0 for "all"
+    label = models.CharField(max_length=150, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    buckets = models.JSONField(default=list)
+    p50 = models.FloatField(default=0)
+    p90 = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'metric', 'scope', 'key'], name='uniq_kitchen_sla_row'),
+        ]
+        indexes = [models.Index(fields=['scope', 'hour'])]
+
+    def __str__(self):
+        return f"{self.hour:%d %b %H:00} {self.metric} {self.scope}:{self.label or self.key}"
+
+
 # ---------------------------
 # Reviews & Feedback
 # ---------------------------
@@ -163,7 +556,7 @@ class Review(models.Model):
     feedback_title = models.CharField(max_length=100, blank=True, null=True)  # ✅ Optional title
     comment = models.TextField(blank=True, null=True)  # ✅ Feedback text
     is_public = models.BooleanField(default=True)  # ✅ Admin control (show/hide)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -0,0 +1,48 @@
+# my_canteen/paginators.py
+"""
+Admin changelist paginator that does not ``COUNT(*)`` huge tables.
+
+For an unfiltered queryset over a large table the row count comes from the
+planner statistics instead (``pg_class.reltuples`` on PostgreSQL,
+``sqlite_stat1`` after ``ANALYZE`` on SQLite). Filtered lists, small tables and
+backends without statistics still get the exact count.
+"""
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+ESTIMATE_THRESHOLD = 100_000
+
+
+def estimated_rows(model, using="default"):
+    """Planner row estimate for ``model``'s table, or ``None`` when unavailable."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql, params = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table]
+    elif connection.vendor == "sqlite":
+        sql, params = "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:  # no statistics yet (e.g. sqlite_stat1 before ANALYZE)
+        return None
+    if not row or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            estimate = estimated_rows(qs.model, qs.db)
+            if estimate and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
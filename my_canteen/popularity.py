@@ -0,0 +1,137 @@
+# my_canteen/popularity.py
+"""
+Popularity ranking from real sales.
+
+Each item keeps three exponentially decayed sales counters in ``ItemPopularity``:
+
+- ``hour_score``  time constant 1 hour   (what is selling right now)
+- ``day_score``   time constant 24 hours (today)
+- ``week_score``  time constant 7 days   (the steady favourites)
+
+``score`` blends them as per-hour sales rates so the three windows are on the
+same scale. Checkout calls ``record_sale`` for the items it touched (decay the
+row to now, add the quantity); ``rebuild`` recomputes every row from the last
+7 days of ``OrderItem`` and runs nightly via ``rebuild_popularity``, with
+``rebuild_popularity --decay`` hourly so idle items fall back down.
+
+``is_popular`` stays a manual override: ``ranked()`` sorts flagged items first.
+The rank order is baked into the cached and pre-rendered menu, so both bulk
+paths bump the catalog version and queue a re-publish (flushed when the
+management command exits).
+"""
+import math
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import bump_catalog
+from .models import ItemPopularity, OrderItem
+from .prerender import schedule_publish
+
+# counter -> (time constant in seconds, weight in the blended score)
+WINDOWS = {
+    "hour": (3600, 0.5),
+    "day": (86400, 0.3),
+    "week": (7 * 86400, 0.2),
+}
+REBUILD_DAYS = 7
+
+
+def blend(row):
+    # divide by the window length in hours: counts -> sales per hour
+    return sum(
+        weight * getattr(row, f"{name}_score") * 3600 / tau
+        for name, (tau, weight) in WINDOWS.items()
+    )
+
+
+def _decay(row, at):
+    elapsed = max((at - row.scored_at).total_seconds(), 0)
+    for name, (tau, _weight) in WINDOWS.items():
+        field = f"{name}_score"
+        setattr(row, field, getattr(row, field) * math.exp(-elapsed / tau))
+    row.scored_at = at
+
+
+def _add(row, qty, age=0):
+    for name, (tau, _weight) in WINDOWS.items():
+        field = f"{name}_score"
+        setattr(row, field, getattr(row, field) + qty * math.exp(-age / tau))
+
+
+def record_sale(quantities, at=None):
+    """Incremental update for one checkout. ``quantities``: {item_id: qty}."""
+    at = at or timezone.now()
+    quantities = {int(item_id): qty for item_id, qty in quantities.items()}
+    with transaction.atomic():
+        rows = {
+            row.item_id: row
+            for row in ItemPopularity.objects.select_for_update().filter(item_id__in=quantities)
+        }
+        new = []
+        for item_id, qty in quantities.items():
+            row = rows.get(item_id)
+            if row is None:
+                row = ItemPopularity(item_id=item_id, scored_at=at)
+                new.append(row)
+            else:
+                _decay(row, at)
+            _add(row, qty)
+            row.score = blend(row)
+        # a concurrent first sale of the same item loses its increment; the nightly rebuild restores it
+        ItemPopularity.objects.bulk_create(new, ignore_conflicts=True)
+        ItemPopularity.objects.bulk_update(
+            list(rows.values()),
+            ["hour_score", "day_score", "week_score", "score", "scored_at"],
+        )
+
+
+def decay_all(at=None):
+    """Age every row to ``at`` without rescanning orders. Returns the row count."""
+    at = at or timezone.now()
+    rows = list(ItemPopularity.objects.all())
+    for row in rows:
+        _decay(row, at)
+        row.score = blend(row)
+    ItemPopularity.objects.bulk_update(
+        rows, ["hour_score", "day_score", "week_score", "score", "scored_at"], batch_size=500
+    )
+    bump_catalog()
+    schedule_publish()
+    return len(rows)
+
+
+def rebuild(at=None):
+    """Recompute every row from the last ``REBUILD_DAYS`` of sales. Returns the row count."""
+    at = at or timezone.now()
+    sales = (
+        OrderItem.objects.filter(order__created_at__gte=at - timedelta(days=REBUILD_DAYS))
+        .exclude(order__status="cancelled")
+        .values_list("item_id", "quantity", "order__created_at")
+    )
+    rows = {}
+    for item_id, qty, created_at in sales.iterator(chunk_size=2000):
+        row = rows.get(item_id)
+        if row is None:
+            row = rows[item_id] = ItemPopularity(item_id=item_id, scored_at=at)
+        _add(row, qty, age=max((at - created_at).total_seconds(), 0))
+    for row in rows.values():
+        row.score = blend(row)
+
+    with transaction.atomic():
+        ItemPopularity.objects.all().delete()
+        ItemPopularity.objects.bulk_create(rows.values(), batch_size=500)
+    bump_catalog()
+    schedule_publish()
+    return len(rows)
+
+
+def ranked(queryset):
+    """Manual ``is_popular`` override first, then sales rank; unsold items last."""
+    return queryset.order_by("-is_popular", F("popularity__score").desc(nulls_last=True), "name")
+
+
+def popular_filter():
+    return Q(is_popular=True) | Q(popularity__score__gt=0)
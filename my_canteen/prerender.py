@@ -0,0 +1,166 @@
+# my_canteen/prerender.py
+"""
+Pre-rendered anonymous ``home`` and ``menu`` pages.
+
+``publish()`` renders the pages an anonymous visitor would get (``/``,
+``/menu/`` and ``/menu/?cat=<id>`` for every category) and writes them to
+``settings.PRERENDER_ROOT`` as plain, gzip and (if the ``brotli`` package is
+installed) brotli files. File names carry the catalog version; the
+``manifest.json`` that points at them is swapped in last with ``os.replace``,
+so readers always see one complete generation.
+
+``my_canteen.middleware.PrerenderedPageMiddleware`` answers matching
+anonymous GETs straight from those files while the manifest version equals the
+live catalog version, and falls through to the normal views otherwise.
+Availability is not part of that version: the menu script overlays it from
+``menu/stock/``, so checkouts and cancels never invalidate a generation.
+"""
+import atexit
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.urls import resolve
+
+from .cache import catalog_version
+
+try:  # optional dependency
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+MANIFEST = "manifest.json"
+
+
+def root() -> Path:
+    return Path(settings.PRERENDER_ROOT)
+
+
+def page_key(path, cat=None):
+    return f"{path}?cat={cat}" if cat else path
+
+
+def targets():
+    from .models import Category
+
+    yield page_key("/"), "/"
+    yield page_key("/menu/"), "/menu/"
+    for cat_id in Category.objects.values_list("id", flat=True):
+        yield page_key("/menu/", cat_id), f"/menu/?cat={cat_id}"
+
+
+def render_anonymous(url):
+    from importlib import import_module
+
+    from django.test import RequestFactory
+
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    match = resolve(request.path_info)
+    request.resolver_match = match
+    response = match.func(request, *match.args, **match.kwargs)
+    return response.content
+
+
+def _atomic_write(path: Path, data: bytes):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def publish():
+    """Render every anonymous page for the current catalog version. Returns the manifest."""
+    out = root()
+    out.mkdir(parents=True, exist_ok=True)
+    version = catalog_version()
+    pages = {}
+    for idx, (key, url) in enumerate(targets()):
+        html = render_anonymous(url)
+        stem = f"page{idx}.v{version}"
+        files = {"identity": f"{stem}.html"}
+        _atomic_write(out / files["identity"], html)
+        files["gzip"] = f"{stem}.html.gz"
+        _atomic_write(out / files["gzip"], gzip.compress(html, 9))
+        if brotli is not None:
+            files["br"] = f"{stem}.html.br"
+            _atomic_write(out / files["br"], brotli.compress(html))
+        pages[key] = files
+
+    previous = load_manifest()
+    manifest = {"catalog_version": version, "published_at": time.time(), "pages": pages}
+    _atomic_write(out / MANIFEST, json.dumps(manifest).encode())
+
+    # drop generations older than the one just replaced (it may still be mid-read)
+    keep = {f for files in pages.values() for f in files.values()}
+    if previous:
+        keep |= {f for files in previous["pages"].values() for f in files.values()}
+    for path in out.glob("page*.v*"):
+        if path.name not in keep:
+            path.unlink(missing_ok=True)
+    return manifest
+
+
+def load_manifest():
+    try:
+        return json.loads((root() / MANIFEST).read_bytes())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# ---------- Re-publish on catalog change ----------
+_pending = threading.Lock()
+_wake = threading.Event()   # cuts the debounce short (flush)
+_thread = None
+
+
+def schedule_publish():
+    """
+    Debounced background re-publish. Only active once ``publish_static`` has
+    created a manifest, so development and tests never spawn threads.
+    """
+    global _thread
+    if not getattr(settings, "PRERENDER_AUTO_PUBLISH", True) or not (root() / MANIFEST).exists():
+        return
+    if not _pending.acquire(blocking=False):
+        return  # a publish is already queued and will pick this change up
+
+    def run():
+        try:
+            while True:
+                _wake.wait(getattr(settings, "PRERENDER_DEBOUNCE_SECONDS", 2))
+                # changes that landed while rendering would otherwise be lost
+                if publish()["catalog_version"] == catalog_version():
+                    break
+        finally:
+            connections.close_all()
+            _wake.clear()
+            _pending.release()
+
+    _thread = threading.Thread(target=run, name="prerender-publish", daemon=True)
+    _thread.start()
+
+
+@atexit.register
+def flush():
+    """
+    Publish a queued change now and wait for it. Runs at interpreter exit, so
+    management commands (``import_catalog``, ``rebuild_popularity``) that end
+    inside the debounce still re-publish before the daemon thread is killed.
+    """
+    thread = _thread
+    if thread is not None and thread.is_alive():
+        _wake.set()
+        thread.join()
@@ -0,0 +1,195 @@
+# my_canteen/profiling.py
+"""
+On-demand profiling of production views.
+
+``ProfilingMiddleware`` (last in ``MIDDLEWARE``) runs a view under a profiler
+when either
+
+- the request carries ``X-Canteen-Profile: <token>``, a signed token from
+  ``manage.py profile_report --token [--mode ...]`` (valid ``TOKEN_MAX_AGE``), or
+- the view's URL name is in ``CANTEEN_PROFILE_VIEWS`` and a coin flip at its
+  rate comes up (``"dashboard:0.05,menu:0.01"``)
+
+Two modes:
+
+- ``cprofile``  deterministic, exact call counts; written as ``.pstats``
+- ``sample``    a thread reads the request thread's stack every
+  ``CANTEEN_PROFILE_INTERVAL_MS`` and writes collapsed stacks (``.collapsed``,
+  the flamegraph.pl / speedscope input); far lower overhead on slow views
+
+Files land in ``CANTEEN_PROFILE_DIR`` named
+``<time>-<url name>-<role>-<pid>.<ext>``; ``manage.py profile_report`` merges
+them and lists the top cumulative functions. With no header and no listed
+view the middleware costs one dict lookup per request.
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+HEADER = "X-Canteen-Profile"
+SALT = "my_canteen.profiling"
+TOKEN_MAX_AGE = 3600
+MODES = ("cprofile", "sample")
+EXTENSIONS = {"cprofile": ".pstats", "sample": ".collapsed"}
+
+
+@lru_cache(maxsize=8)
+def _rates(text):
+    rates = {}
+    for part in filter(None, (p.strip() for p in (text or "").split(","))):
+        name, _, rate = part.partition(":")
+        rates[name.strip()] = float(rate or 1)
+    return rates
+
+
+def rates():
+    return _rates(getattr(settings, "CANTEEN_PROFILE_VIEWS", ""))
+
+
+def default_mode():
+    return getattr(settings, "CANTEEN_PROFILE_MODE", "sample")
+
+
+def sample_interval():
+    return getattr(settings, "CANTEEN_PROFILE_INTERVAL_MS", 5) / 1000
+
+
+def directory():
+    return Path(getattr(settings, "CANTEEN_PROFILE_DIR", settings.BASE_DIR / "profiles"))
+
+
+def make_token(mode=None):
+    return signing.dumps(mode or default_mode(), salt=SALT)
+
+
+def requested_mode(request, url_name):
+    """The mode to profile this request with, or ``None`` (the common case)."""
+    token = request.headers.get(HEADER)
+    if token:
+        try:
+            mode = signing.loads(token, salt=SALT, max_age=TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            return None
+        return mode if mode in MODES else default_mode()
+    rate = rates().get(url_name)
+    if rate and random.random() < rate:
+        return default_mode()
+    return None
+
+
+# ---------- Sampler ----------
+def frame_name(code):
+    path = code.co_filename
+    for root in (str(settings.BASE_DIR), sys.prefix):
+        if path.startswith(root):
+            path = os.path.relpath(path, root)
+            break
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """
+    Counts the collapsed stacks of one thread, ``interval`` seconds apart,
+    cut below the frame running ``stop_at`` (so only the view shows).
+    """
+
+    def __init__(self, thread_id, interval=None, stop_at=None):
+        super().__init__(name="canteen-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.stop_at = stop_at
+        self.interval = interval or sample_interval()
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and frame.f_code is not self.stop_at:
+                names.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# ---------- Running & saving ----------
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9_]+", "_", str(value or "none"))
+
+
+def output_path(mode, url_name, role):
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    name = f"{stamp}-{_slug(url_name)}-{_slug(role)}-{os.getpid()}-{random.randrange(16**4):04x}"
+    return directory() / (name + EXTENSIONS[mode])
+
+
+def run(mode, url_name, role, func, *args, **kwargs):
+    """Call ``func`` under ``mode``, save the profile, return ``func``'s result."""
+    path = output_path(mode, url_name, role)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if mode == "cprofile":
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            profile.dump_stats(path)
+    sampler = Sampler(threading.get_ident(), stop_at=run.__code__)
+    sampler.start()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sampler.stop()
+        path.write_text("".join(f"{stack} {n}\n" for stack, n in sampler.stacks.items()))
+
+
+# ---------- Reading ----------
+def parse_name(path):
+    """``(url_name, role)`` from a profile file name."""
+    parts = path.stem.split("-")
+    return (parts[1], parts[2]) if len(parts) >= 3 else ("", "")
+
+
+def profiles(view=None, role=None, root=None):
+    for path in sorted((root or directory()).glob("*")):
+        if path.suffix not in EXTENSIONS.values():
+            continue
+        url_name, who = parse_name(path)
+        if (view and url_name != view) or (role and who != role):
+            continue
+        yield path
+
+
+def merge_collapsed(paths):
+    stacks = Counter()
+    for path in paths:
+        for line in path.read_text().splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def cumulative(stacks):
+    """``(total samples, {function: samples with it on the stack}, {function: samples at the top})``."""
+    inclusive, own, total = Counter(), Counter(), 0
+    for stack, n in stacks.items():
+        frames = stack.split(";")
+        total += n
+        own[frames[-1]] += n
+        for name in set(frames):
+            inclusive[name] += n
+    return total, inclusive, own
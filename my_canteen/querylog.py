@@ -0,0 +1,196 @@
+# my_canteen/querylog.py
+"""
+Slow query log.
+
+Every database connection gets an execute wrapper (hooked up on
+``connection_created`` in my_canteen/signals.py) that times each statement. A
+statement slower than ``CANTEEN_SLOW_QUERY_MS`` is written as one JSON line to
+``CANTEEN_SLOW_QUERY_LOG`` (rotated at ``MAX_BYTES``, ``BACKUPS`` kept) with:
+
+- ``fingerprint``  hash of the SQL with literals and ``IN (...)`` lists folded,
+  so every ``menu_page`` filter combination with the same shape groups together
+- ``view``         URL name of the request running it (``SlowQueryMiddleware``)
+- ``stack``        the innermost project frames that issued it
+- ``plan``         ``EXPLAIN QUERY PLAN`` (SQLite) / ``EXPLAIN`` (PostgreSQL), captured
+  the first time this process sees a slow fingerprint (SELECTs only)
+
+``manage.py slow_queries`` ranks the fingerprints by total time. Below the
+threshold the cost is two ``perf_counter`` calls per query.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError
+
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 5
+STACK_DEPTH = 6
+SEEN_LIMIT = 5000   # fingerprints remembered per process for EXPLAIN capture
+
+current_view = contextvars.ContextVar("current_view", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?|\$\d+")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_PLUMBING = ("querylog.py", "middleware.py")  # wrappers around every query, not call sites
+
+_seen = set()
+_local = threading.local()
+_logger = _logger_path = None
+_logger_lock = threading.Lock()
+
+
+def normalize(sql):
+    """SQL with literals / placeholders as ``?`` and ``IN`` lists as ``IN (...)``."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def stack_summary():
+    """Innermost frames from project code (no middleware), ``"path:line function"``, outermost first."""
+    root = str(settings.BASE_DIR)
+    frames = [
+        f for f in traceback.extract_stack()[:-3]
+        if f.filename.startswith(root) and "site-packages" not in f.filename and not f.filename.endswith(_PLUMBING)
+    ]
+    return [f"{Path(f.filename).relative_to(root)}:{f.lineno} {f.name}" for f in frames[-STACK_DEPTH:]]
+
+
+def threshold():
+    """Seconds; read per query so ``override_settings`` and tests can lower it."""
+    return getattr(settings, "CANTEEN_SLOW_QUERY_MS", 100) / 1000
+
+
+def log_path():
+    return Path(getattr(settings, "CANTEEN_SLOW_QUERY_LOG", settings.BASE_DIR / "logs" / "slow_queries.jsonl"))
+
+
+def _log():
+    """The rotating JSONL logger, reopened if ``CANTEEN_SLOW_QUERY_LOG`` changed (tests)."""
+    global _logger, _logger_path
+    path = log_path()
+    if _logger is None or _logger_path != path:
+        with _logger_lock:
+            if _logger is None or _logger_path != path:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                logger = logging.getLogger("my_canteen.slow_queries")
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                for old in list(logger.handlers):
+                    logger.removeHandler(old)
+                    old.close()
+                handler = RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+                _logger, _logger_path = logger, path
+    return _logger
+
+
+def explain(connection, sql, params):
+    """Plan lines for a SELECT, or ``None``."""
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+    except DatabaseError:
+        return None
+    finally:
+        _local.explaining = False
+
+
+def record(connection, sql, params, seconds, many=False):
+    key = fingerprint(sql)
+    entry = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "fingerprint": key,
+        "ms": round(seconds * 1000, 2),
+        "alias": connection.alias,
+        "view": current_view.get(),
+        "sql": normalize(sql)[:2000],
+        "stack": stack_summary(),
+    }
+    if key not in _seen and not many:
+        if len(_seen) < SEEN_LIMIT:
+            _seen.add(key)
+        entry["plan"] = explain(connection, sql, params)
+    _log().info(json.dumps(entry, separators=(",", ":")))
+
+
+class SlowQueryWrapper:
+    """``connection.execute_wrappers`` entry; one per connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, "explaining", False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed >= threshold():
+                record(self.connection, sql, params, elapsed, many)
+
+
+def install(connection):
+    if not any(isinstance(w, SlowQueryWrapper) for w in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryWrapper(connection))
+
+
+# ---------- Reading the log ----------
+def log_files(path=None):
+    path = Path(path) if path else log_path()
+    return [p for p in [path, *(path.with_name(f"{path.name}.{i}") for i in range(1, BACKUPS + 1))] if p.exists()]
+
+
+def rank(entries, view=None):
+    """Aggregate log entries per fingerprint, biggest total time first."""
+    groups = {}
+    for entry in entries:
+        if view and entry.get("view") != view:
+            continue
+        group = groups.setdefault(entry["fingerprint"], {
+            "fingerprint": entry["fingerprint"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "views": set(), "sql": entry["sql"], "stack": entry.get("stack", []), "plan": None,
+        })
+        group["count"] += 1
+        group["total_ms"] += entry["ms"]
+        group["max_ms"] = max(group["max_ms"], entry["ms"])
+        group["views"].add(entry.get("view") or "-")
+        if entry.get("plan"):
+            group["plan"] = entry["plan"]
+    return sorted(groups.values(), key=lambda g: -g["total_ms"])
+
+
+def read(paths):
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
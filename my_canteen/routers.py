@@ -0,0 +1,81 @@
+# my_canteen/routers.py
+"""
+Primary / replica database routing.
+
+- Writes always go to ``default``.
+- Reads of canteen models go to a random ``replica*`` alias, except when the
+  current context is pinned to the primary (``use_primary``), the primary is
+  inside an atomic block, or the user wrote something a moment ago
+  (see ``ReplicaPinningMiddleware``).
+- auth / sessions / admin log stay on ``default`` so logins are never stale.
+"""
+import random
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_force_primary = ContextVar("canteen_force_primary", default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+def primary_forced() -> bool:
+    return _force_primary.get()
+
+
+class use_primary(ContextDecorator):
+    """
+    Force every read in the block (or decorated function / view) to the primary::
+
+        with use_primary():
+            order = Order.objects.get(id=order_id)
+
+        @use_primary()
+        def checkout(request): ...
+    """
+
+    _token = None
+
+    def _recreate_cm(self):
+        # fresh instance per decorated call, so concurrent requests never share a token
+        return type(self)()
+
+    def __enter__(self):
+        self._token = _force_primary.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        _force_primary.reset(self._token)
+        return False
+
+
+class PrimaryReplicaRouter:
+    route_app_labels = {"my_canteen"}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.route_app_labels:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # related lookups stay on the database the instance came from
+            return instance._state.db
+        if _force_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = replica_aliases()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
@@ -0,0 +1,161 @@
+# my_canteen/search.py
+"""
+In-memory prefix index behind ``menu/suggest/``.
+
+Every active item is indexed under sorted string keys, one set per kind:
+
+- ``w:<token>``  each word of the name and of the category name
+- ``s:<skeleton>`` the same words reduced to a phonetic consonant skeleton,
+  so romanised Bangla spellings meet: Fuchka / Phuchka -> ``fchk``,
+  Chotpoti / Chatpati -> ``chtpt``, Singara / Shingara -> ``sngr``
+
+A lookup is a ``bisect`` into the sorted key list followed by a short forward
+scan. When a word has no hit, query variants within edit distance 1
+(deletes, transposes, replaces, inserts) are probed the same way, so typos cost
+a few hundred O(log n) probes and never a scan over the catalog.
+
+The index is rebuilt per process when the ``search`` cache namespace is bumped
+(item name / category / activation changes), not on stock updates.
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from .cache import tiered
+
+ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+# candidates examined per query; bounds multi-word queries whose later words reject most hits
+SCAN_LIMIT = 2000
+
+# digraphs first, longest first
+_PHONETIC = [
+    ("chh", "ch"), ("ph", "f"), ("bh", "b"), ("dh", "d"), ("gh", "g"), ("jh", "j"),
+    ("kh", "k"), ("sh", "s"), ("th", "t"), ("z", "j"), ("q", "k"), ("v", "b"), ("w", "b"),
+]
+_VOWELS = re.compile(r"[aeiouy]")
+_REPEATS = re.compile(r"(.)\1+")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def skeleton(token):
+    """Consonant skeleton: phonetic digraphs folded, vowels and doubles dropped (first letter kept)."""
+    for src, dst in _PHONETIC:
+        token = token.replace(src, dst)
+    if not token:
+        return token
+    return _REPEATS.sub(r"\1", token[0] + _VOWELS.sub("", token[1:]))
+
+
+def edits1(word):
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = [a + b[1:] for a, b in splits if b]
+    transposes = [a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1]
+    replaces = [a + c + b[1:] for a, b in splits if b for c in ALPHABET]
+    inserts = [a + c + b for a, b in splits for c in ALPHABET]
+    return set(deletes + transposes + replaces + inserts)
+
+
+class SuggestIndex:
+    def __init__(self, rows):
+        """``rows``: iterable of (id, name, category_name, price)."""
+        self.items = {}
+        self.terms = {}
+        entries = []
+        for item_id, name, category, price in rows:
+            self.items[item_id] = (name, category or "", str(price))
+            words = set(normalize(f"{name} {category or ''}").split())
+            skeletons = {skeleton(w) for w in words if len(w) >= 3}
+            self.terms[item_id] = tuple(words | skeletons)
+            entries += [(f"w:{w}", item_id) for w in words]
+            entries += [(f"s:{sk}", item_id) for sk in skeletons]
+        entries.sort()
+        self.keys = [k for k, _ in entries]
+        self.ids = [i for _, i in entries]
+
+    def __len__(self):
+        return len(self.items)
+
+    def _iter_prefix(self, key):
+        keys, ids = self.keys, self.ids
+        i = bisect_left(keys, key)
+        while i < len(keys) and keys[i].startswith(key):
+            yield ids[i]
+            i += 1
+
+    def _has_prefix(self, key):
+        i = bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i].startswith(key)
+
+    @staticmethod
+    def _probes(word):
+        """Prefixes one query word may match: itself, then its skeleton (long words only)."""
+        probes = [word]
+        if len(word) >= 3:
+            sk = skeleton(word)
+            if len(sk) >= 3:
+                probes.append(sk)
+        return probes
+
+    def _candidates(self, word, fuzzy):
+        """Ids for the word being typed, best kind first: exact prefix, phonetic, typo."""
+        found = False
+        for kind, probe in zip("ws", self._probes(word)):
+            for item_id in self._iter_prefix(f"{kind}:{probe}"):
+                found = True
+                yield item_id
+        if not found and fuzzy and len(word) >= 3:
+            for variant in sorted(edits1(word)):
+                if self._has_prefix(f"w:{variant}"):
+                    yield from self._iter_prefix(f"w:{variant}")
+
+    def suggest(self, query, limit=8, fuzzy=True):
+        words = normalize(query).split()
+        if not words:
+            return []
+        # the last word is still being typed; earlier words filter its matches
+        filters = [self._probes(w) for w in words[:-1]]
+        seen, results = set(), []
+        for scanned, item_id in enumerate(self._candidates(words[-1], fuzzy)):
+            if scanned >= SCAN_LIMIT or len(results) >= limit:
+                break
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            terms = self.terms[item_id]
+            if all(any(t.startswith(p) for p in probes for t in terms) for probes in filters):
+                name, category, price = self.items[item_id]
+                results.append({"id": item_id, "name": name, "category": category, "price": price})
+        return results
+
+
+# ---------- per-process index ----------
+_index = None
+_index_version = None
+_build_lock = threading.Lock()
+
+
+def build_from_db():
+    from .models import MenuItem
+
+    rows = MenuItem.objects.filter(is_active=True).values_list("id", "name", "category__name", "price")
+    return SuggestIndex(rows.iterator(chunk_size=2000))
+
+
+def get_index():
+    global _index, _index_version
+    version = tiered.version("search")
+    if _index is None or _index_version != version:
+        with _build_lock:
+            if _index is None or _index_version != version:
+                _index, _index_version = build_from_db(), version
+    return _index
+
+
+def bump_search_index():
+    return tiered.bump("search")
@@ -1,9 +1,16 @@
 # my_canteen/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.mail import send_mail
+from django.contrib.auth.models import User
 from django.utils import timezone
-from .models import Payment, Order
+from .models import ArchivedOrder, Payment, Order, MenuItem, Category, Review, StockMovement
+from .cache import bump_catalog, bump_item_reviews, bump_stock
+from .prerender import schedule_publish
+from .search import bump_search_index
+from . import catalog_sync, metrics, querylog
 
 @receiver(post_save, sender=Payment)
 def on_payment_change(sender, instance: Payment, created, **kwargs):
@@ -20,12 +27,96 @@ def on_payment_change(sender, instance: Payment, created, **kwargs):
 
         # কনফার্মেশন ইমেইল (dev-এ কনসোলে প্রিন্ট হবে)
         try:
-            send_mail(
-                subject=f"Payment Confirmed for Order #{ord.id}",
-                message=f"Amount {instance.amount} via {instance.method}. Txn: {instance.transaction_id}",
-                from_email=None,
-                recipient_list=[ord.user.email],
-                fail_silently=True
-            )
+            with metrics.timed_email("payment_confirmation"):
+                send_mail(
+                    subject=f"Payment Confirmed for Order #{ord.id}",
+                    message=f"Amount {instance.amount} via {instance.method}. Txn: {instance.transaction_id}",
+                    from_email=None,
+                    recipient_list=[ord.user.email],
+                    fail_silently=True
+                )
         except Exception:
             pass
+
+
+# ---------- Slow query log ----------
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    querylog.install(connection)
+
+
+# ---------- Cache invalidation ----------
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def on_catalog_change(sender, instance, update_fields=None, **kwargs):
+    # menu/home/chips cache keys are versioned on "catalog"; bumped only once the
+    # change is visible, or a reader could cache the old rows under the new version
+    if update_fields and set(update_fields) <= catalog_sync.STOCK_ONLY_FIELDS:
+        transaction.on_commit(bump_stock)  # availability is not part of the cached pages
+        return
+    transaction.on_commit(bump_catalog)
+    transaction.on_commit(schedule_publish)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def on_review_change(sender, instance, **kwargs):
+    item_id = instance.item_id
+    transaction.on_commit(lambda: bump_item_reviews(item_id))
+
+
+# stock / rating updates never change what the suggest index holds
+SEARCH_IRRELEVANT_FIELDS = {"stock", "rating_avg", "rating_count", "updated_at"}
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def on_search_change(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= SEARCH_IRRELEVANT_FIELDS:
+        return
+    transaction.on_commit(bump_search_index)
+
+
+# ---------- Catalog change log (delta sync) ----------
+@receiver(post_save, sender=MenuItem)
+def log_item_saved(sender, instance, update_fields=None, **kwargs):
+    catalog_sync.record_item_save(instance, update_fields)
+
+
+@receiver(post_delete, sender=MenuItem)
+def log_item_deleted(sender, instance, **kwargs):
+    catalog_sync.record("item", [instance.pk], "delete")
+
+
+@receiver(post_save, sender=Category)
+def log_category_saved(sender, instance, **kwargs):
+    catalog_sync.record("category", [instance.pk], "upsert")
+
+
+@receiver(post_delete, sender=Category)
+def log_category_deleted(sender, instance, **kwargs):
+    catalog_sync.record("category", [instance.pk], "delete")
+
+
+# ---------- Stock ledger ----------
+@receiver(post_save, sender=MenuItem)
+def log_opening_stock(sender, instance, created, raw=False, **kwargs):
+    # later changes go through my_canteen/stock.py; bulk_create() callers log their own
+    if created and not raw and instance.stock:
+        StockMovement.objects.create(item=instance, kind="restock", quantity=instance.stock, note="opening stock")
+
+
+# ---------- Denormalised order columns ----------
+@receiver(post_save, sender=User)
+def sync_customer_name(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # a login only touches last_login; renames are rare, so one UPDATE is fine
+    if created or raw or (update_fields and "username" not in update_fields):
+        return
+    for model in (Order, ArchivedOrder):
+        model.objects.filter(user=instance).exclude(customer_name=instance.username).update(
+            customer_name=instance.username
+        )
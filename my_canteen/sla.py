@@ -0,0 +1,169 @@
+# my_canteen/sla.py
+"""
+Order status events and kitchen SLA aggregates.
+
+Every status change goes through ``transition`` (checkout calls ``record`` for
+the initial ``pending``), which appends an ``OrderEvent`` and folds the
+durations it completes into hourly ``KitchenSla`` rows:
+
+- ``queue``  placed -> first accepted / preparing   (credited to whoever accepted)
+- ``prep``   last preparing -> first ready           (credited to whoever marked it ready)
+- ``ready``  placed -> first ready
+
+each for the whole kitchen, for every item on the order and for the staff
+member. A row keeps a fixed-bucket histogram, so adding an observation is a
+counter bump and p50 / p90 are re-read from the buckets; ``summary`` merges a
+day's rows from one query. Percentiles are interpolated inside a bucket, which
+is plenty at minute resolution.
+"""
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import datetime, time as dt_time
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import KitchenSla, OrderEvent, OrderItem
+
+# bucket upper bounds in seconds; one more bucket catches everything slower
+BOUNDS = (30, 60, 120, 180, 240, 300, 420, 600, 900, 1200, 1800, 2700, 3600)
+QUEUE_DONE = ("accepted", "preparing")
+METRICS = ("queue", "prep", "ready")
+
+Stat = namedtuple("Stat", "count mean p50 p90")  # minutes
+
+
+def percentile(buckets, q):
+    """Seconds below which ``q`` of the histogram's observations fall."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    target, seen = q * total, 0
+    for i, n in enumerate(buckets):
+        if n and seen + n >= target:
+            low = BOUNDS[i - 1] if i else 0
+            high = BOUNDS[i] if i < len(BOUNDS) else BOUNDS[-1] * 2
+            return low + (high - low) * (target - seen) / n
+        seen += n
+    return float(BOUNDS[-1])
+
+
+def _observations(order, to_status, at, earlier):
+    """``{metric: seconds}`` completed by moving ``order`` to ``to_status`` at ``at``."""
+    reached = {status for status, _ in earlier}
+    found = {}
+    if to_status in QUEUE_DONE and not reached.intersection(QUEUE_DONE):
+        found["queue"] = at - order.created_at
+    if to_status == "ready" and "ready" not in reached:
+        found["ready"] = at - order.created_at
+        started = [when for status, when in earlier if status == "preparing"]
+        if started:
+            found["prep"] = at - max(started)
+    return {metric: max(delta.total_seconds(), 0) for metric, delta in found.items()}
+
+
+def _fold(hour, observed, dimensions):
+    """Add ``{metric: seconds}`` to the hour's row for every ``(scope, key, label)``."""
+    wanted = {(metric, scope, key): label for metric in observed for scope, key, label in dimensions}
+    rows = {
+        (row.metric, row.scope, row.key): row
+        for row in KitchenSla.objects.select_for_update().filter(
+            hour=hour, metric__in=observed, scope__in={scope for scope, _, _ in dimensions},
+            key__in={key for _, key, _ in dimensions},
+        )
+    }
+    for (metric, scope, key), label in wanted.items():
+        if (metric, scope, key) not in rows:  # first observation this hour
+            rows[metric, scope, key] = KitchenSla.objects.select_for_update().get_or_create(
+                hour=hour, metric=metric, scope=scope, key=key, defaults={"label": label}
+            )[0]
+    touched = []
+    for (metric, scope, key), label in wanted.items():
+        row = rows[metric, scope, key]
+        seconds = observed[metric]
+        buckets = row.buckets or [0] * (len(BOUNDS) + 1)
+        buckets[bisect_left(BOUNDS, seconds)] += 1
+        row.buckets, row.label = buckets, label
+        row.count += 1
+        row.total_seconds += seconds
+        row.p50, row.p90 = percentile(buckets, 0.5), percentile(buckets, 0.9)
+        touched.append(row)
+    KitchenSla.objects.bulk_update(touched, ["buckets", "label", "count", "total_seconds", "p50", "p90"])
+
+
+def _count(order, from_status, to_status):
+    if from_status:
+        metrics.inc("canteen_order_transitions_total", **{"from": from_status, "to": to_status})
+    else:  # placed
+        metrics.inc("canteen_orders_created_total", method=order.payment_method)
+        metrics.observe("canteen_cart_items", order.item_count)
+
+
+@transaction.atomic
+def record(order, from_status, to_status, actor=None):
+    """Append the event and fold whatever SLA durations it completes."""
+    at = timezone.now()
+    earlier = list(OrderEvent.objects.filter(order_id=order.pk).values_list("to_status", "created_at"))
+    event = OrderEvent.objects.create(
+        order_id=order.pk, from_status=from_status, to_status=to_status, actor=actor, created_at=at
+    )
+    transaction.on_commit(lambda: _count(order, from_status, to_status))
+    observed = _observations(order, to_status, at, earlier)
+    if observed:
+        dimensions = [("all", 0, "")]
+        dimensions += [
+            ("item", item_id, name)
+            for item_id, name in OrderItem.objects.filter(order_id=order.pk)
+            .values_list("item_id", "item__name").distinct()
+        ]
+        if actor is not None:
+            dimensions.append(("staff", actor.pk, actor.username))
+        _fold(at.replace(minute=0, second=0, microsecond=0), observed, dimensions)
+    return event
+
+
+@transaction.atomic
+def transition(order, status, actor=None):
+    """Move ``order`` to ``status`` and log it; a no-op when it is already there."""
+    previous = order.status
+    if previous == status:
+        return None
+    order.status = status
+    order.save(update_fields=["status"])
+    return record(order, previous, status, actor)
+
+
+def _stat(count, total, buckets):
+    return Stat(count, total / count / 60 if count else 0, percentile(buckets, 0.5) / 60, percentile(buckets, 0.9) / 60)
+
+
+def summary(since=None):
+    """
+    Merged SLA since ``since`` (default: local midnight), from one query:
+    ``{"all": {metric: Stat}, "staff": [...], "item": [...]}`` where the lists
+    hold ``{"label", metric: Stat, ...}`` dicts, busiest first.
+    """
+    if since is None:
+        since = timezone.make_aware(datetime.combine(timezone.localdate(), dt_time.min))
+    merged = defaultdict(lambda: [0, 0.0, [0] * (len(BOUNDS) + 1)])
+    labels = {}
+    rows = KitchenSla.objects.filter(hour__gte=since).values_list(
+        "metric", "scope", "key", "label", "count", "total_seconds", "buckets"
+    )
+    for metric, scope, key, label, count, total, buckets in rows:
+        acc = merged[scope, key, metric]
+        acc[0] += count
+        acc[1] += total
+        acc[2] = [a + b for a, b in zip(acc[2], buckets)]
+        labels[scope, key] = label
+
+    groups = {}
+    for (scope, key, metric), (count, total, buckets) in merged.items():
+        group = groups.setdefault((scope, key), {"label": labels[scope, key], "count": 0})
+        group[metric] = _stat(count, total, buckets)
+        group["count"] = max(group["count"], count)
+    result = {"all": groups.pop(("all", 0), {}), "staff": [], "item": []}
+    for (scope, _), group in sorted(groups.items(), key=lambda kv: (-kv[1]["count"], kv[1]["label"])):
+        result[scope].append(group)
+    return result
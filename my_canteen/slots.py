@@ -0,0 +1,136 @@
+# my_canteen/slots.py
+"""
+Pickup time slots with a kitchen capacity per slot.
+
+Every slot is a ``PickupSlot`` counter row: ``capacity`` and ``booked`` in
+prep units. A portion costs its item's ``prep_units``, falling back to the
+category's (1 by default), so a biryani can weigh more than a tea. Booking is
+one conditional ``UPDATE ... SET booked = booked + n WHERE booked + n <=
+capacity``: two checkouts racing for the last units cannot both win, and no
+order rows are ever counted.
+
+Checkout reads the day's free capacity from ``cache.pickup_slots`` (bumped on
+every booking / release), so rendering it costs no per-slot queries. Rows for
+a day are created on first use with ``CANTEEN_SLOT_CAPACITY``; edit one in the
+admin to give a busy slot more (or fewer) units.
+"""
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .cache import bump_slots, pickup_slots
+from .models import MenuItem, PickupSlot
+
+OPEN_STATUSES = ("pending", "accepted", "preparing", "ready")
+
+
+class SlotFull(Exception):
+    pass
+
+
+# settings are read per call, so override_settings and reloads take effect
+def slot_length():
+    return timedelta(minutes=getattr(settings, "CANTEEN_SLOT_MINUTES", 10))
+
+
+def default_capacity():
+    return getattr(settings, "CANTEEN_SLOT_CAPACITY", 30)
+
+
+def pickup_hours():
+    return getattr(settings, "CANTEEN_PICKUP_HOURS", (8, 20))
+
+
+def lead_time():
+    return timedelta(minutes=getattr(settings, "CANTEEN_PICKUP_LEAD_MINUTES", 10))
+
+
+def starts_for(day):
+    """Aware start times of ``day``'s slots (local opening hours)."""
+    tz = timezone.get_current_timezone()
+    midnight = datetime.combine(day, dt_time.min)
+    open_hour, close_hour = pickup_hours()
+    start = timezone.make_aware(midnight + timedelta(hours=open_hour), tz)
+    end = timezone.make_aware(midnight + timedelta(hours=close_hour), tz)  # close_hour may be 24
+    step, starts = slot_length(), []
+    while start < end:
+        starts.append(start)
+        start += step
+    return starts
+
+
+def slot_rows(day):
+    """``[{"id", "starts_at", "free"}]`` for ``day``, creating its rows on first use."""
+    starts = starts_for(day)
+    if not starts:
+        return []
+    capacity = default_capacity()
+    PickupSlot.objects.bulk_create(
+        [PickupSlot(starts_at=start, capacity=capacity) for start in starts], ignore_conflicts=True
+    )
+    rows = PickupSlot.objects.filter(starts_at__gte=starts[0], starts_at__lte=starts[-1]).values_list(
+        "id", "starts_at", "capacity", "booked"
+    )
+    return [
+        {"id": pk, "starts_at": starts_at, "free": max(capacity - booked, 0)}
+        for pk, starts_at, capacity, booked in rows
+    ]
+
+
+def units_for(lines):
+    """Prep units of a ``{item_id: qty}`` cart: one query."""
+    units = dict(
+        MenuItem.objects.filter(id__in=lines)
+        .annotate(units=Coalesce("prep_units", "category__prep_units", Value(1)))
+        .values_list("id", "units")
+    )
+    return sum(units.get(int(item_id), 1) * qty for item_id, qty in lines.items())
+
+
+def open_slots(units, now=None):
+    """Today's bookable slots that still fit ``units``, from the cached table."""
+    now = now or timezone.now()
+    earliest = now + lead_time()
+    return [
+        row for row in pickup_slots(timezone.localdate(now))
+        if row["starts_at"] >= earliest and row["free"] >= units
+    ]
+
+
+def book(slot_id, units, now=None):
+    """Take ``units`` of the slot's capacity or raise ``SlotFull``."""
+    earliest = (now or timezone.now()) + lead_time()
+    booked = PickupSlot.objects.filter(
+        pk=slot_id, starts_at__gte=earliest, booked__lte=F("capacity") - units
+    ).update(booked=F("booked") + units)
+    if not booked:
+        raise SlotFull(slot_id)
+    transaction.on_commit(bump_slots)
+
+
+def release(order):
+    """Give a cancelled order's units back to its slot."""
+    if not order.pickup_slot_id or not order.prep_units:
+        return
+    PickupSlot.objects.filter(pk=order.pickup_slot_id).update(
+        booked=Greatest(F("booked") - order.prep_units, 0)
+    )
+    transaction.on_commit(bump_slots)
+
+
+def by_slot(orders):
+    """
+    Kitchen order: open orders by pickup slot (unscheduled ones after, oldest
+    first), then everything else newest first.
+    """
+    is_open = Q(status__in=OPEN_STATUSES)
+    return orders.select_related("pickup_slot").order_by(
+        Case(When(is_open, then=Value(0)), default=Value(1)),
+        Case(When(is_open, then=F("pickup_slot__starts_at"))).asc(nulls_last=True),
+        Case(When(is_open, then=F("created_at"))).asc(nulls_last=True),
+        "-created_at",
+    )
@@ -0,0 +1,320 @@
+# my_canteen/stock.py
+"""
+Every stock change goes through here and lands in the ``StockMovement`` ledger.
+
+- ``take(lines)``     checkout: conditional decrements, raises ``OutOfStock``
+- ``give(lines)``     cancel / restock: increments
+- ``adjust(item, n)`` admin / stock-take: set an absolute level
+- ``levels(ids)``     current stock, summing shards for hot items
+- ``reserve(user, lines)`` / ``release(user)`` / ``sweep()``  checkout holds
+
+Normal items keep their stock in ``MenuItem.stock`` and are decremented with
+``UPDATE ... SET stock = stock - q WHERE stock >= q``, so there is no
+read-modify-write race. Hot items (``stock_shards > 0``) spread their stock
+over that many ``StockShard`` rows; a sale decrements one shard picked at
+random, so concurrent checkouts of the same item mostly lock different rows.
+Their ``MenuItem.stock`` is a display copy refreshed by ``rebalance`` (run by
+``manage.py compact_stock``). Row locks only matter on PostgreSQL; SQLite
+serialises all writers anyway.
+
+Opening checkout places ``StockReservation`` holds on the cart for
+``CANTEEN_RESERVATION_SECONDS``. Available stock is stock minus *other* users'
+unexpired holds: ``reserve`` and ``take`` both respect it, and ``take``
+converts the buyer's own holds. Holds are soft: they never touch the stock columns, so an
+abandoned checkout costs nothing once it expires.
+"""
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from .cache import bump_stock
+from .models import MenuItem, StockMovement, StockReservation, StockShard, StockSnapshot
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, "CANTEEN_RESERVATION_SECONDS", 600))
+
+
+class OutOfStock(Exception):
+    def __init__(self, name):
+        super().__init__(f"{name} is out of stock")
+        self.name = name
+
+
+def _movements(lines, kind, sign, order=None, user=None, note=""):
+    StockMovement.objects.bulk_create(
+        StockMovement(
+            item_id=item_id, kind=kind, quantity=sign * qty, order=order, user=user, note=note
+        )
+        for item_id, qty in lines.items()
+    )
+    transaction.on_commit(bump_stock)
+
+
+def _take_sharded(item, qty):
+    n = item.stock_shards
+    start = random.randrange(n)
+    for k in range(n):
+        slot = (start + k) % n
+        if StockShard.objects.filter(item_id=item.pk, slot=slot, quantity__gte=qty).update(
+            quantity=F("quantity") - qty
+        ):
+            return True
+    # no single shard holds enough: lock them all and take across shards
+    shards = list(StockShard.objects.select_for_update().filter(item_id=item.pk).order_by("slot"))
+    if sum(s.quantity for s in shards) < qty:
+        return False
+    for shard in shards:
+        part = min(shard.quantity, qty)
+        shard.quantity -= part
+        qty -= part
+    StockShard.objects.bulk_update(shards, ["quantity"])
+    return True
+
+
+def take(lines, order=None, user=None):
+    """
+    Remove ``{item_id: qty}`` from stock, or raise ``OutOfStock`` having taken
+    nothing (run inside ``transaction.atomic``). Other users' holds are left
+    alone; ``user``'s own holds on these items are converted.
+    """
+    lines = {int(item_id): qty for item_id, qty in lines.items()}
+    items = MenuItem.objects.only("id", "name", "stock_shards").in_bulk(lines)
+    others = held(lines, exclude_user=user)
+    now = timezone.now()
+    with transaction.atomic():
+        for item_id, qty in sorted(lines.items()):  # fixed order: no lock-order deadlocks
+            item = items.get(item_id)
+            if item is None:
+                raise OutOfStock(f"Item #{item_id}")
+            reserved = others.get(item_id, 0)
+            if item.stock_shards:
+                # shards cannot see the total, so check holds up front (they are soft anyway)
+                ok = (not reserved or levels([item_id])[item_id] - reserved >= qty) and _take_sharded(item, qty)
+            else:
+                ok = MenuItem.objects.filter(pk=item_id, stock__gte=qty + reserved).update(
+                    stock=F("stock") - qty, updated_at=now
+                )
+            if not ok:
+                raise OutOfStock(item.name)
+        if user is not None:
+            StockReservation.objects.filter(user=user, item_id__in=lines).delete()
+        _movements(lines, "sale", -1, order=order, user=user)
+
+
+def give(lines, kind="restock", order=None, user=None, note=""):
+    """Put ``{item_id: qty}`` back (``kind``: cancel / restock)."""
+    lines = {int(item_id): qty for item_id, qty in lines.items()}
+    sharded = dict(
+        MenuItem.objects.filter(id__in=lines, stock_shards__gt=0).values_list("id", "stock_shards")
+    )
+    now = timezone.now()
+    with transaction.atomic():
+        for item_id, qty in sorted(lines.items()):
+            if item_id in sharded:
+                StockShard.objects.filter(item_id=item_id, slot=random.randrange(sharded[item_id])).update(
+                    quantity=F("quantity") + qty
+                )
+            else:
+                MenuItem.objects.filter(pk=item_id).update(stock=F("stock") + qty, updated_at=now)
+        _movements(lines, kind, 1, order=order, user=user, note=note)
+
+
+def levels(item_ids):
+    """``{item_id: stock}``; one extra query when any of the items is sharded."""
+    rows = MenuItem.objects.filter(id__in=item_ids).values_list("id", "stock", "stock_shards")
+    result, sharded = {}, []
+    for item_id, stock, shards in rows:
+        result[item_id] = stock
+        if shards:
+            sharded.append(item_id)
+    if sharded:
+        sums = StockShard.objects.filter(item_id__in=sharded).values("item_id").annotate(total=Sum("quantity"))
+        result.update({row["item_id"]: row["total"] or 0 for row in sums})
+    return result
+
+
+# ---------- Checkout holds ----------
+def held(item_ids=None, exclude_user=None):
+    """``{item_id: quantity}`` under unexpired holds, optionally ignoring one user's."""
+    qs = StockReservation.objects.filter(expires_at__gt=timezone.now())
+    if item_ids is not None:
+        qs = qs.filter(item_id__in=item_ids)
+    if exclude_user is not None:
+        qs = qs.exclude(user=exclude_user)
+    return dict(qs.values("item_id").annotate(total=Sum("quantity")).values_list("item_id", "total"))
+
+
+def available(item_ids, user=None):
+    """``{item_id: stock}`` minus the holds of everyone but ``user``."""
+    holds = held(item_ids, exclude_user=user)
+    return {item_id: level - holds.get(item_id, 0) for item_id, level in levels(item_ids).items()}
+
+
+def availability_overrides():
+    """
+    Available stock for every item whose ``MenuItem.stock`` column does not
+    tell the whole story (held or sharded). Backs ``cache.available_stock``.
+    """
+    holds = held()
+    ids = set(holds).union(MenuItem.objects.filter(stock_shards__gt=0).values_list("id", flat=True))
+    if not ids:
+        return {}
+    return {item_id: max(level - holds.get(item_id, 0), 0) for item_id, level in levels(ids).items()}
+
+
+def sold_out():
+    """Ids of active items with nothing left to add to a cart. Backs ``cache.sold_out_items``."""
+    overrides = availability_overrides()
+    ids = set(
+        MenuItem.objects.filter(is_active=True, stock__lte=0)
+        .exclude(id__in=list(overrides))
+        .values_list("id", flat=True)
+    )
+    ids.update(item_id for item_id, level in overrides.items() if level <= 0)
+    return sorted(ids)
+
+
+def reserve(user, lines):
+    """
+    Replace ``user``'s holds with ``{item_id: qty}`` for ``reservation_ttl()``.
+    Raises ``OutOfStock`` when other users' holds leave too little. Returns the
+    expiry time.
+    """
+    lines = {int(item_id): qty for item_id, qty in lines.items()}
+    with transaction.atomic():
+        StockReservation.objects.filter(user=user).delete()
+        free = available(lines, user=user)
+        for item_id, qty in sorted(lines.items()):
+            if free.get(item_id, 0) < qty:
+                name = MenuItem.objects.filter(pk=item_id).values_list("name", flat=True).first()
+                raise OutOfStock(name or f"Item #{item_id}")
+        expires_at = timezone.now() + reservation_ttl()
+        StockReservation.objects.bulk_create(
+            StockReservation(user=user, item_id=item_id, quantity=qty, expires_at=expires_at)
+            for item_id, qty in lines.items()
+        )
+        transaction.on_commit(bump_stock)
+    return expires_at
+
+
+def release(user):
+    deleted, _ = StockReservation.objects.filter(user=user).delete()
+    if deleted:
+        transaction.on_commit(bump_stock)
+    return deleted
+
+
+def sweep():
+    """Drop expired holds; returns how many."""
+    deleted, _ = StockReservation.objects.filter(expires_at__lte=timezone.now()).delete()
+    if deleted:
+        transaction.on_commit(bump_stock)
+    return deleted
+
+
+# ---------- Adjustments & maintenance ----------
+def _spread(item, total, n, shards=None):
+    """Make the item's shards ``n`` rows that add up to ``total`` (rows updated in place when possible)."""
+    base, extra = divmod(total, n)
+    shards = list(StockShard.objects.filter(item=item)) if shards is None else shards
+    if sorted(s.slot for s in shards) == list(range(n)):
+        for shard in shards:
+            shard.quantity = base + (1 if shard.slot < extra else 0)
+        StockShard.objects.bulk_update(shards, ["quantity"])
+        return
+    StockShard.objects.filter(item=item).delete()
+    StockShard.objects.bulk_create(
+        StockShard(item=item, slot=slot, quantity=base + (1 if slot < extra else 0)) for slot in range(n)
+    )
+
+
+@transaction.atomic
+def adjust(item, level, user=None, note=""):
+    """Set an absolute stock level (stock-take, admin edit) and log the difference."""
+    item = MenuItem.objects.select_for_update().get(pk=item.pk)
+    current = levels([item.pk])[item.pk]
+    if level == current:
+        return 0
+    if item.stock_shards:
+        _spread(item, level, item.stock_shards)
+    MenuItem.objects.filter(pk=item.pk).update(stock=level, updated_at=timezone.now())
+    _movements({item.pk: level - current}, "adjustment", 1, user=user, note=note)
+    return level - current
+
+
+@transaction.atomic
+def set_shards(item, n):
+    """Turn sharding on (``n`` > 0), resize it, or fold it back into ``MenuItem.stock`` (0)."""
+    item = MenuItem.objects.select_for_update().get(pk=item.pk)
+    total = levels([item.pk])[item.pk]
+    if n:
+        _spread(item, total, n)
+    else:
+        StockShard.objects.filter(item=item).delete()
+    MenuItem.objects.filter(pk=item.pk).update(stock=total, stock_shards=n, updated_at=timezone.now())
+
+
+def rebalance():
+    """Even out hot items' shards and refresh their ``MenuItem.stock`` copy. Returns the item count."""
+    count = 0
+    for item in MenuItem.objects.filter(stock_shards__gt=0).only("id", "stock", "stock_shards"):
+        with transaction.atomic():
+            shards = list(StockShard.objects.select_for_update().filter(item=item))
+            total = sum(s.quantity for s in shards)
+            _spread(item, total, item.stock_shards, shards)
+            if total != item.stock:
+                MenuItem.objects.filter(pk=item.pk).update(stock=total, updated_at=timezone.now())
+        count += 1
+    return count
+
+
+@transaction.atomic
+def compact(before):
+    """
+    Fold ledger rows created before ``before`` into per-item ``StockSnapshot``
+    rows and delete them. Returns the number of rows folded.
+    """
+    cutoff = StockMovement.objects.filter(created_at__lt=before).aggregate(last=Max("id"))["last"]
+    if cutoff is None:
+        return 0
+    folded = (
+        StockMovement.objects.filter(id__lte=cutoff)
+        .values("item_id").annotate(total=Sum("quantity"), rows=Max("id"), n=Count("id"))
+    )
+    snapshots = StockSnapshot.objects.in_bulk([row["item_id"] for row in folded])
+    touched, created = [], []
+    for row in folded:
+        snap = snapshots.get(row["item_id"])
+        if snap is None:
+            snap = StockSnapshot(item_id=row["item_id"])
+            created.append(snap)
+        else:
+            touched.append(snap)
+        snap.quantity += row["total"]
+        snap.through_id = row["rows"]
+        snap.folded += row["n"]
+    StockSnapshot.objects.bulk_create(created)
+    StockSnapshot.objects.bulk_update(touched, ["quantity", "through_id", "folded"])
+    deleted, _ = StockMovement.objects.filter(id__lte=cutoff).delete()
+    return deleted
+
+
+def ledger_drift():
+    """Items whose snapshot + ledger no longer adds up to their stock: ``{id: (ledger, stock)}``."""
+    net = defaultdict(int)
+    for item_id, qty in StockSnapshot.objects.values_list("item_id", "quantity"):
+        net[item_id] += qty
+    for row in StockMovement.objects.values("item_id").annotate(total=Sum("quantity")):
+        net[row["item_id"]] += row["total"]
+    stock = levels(MenuItem.objects.values_list("id", flat=True))
+    return {
+        item_id: (net.get(item_id, 0), level)
+        for item_id, level in stock.items()
+        if net.get(item_id, 0) != level
+    }
@@ -1,3 +1,921 @@
-from django.test import TestCase
+import gc
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from mysite import database
+
+from . import (
+    admission, archive, catalog_io, catalog_sync, eta, forecast, metrics, popularity, prerender, profiling, querylog,
+    routers, search, sla, slots, stock, views,
+)
+from .cache import bump_catalog, catalog_version, tiered
+from .models import (
+    ArchivedOrderItem, ArchivedPayment, Category, DemandForecast, ItemPopularity, KitchenSla, MenuItem, Order, OrderEvent,
+    OrderItem, Payment, PickupSlot, Review, StockMovement, StockReservation, UserProfile,
+)
+from .paginators import EstimatedCountPaginator
+
+
+def seed_orders(count, start=0):
+    category = Category.objects.get_or_create(name="Snacks")[0]
+    for i in range(start, start + count):
+        user = User.objects.create_user(f"user{i}", password="x", email=f"user{i}@example.com")
+        item = MenuItem.objects.create(name=f"Item {i}", price=10, stock=5, category=category)
+        order = Order.objects.create(user=user, total_price=20, address="Default Address")
+        OrderItem.objects.create(order=order, item=item, quantity=2, unit_price=10)
+        Payment.objects.create(order=order, method="cash", amount=20, status="paid")
+        Review.objects.create(user=user, item=item, rating=4, comment="ok")
+
+
+FAST_HASHER = override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+LOCMEM_CACHE = override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+
+
+@LOCMEM_CACHE
+class CanteenTestCase(TestCase):
+    """Each test starts from an empty private cache, so nothing leaks between tests or into ``.cache``."""
+
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+        tiered.local.clear()
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_sqlite_profile_is_tuned_for_concurrent_writers(self):
+        with mock.patch.dict("os.environ", {"CANTEEN_SQLITE_BUSY_TIMEOUT_MS": "2500"}, clear=True):
+            db = database.database_from_env(Path("/srv/canteen"))
+        self.assertEqual(db["NAME"], Path("/srv/canteen/db.sqlite3"))
+        self.assertEqual(db["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(db["OPTIONS"]["timeout"], 2.5)
+        self.assertIn("PRAGMA journal_mode=WAL", db["OPTIONS"]["init_command"])
+        self.assertIn("PRAGMA busy_timeout=2500", db["OPTIONS"]["init_command"])
+
+        with mock.patch.dict("os.environ", {"CANTEEN_SQLITE_TUNING": "off"}, clear=True):
+            self.assertEqual(database.database_from_env(Path("/srv"))["OPTIONS"], {})
+
+    def test_postgres_profile_uses_the_pool_and_mirrors_replicas(self):
+        env = {"CANTEEN_DB_ENGINE": "postgres", "CANTEEN_PG_POOL_MAX": "8", "CANTEEN_PG_REPLICA_HOSTS": "r1, r2"}
+        with mock.patch.dict("os.environ", env, clear=True), mock.patch.object(database, "find_spec"):
+            primary = database.database_from_env(Path("/srv"))
+            replicas = database.replica_databases(primary)
+        self.assertEqual(primary["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(primary["CONN_MAX_AGE"], 0)  # the pool owns connection lifetime
+        self.assertEqual(primary["OPTIONS"]["pool"]["max_size"], 8)
+        self.assertEqual(sorted(replicas), ["replica1", "replica2"])
+        self.assertEqual(replicas["replica2"]["HOST"], "r2")
+        self.assertEqual(replicas["replica1"]["TEST"], {"MIRROR": "default"})
+
+    def test_postgres_profile_names_the_missing_driver(self):
+        installed = {"psycopg"}
+        with (
+            mock.patch.dict("os.environ", {"CANTEEN_DB_ENGINE": "postgres"}, clear=True),
+            mock.patch.object(database, "find_spec", side_effect=lambda name: name in installed or None),
+        ):
+            with self.assertRaisesMessage(ImproperlyConfigured, "psycopg[binary,pool]"):
+                database.database_from_env(Path("/srv"))
+            with mock.patch.dict("os.environ", {"CANTEEN_PG_POOL": "0"}):
+                self.assertEqual(database.database_from_env(Path("/srv"))["OPTIONS"], {})
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("my_canteen.routers.replica_aliases", return_value=["replica1"])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.PrimaryReplicaRouter()
+
+    def test_reads_go_to_replicas_unless_pinned(self):
+        self.assertEqual(self.router.db_for_read(MenuItem), "replica1")
+        self.assertEqual(self.router.db_for_read(User), "default")  # auth never reads stale
+        self.assertEqual(self.router.db_for_write(MenuItem), "default")
+        with routers.use_primary():
+            self.assertEqual(self.router.db_for_read(MenuItem), "default")
+
+    def test_a_write_pins_the_browser_to_the_primary(self):
+        from .middleware import ReplicaPinningMiddleware
+
+        seen = []
+
+        def view(request):
+            seen.append(routers.primary_forced())
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        factory = RequestFactory()
+        with mock.patch("my_canteen.middleware.replica_aliases", return_value=["replica1"]):
+            response = middleware(factory.post("/cart/"))
+            pin = response.cookies[ReplicaPinningMiddleware.cookie_name].value
+            middleware(factory.get("/orders/", HTTP_COOKIE=f"{ReplicaPinningMiddleware.cookie_name}={pin}"))
+            middleware(factory.get("/orders/"))
+        self.assertEqual(seen, [True, True, False])
+
+
+class TieredCacheTests(CanteenTestCase):
+    def test_read_through_computes_once_per_version(self):
+        calls = []
+
+        def produce():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(tiered.get_or_set("catalog", ("t",), produce), 1)
+        tiered.local.clear()  # another process: served from the shared tier
+        self.assertEqual(tiered.get_or_set("catalog", ("t",), produce), 1)
+        tiered.bump("catalog")
+        self.assertEqual(tiered.get_or_set("catalog", ("t",), produce), 2)
+        stats = tiered.stats()
+        self.assertGreaterEqual(stats["shared_hits"], 1)
+        self.assertGreaterEqual(stats["misses"], 2)
+
+    def test_catalog_version_moves_only_after_commit(self):
+        before = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Drinks")
+            self.assertEqual(catalog_version(), before)
+        self.assertGreater(catalog_version(), before)
+
+
+@FAST_HASHER
+class NavbarFragmentTests(CanteenTestCase):
+    def test_cart_pill_is_per_session_even_with_the_same_cart_version(self):
+        user = User.objects.create_user("stu", password="x")
+        clients = [self.client, self.client_class()]
+        for client, cart in zip(clients, ({"1": 1}, {"1": 1, "2": 1})):  # no stored count: summed on the fly
+            client.force_login(user)
+            session = client.session
+            session.update({"cart": cart, "cart_version": 1})
+            session.save()
+        self.assertContains(clients[0].get("/"), '<span class="pill">1</span>', html=True)
+        self.assertContains(clients[1].get("/"), '<span class="pill">2</span>', html=True)
+
+        user.username = "student"
+        user.save()
+        self.assertContains(clients[0].get("/"), "Hi, student")
+
+        session = clients[0].session
+        session.update({"cart": {"1": 2, "2": 1}, "cart_count": 3})
+        session.save()
+        self.assertContains(clients[0].get("/"), '<span class="pill">3</span>', html=True)
+
+
+@FAST_HASHER
+class ConditionalGetTests(CanteenTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name="Snacks")
+        MenuItem.objects.create(name="Samosa", price=10, stock=5, category=category)
+        self.user = User.objects.create_user("stu", password="x")
+
+    def test_menu_revalidates_until_the_catalog_moves(self):
+        self.client.force_login(self.user)
+        first = self.client.get("/menu/")
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+        self.assertEqual(self.client.get("/menu/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        bump_catalog()
+        again = self.client.get("/menu/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again["ETag"], etag)
+
+    def test_order_status_needs_a_login_and_answers_304_when_unchanged(self):
+        order = Order.objects.create(user=self.user, total_price=10, address="Hall 2")
+        Payment.objects.create(order=order, method="cash", amount=10, status="pending")
+        url = reverse("order_status_api", args=[order.id])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.user)
+        first = self.client.get(url)
+        self.assertEqual(first.json()["payment_status"], "pending")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+
+class PrerenderedMenuTests(CanteenTestCase):
+    def test_stock_changes_keep_the_published_pages_and_show_up_in_menu_stock(self):
+        category = Category.objects.create(name="Snacks")
+        samosa = MenuItem.objects.create(name="Samosa", price=10, stock=1, category=category)
+        with tempfile.TemporaryDirectory() as directory, self.settings(
+            PRERENDER_ROOT=directory, PRERENDER_AUTO_PUBLISH=False
+        ):
+            prerender.publish()
+            version = catalog_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                stock.take({samosa.id: 1})
+                catalog_sync.record_bulk([samosa.id], stock_only=True)
+
+            self.assertEqual(catalog_version(), version)
+            self.assertTrue(self.client.get("/menu/").has_header("X-Prerendered"))
+            self.assertEqual(self.client.get("/menu/stock/").json(), {"sold_out": [samosa.id]})
+
+            with self.captureOnCommitCallbacks(execute=True):
+                samosa.name = "Veg Samosa"
+                samosa.save()
+            self.assertNotEqual(catalog_version(), version)
+            self.assertFalse(self.client.get("/menu/").has_header("X-Prerendered"))
+
+    def test_flush_publishes_a_queued_change_without_waiting_out_the_debounce(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(
+            PRERENDER_ROOT=directory, PRERENDER_DEBOUNCE_SECONDS=60
+        ):
+            (Path(directory) / prerender.MANIFEST).write_text("{}")
+            manifest = {"catalog_version": catalog_version()}
+            with mock.patch.object(prerender, "publish", return_value=manifest) as publish:
+                prerender.schedule_publish()
+                started = time.monotonic()
+                prerender.flush()  # what atexit does when a management command ends
+            self.assertLess(time.monotonic() - started, 10)
+            publish.assert_called_once_with()
+
+
+class SuggestIndexTests(CanteenTestCase):
+    def test_prefix_phonetic_and_typo_matches(self):
+        index = search.SuggestIndex([
+            (1, "Fuchka", "Street Food", 30), (2, "Chicken Roll", "Snacks", 60), (3, "Egg Roll", "Snacks", 40),
+        ])
+        ids = lambda q: [r["id"] for r in index.suggest(q)]
+        self.assertEqual(ids("fuc"), [1])
+        self.assertEqual(ids("phuchka"), [1])       # romanised spelling, same skeleton
+        self.assertEqual(ids("chiken"), [2])        # one edit away
+        self.assertEqual(ids("egg ro"), [3])        # earlier words filter the last one
+        self.assertEqual(ids("pizza"), [])
+
+    def test_view_rebuilds_after_a_rename(self):
+        category = Category.objects.create(name="Snacks")
+        item = MenuItem.objects.create(name="Singara", price=15, stock=5, category=category)
+        with self.captureOnCommitCallbacks(execute=True):
+            search.bump_search_index()
+        self.assertEqual(self.client.get("/menu/suggest/", {"q": "shing"}).json()["results"][0]["id"], item.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.name = "Samosa"
+            item.save()
+        self.assertEqual(self.client.get("/menu/suggest/", {"q": "sing"}).json()["results"], [])
+
+
+class CatalogDeltaSyncTests(CanteenTestCase):
+    def changes(self, since):
+        return self.client.get("/api/catalog/changes/", {"since": since}).json()
+
+    def test_cursor_returns_only_the_net_effect_since_it(self):
+        category = Category.objects.create(name="Snacks")
+        item = MenuItem.objects.create(name="Samosa", price=10, stock=5, category=category)
+        snapshot = self.client.get("/api/catalog/").json()
+        self.assertEqual([row["id"] for row in snapshot["items"]], [item.id])
+        cursor = snapshot["version"]
+        self.assertEqual(self.changes(cursor), {"version": cursor, "more": False})
+
+        item.stock = 3
+        item.save(update_fields=["stock", "updated_at"])
+        delta = self.changes(cursor)
+        self.assertEqual(delta["stock"], [[item.id, 3]])
+        self.assertNotIn("items", delta)
+
+        # a later full edit supersedes the stock-only row
+        item.price = 12
+        item.save()
+        delta = self.changes(cursor)
+        self.assertEqual([row["price"] for row in delta["items"]], ["12.00"])
+        self.assertNotIn("stock", delta)
+
+        cursor, item_id = delta["version"], item.id
+        item.delete()
+        self.assertEqual(self.changes(cursor)["deleted"], {"item": [item_id]})
+        self.assertEqual(self.client.get("/api/catalog/changes/", {"since": "x"}).status_code, 400)
+
+
+class PopularityTests(CanteenTestCase):
+    def test_ranking_follows_sales_with_the_manual_flag_first(self):
+        category = Category.objects.create(name="Snacks")
+        tea, roll, egg, cake = (
+            MenuItem.objects.create(name=name, price=10, stock=50, category=category)
+            for name in ("Tea", "Roll", "Egg", "Cake")
+        )
+        MenuItem.objects.filter(pk=cake.pk).update(is_popular=True)
+        popularity.record_sale({roll.id: 3})
+        popularity.record_sale({roll.id: 1, tea.id: 1})
+
+        ranked = list(popularity.ranked(MenuItem.objects.all()).values_list("name", flat=True))
+        self.assertEqual(ranked, ["Cake", "Roll", "Tea", "Egg"])
+        self.assertAlmostEqual(ItemPopularity.objects.get(item=roll).hour_score, 4, places=3)
+
+        popularity.decay_all(at=timezone.now() + timedelta(hours=1))
+        row = ItemPopularity.objects.get(item=roll)
+        self.assertLess(row.hour_score, row.day_score)
+
+    def test_hourly_decay_keeps_the_pre_rendered_pages_served(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(
+            PRERENDER_ROOT=directory, PRERENDER_DEBOUNCE_SECONDS=60
+        ):
+            prerender.publish()
+            call_command("rebuild_popularity", decay=True, stdout=io.StringIO())
+            prerender.flush()  # atexit, when the cron's manage.py ends
+            self.assertEqual(prerender.load_manifest()["catalog_version"], catalog_version())
+            self.assertTrue(self.client.get("/menu/").has_header("X-Prerendered"))
+
+
+class DemandForecastTests(CanteenTestCase):
+    def test_steady_lunchtime_sales_forecast_the_same_again(self):
+        category = Category.objects.create(name="Snacks")
+        item = MenuItem.objects.create(name="Khichuri", price=60, stock=500, category=category)
+        user = User.objects.create_user("stu")
+        today = timezone.localdate()
+        for days_ago in range(1, 29):
+            order = Order.objects.create(user=user, total_price=240, address="Hall 2")
+            OrderItem.objects.create(order=order, item=item, quantity=4, unit_price=60)
+            noon = timezone.make_aware(datetime.combine(today - timedelta(days=days_ago), dt_time(12, 5)))
+            Order.objects.filter(pk=order.pk).update(created_at=noon)
+
+        self.assertEqual(forecast.run(history_days=28), 1)
+        row = DemandForecast.objects.get(item=item, date=today + timedelta(days=1))
+        self.assertAlmostEqual(float(row.total), 4, places=2)
+        self.assertEqual(row.prep, 5)          # 15% safety buffer, rounded up
+        self.assertEqual(row.peak_slot, 48)    # 12:00-12:15
+
+
+@FAST_HASHER
+class DataExportTests(CanteenTestCase):
+    def test_exports_stream_filtered_rows_to_staff_only(self):
+        seed_orders(3)
+        Order.objects.filter(pk=Order.objects.order_by("pk").first().pk).update(status="cancelled")
+        staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.client.force_login(User.objects.get(username="user0"))
+        self.assertEqual(self.client.get("/exports/orders/").status_code, 403)
+
+        self.client.force_login(staff)
+        response = self.client.get("/exports/orders/", {"format": "jsonl", "status": "pending"})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row["user__username"] for row in rows], ["user1", "user2"])
+
+        lines = b"".join(self.client.get("/exports/order_items/").streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "order_id", "order__created_at"])
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(self.client.get("/exports/orders/", {"format": "xml"}).status_code, 400)
+
+    def test_command_streams_to_its_stdout(self):
+        seed_orders(2)
+        out = io.StringIO()
+        call_command("export_data", "orders", "--format", "jsonl", stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row["user__username"] for row in rows], ["user0", "user1"])
+
+
+@FAST_HASHER
+class AdminChangelistQueryTests(CanteenTestCase):
+    """Changelist query counts must not grow with the number of rows on the page."""
+
+    CHANGELISTS = {
+        "admin:my_canteen_order_changelist": 7,
+        "admin:my_canteen_orderitem_changelist": 7,
+        "admin:my_canteen_payment_changelist": 7,
+        "admin:my_canteen_review_changelist": 7,
+        "admin:my_canteen_userprofile_changelist": 5,  # no date_hierarchy
+        "admin:my_canteen_menuitem_changelist": 6,     # small table: keeps the full count
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser("root", "root@example.com", "x")
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, name, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_counts_are_pinned(self):
+        seed_orders(3)
+        few = {name: self.changelist_queries(name) for name in self.CHANGELISTS}
+        seed_orders(20, start=3)
+        for name, expected in self.CHANGELISTS.items():
+            with self.subTest(changelist=name):
+                self.assertEqual(self.changelist_queries(name), few[name])
+                self.assertEqual(few[name], expected)
+
+    def test_prefix_and_id_search(self):
+        seed_orders(3)
+        order = Order.objects.first()
+        response = self.client.get(reverse("admin:my_canteen_order_changelist"), {"q": "user1"})
+        self.assertContains(response, "user1")
+        self.assertNotContains(response, "user0")
+        response = self.client.get(reverse("admin:my_canteen_order_changelist"), {"q": str(order.id)})
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+    def test_reviews_are_searchable_by_comment(self):
+        seed_orders(2)
+        Review.objects.filter(user__username="user1").update(comment="Too salty today")
+        response = self.client.get(reverse("admin:my_canteen_review_changelist"), {"q": "salty"})
+        self.assertEqual([r.user.username for r in response.context["cl"].result_list], ["user1"])
+
+    def test_date_hierarchy_drilldown(self):
+        seed_orders(2)
+        created = Order.objects.first().created_at
+        params = {"created_at__year": created.year, "created_at__month": created.month}
+        self.assertEqual(self.changelist_queries("admin:my_canteen_order_changelist", **params), 5)
+
+
+@FAST_HASHER
+class EstimatedCountPaginatorTests(CanteenTestCase):
+    def test_uses_statistics_for_unfiltered_large_tables(self):
+        seed_orders(4)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        with mock.patch("my_canteen.paginators.ESTIMATE_THRESHOLD", 1):
+            paginator = EstimatedCountPaginator(Order.objects.order_by("id"), 2)
+            with self.assertNumQueries(1):
+                self.assertEqual(paginator.count, 4)
+
+            filtered = EstimatedCountPaginator(Order.objects.filter(user__username="user1").order_by("id"), 2)
+            self.assertEqual(filtered.count, 1)
+
+    def test_falls_back_to_exact_count_below_threshold(self):
+        seed_orders(2)
+        self.assertEqual(EstimatedCountPaginator(UserProfile.objects.order_by("id"), 10).count, 2)
+
+
+class CatalogImportTests(CanteenTestCase):
+    def setUp(self):
+        super().setUp()
+        snacks = Category.objects.create(name="Snacks")
+        MenuItem.objects.create(name="Fuchka", price=40, stock=5, category=snacks)
+        MenuItem.objects.create(name="Tea", price=10, stock=5)
+
+    def test_import_is_set_based(self):
+        text = "name,category,price,stock\nfuchka,Snacks,45,60\nSingara,Street Food,15,\n"
+        # 2 reads, category insert + log, category re-read, item insert, one update per
+        # changed field set, one deactivation update, one item log insert, savepoint pair,
+        # plus stock.adjust per stock change (savepoint pair, lock, level, update, ledger row)
+        with self.assertNumQueries(11 + 6):
+            result, errors = catalog_io.import_catalog(text, "csv", deactivate_missing=True)
+        self.assertEqual(errors, [])
+        self.assertEqual(result.summary(), "1 new, 1 updated, 1 deactivated, 1 new categories")
+        fuchka = MenuItem.objects.get(name="fuchka")
+        self.assertEqual((fuchka.price, fuchka.stock), (45, 60))
+        self.assertEqual(MenuItem.objects.get(name="Singara").category.name, "Street Food")
+        self.assertFalse(MenuItem.objects.get(name="Tea").is_active)
+        self.assertEqual(
+            list(StockMovement.objects.filter(kind="adjustment").values_list("item__name", "quantity")),
+            [("fuchka", 55)],
+        )
+
+    def test_stock_takes_apply_against_the_live_level(self):
+        rows, _ = catalog_io.parse([{"name": "Tea", "stock": "8"}])
+        result, _ = catalog_io.plan(rows)
+        stock.take({MenuItem.objects.get(name="Tea").id: 2})  # a checkout between plan and apply
+        catalog_io.apply(result)
+        self.assertEqual(MenuItem.objects.get(name="Tea").stock, 8)
+        self.assertEqual(
+            list(StockMovement.objects.filter(note="catalog import").values_list("kind", "quantity")),
+            [("adjustment", 5)],
+        )
+
+    def test_invalid_rows_apply_nothing(self):
+        text = "name,price,stock\nFuchka,50,\nSamosa,abc,3\n"
+        result, errors = catalog_io.import_catalog(text, "csv")
+        self.assertEqual(errors, ["line 3: price is not a number: abc"])
+        self.assertEqual(MenuItem.objects.get(name="Fuchka").price, 40)
+
+
+class StockLedgerTests(CanteenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tea = MenuItem.objects.create(name="Tea", price=10, stock=10)
+        self.fuchka = MenuItem.objects.create(name="Fuchka", price=40, stock=7)
+
+    def test_sharded_take_spans_shards_and_ledger_adds_up(self):
+        stock.set_shards(self.tea, 4)
+        stock.take({self.tea.pk: 9, self.fuchka.pk: 2})
+        self.assertEqual(stock.levels([self.tea.pk, self.fuchka.pk]), {self.tea.pk: 1, self.fuchka.pk: 5})
+        self.assertEqual(stock.ledger_drift(), {})
+
+    def test_out_of_stock_takes_nothing(self):
+        with self.assertRaises(stock.OutOfStock):
+            stock.take({self.fuchka.pk: 1, self.tea.pk: 11})
+        self.assertEqual(stock.levels([self.tea.pk, self.fuchka.pk]), {self.tea.pk: 10, self.fuchka.pk: 7})
+        self.assertFalse(StockMovement.objects.filter(kind="sale").exists())
+
+    def test_holds_reduce_availability_until_converted(self):
+        alice, bob = User.objects.create_user("alice"), User.objects.create_user("bob")
+        stock.reserve(alice, {self.fuchka.pk: 5})
+        self.assertEqual(stock.available([self.fuchka.pk], user=bob), {self.fuchka.pk: 2})
+        with self.assertRaises(stock.OutOfStock):
+            stock.take({self.fuchka.pk: 3}, user=bob)
+        stock.take({self.fuchka.pk: 5}, user=alice)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(stock.levels([self.fuchka.pk]), {self.fuchka.pk: 2})
+
+    def test_another_users_hold_revalidates_the_menu(self):
+        alice, bob = User.objects.create_user("alice"), User.objects.create_user("bob")
+        self.client.force_login(bob)
+        etag = self.client.get("/menu/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.reserve(alice, {self.fuchka.pk: 7})
+
+        response = self.client.get("/menu/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<p class="out-of-stock" data-sold-out>Out of Stock</p>')
+        self.assertEqual(self.client.get("/menu/stock/").json(), {"sold_out": [self.fuchka.pk]})
+
+
+class PickupSlotTests(CanteenTestCase):
+    def test_capacity_is_counted_in_prep_units(self):
+        grill = Category.objects.create(name="Grill", prep_units=3)
+        kebab = MenuItem.objects.create(name="Kebab", price=80, category=grill)
+        tea = MenuItem.objects.create(name="Tea", price=10, prep_units=0)
+        self.assertEqual(slots.units_for({str(kebab.pk): 2, str(tea.pk): 4}), 6)
+
+        slot = PickupSlot.objects.create(starts_at=timezone.now() + timedelta(hours=1), capacity=8)
+        slots.book(slot.pk, 6)
+        with self.assertRaises(slots.SlotFull):
+            slots.book(slot.pk, 3)
+        slot.refresh_from_db()
+        self.assertEqual((slot.booked, slot.free), (6, 2))
+
+    def test_opening_hours_and_capacity_follow_settings(self):
+        day = timezone.localdate() + timedelta(days=1)
+        with self.settings(CANTEEN_PICKUP_HOURS=(9, 10), CANTEEN_SLOT_MINUTES=15, CANTEEN_SLOT_CAPACITY=12):
+            rows = slots.slot_rows(day)
+        self.assertEqual(
+            [(row["starts_at"].strftime("%H:%M"), row["free"]) for row in rows],
+            [("09:00", 12), ("09:15", 12), ("09:30", 12), ("09:45", 12)],
+        )
+
+
+@FAST_HASHER
+class OrderArchiveTests(CanteenTestCase):
+    def test_archive_tables_keep_the_live_shape(self):
+        for live, cold, _ in archive.TABLES:
+            with self.subTest(model=live.__name__):
+                live_columns = {f.attname for f in live._meta.concrete_fields}
+                self.assertLessEqual(live_columns, {f.attname for f in cold._meta.concrete_fields})
+
+    def test_old_final_orders_move_in_batches(self):
+        seed_orders(3)
+        Order.objects.filter(id__in=Order.objects.order_by("id").values("id")[:2]).update(status="completed")
+        Order.objects.update(created_at=timezone.now() - timedelta(days=400))
+        old_order = Order.objects.filter(status="completed").order_by("id").first()
+        sale = StockMovement.objects.create(
+            item=old_order.orderitem_set.get().item, kind="sale", quantity=-2, order=old_order
+        )
+
+        self.assertEqual(archive.archive_batch(archive.cutoff(), batch_size=1), 1)
+        self.assertEqual(archive.archive_batch(archive.cutoff(), batch_size=1), 1)
+        self.assertEqual(archive.archive_batch(archive.cutoff(), batch_size=1), 0)  # the pending one stays
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual((ArchivedOrderItem.objects.count(), ArchivedPayment.objects.count()), (2, 2))
+        history = list(Order.history.for_user(old_order.user, archived=True))
+        self.assertEqual([o.id for o in history], [old_order.id])
+        self.assertEqual(history[0].payment.amount, 20)
+        self.assertEqual(history[0].orderitem_set.get().quantity, 2)
+        sale.refresh_from_db()
+        self.assertEqual(sale.order_id, old_order.id)  # the ledger still points at the archived order
+
+
+@FAST_HASHER
+class OrderListQueryTests(CanteenTestCase):
+    """Order lists render from the denormalised columns: one orders query per page."""
+
+    def setUp(self):
+        super().setUp()
+        self.vendor = User.objects.create_user("ven", password="x")
+        profile = self.vendor.userprofile
+        profile.role = "vendor"
+        profile.save()
+        self.client.force_login(self.vendor)
+
+    def queries(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        seed_orders(2)
+        out = io.StringIO()
+        call_command("backfill_order_summaries", stdout=out)
+        self.assertIn("Order: 2 order(s) summarised.", out.getvalue())
+        few = {path: self.queries(path) for path in ("/orders/", "/dashboard/")}
+        seed_orders(10, start=2)
+        out = io.StringIO()
+        call_command("backfill_order_summaries", stdout=out)
+        self.assertIn("Order: 10 order(s) summarised.", out.getvalue())  # only the new, empty rows
+        self.assertIn("ArchivedOrder: 0 order(s) summarised.", out.getvalue())
+        for path, count in few.items():
+            with self.subTest(path=path):
+                self.assertEqual(self.queries(path), count)
+        self.assertContains(self.client.get("/orders/"), "2× Item 11")
+
+    def test_refresh_summary_follows_the_owner_and_moves_the_version(self):
+        seed_orders(1)
+        order = Order.objects.get()
+        version, updated_at = order.version, order.updated_at
+        Order.objects.filter(pk=order.pk).update(user=User.objects.create_user("renamed"))  # reassigned
+        order.refresh_from_db()
+        OrderItem.objects.create(order=order, item=MenuItem.objects.get(), quantity=1, unit_price=10)
+        order.refresh_summary()
+
+        row = Order.objects.get(pk=order.pk)
+        self.assertEqual((row.customer_name, row.item_count, row.items_summary), ("renamed", 3, "2× Item 0, 1× Item 0"))
+        self.assertEqual((row.version, order.version), (version + 1, version + 1))
+        self.assertGreater(row.updated_at, updated_at)
+
+        # an admin line delete goes through the same path
+        admin_user = User.objects.create_superuser("root", "root@example.com", "x")
+        self.client.force_login(admin_user)
+        line = OrderItem.objects.filter(order=order).last()
+        self.client.post(reverse("admin:my_canteen_orderitem_delete", args=[line.pk]), {"post": "yes"})
+        row = Order.objects.get(pk=order.pk)
+        self.assertEqual((row.item_count, row.version), (2, version + 2))
+
+
+@FAST_HASHER
+class KitchenSlaTests(CanteenTestCase):
+    def test_transitions_fold_into_hourly_percentiles(self):
+        seed_orders(1)
+        order, cook = Order.objects.get(), User.objects.create_user("cook")
+        placed = timezone.now()
+        Order.objects.filter(pk=order.pk).update(created_at=placed - timedelta(minutes=10))
+        order.refresh_from_db()
+        with mock.patch("django.utils.timezone.now", return_value=placed - timedelta(minutes=8)):
+            sla.transition(order, "preparing", cook)
+        sla.transition(order, "ready", cook)
+        sla.transition(order, "ready", cook)  # no-op: no event, nothing counted twice
+
+        self.assertEqual(
+            list(OrderEvent.objects.order_by("id").values_list("from_status", "to_status")),
+            [("pending", "preparing"), ("preparing", "ready")],
+        )
+        self.assertEqual(KitchenSla.objects.filter(scope="all").count(), 3)
+        with self.assertNumQueries(1):
+            today = sla.summary(since=placed - timedelta(hours=2))  # hourly buckets: cover the previous hour too
+        self.assertAlmostEqual(today["all"]["queue"].p50, 2, delta=0.5)
+        self.assertAlmostEqual(today["all"]["prep"].p50, 8, delta=1)
+        self.assertEqual([g["label"] for g in today["staff"]], ["cook"])
+        self.assertEqual(today["item"][0]["ready"].count, 1)
+
+
+@FAST_HASHER
+class ReadyEstimateTests(CanteenTestCase):
+    def test_queue_ahead_delays_the_estimate(self):
+        seed_orders(3)
+        first, second, third = Order.objects.order_by("created_at", "id")
+        Order.objects.filter(pk=first.pk).update(status="preparing", updated_at=timezone.now())
+        per_item = {line.item_id: 600.0 for line in OrderItem.objects.all()}
+        lines = OrderItem.objects.values_list(
+            "order_id", "order__status", "order__created_at", "order__updated_at", "item_id"
+        )
+        model = eta.QueueModel(list(lines), per_item, None, timezone.now())
+        self.assertAlmostEqual(model.ready_in[first.pk], 600, delta=5)
+        self.assertGreater(model.ready_in[second.pk], 600)
+        self.assertGreater(model.ready_in[third.pk], model.ready_in[second.pk])
+
+        # the station count is read per build: one station drains the queue ahead at full length
+        with self.settings(CANTEEN_KITCHEN_PARALLEL=1):
+            single = eta.QueueModel(list(lines), per_item, None, timezone.now())
+        self.assertAlmostEqual(single.ready_in[second.pk], 1200, delta=5)
+
+    def test_api_returns_estimate_and_retry_after(self):
+        seed_orders(1)
+        order = Order.objects.get()
+        self.client.force_login(order.user)
+        with mock.patch.object(eta, "_model", None):
+            data = self.client.get(f"/orders/{order.pk}/status/").json()
+        self.assertIsNotNone(data["estimated_ready_at"])
+        self.assertEqual(data["retry_after"], eta.RETRY_MAX)  # default prep: 8 minutes away
+        sla.transition(order, "completed")
+        data = self.client.get(f"/orders/{order.pk}/status/").json()
+        self.assertEqual((data["estimated_ready_at"], data["retry_after"]), (None, None))
+
+
+@FAST_HASHER
+class AdmissionControlTests(CanteenTestCase):
+    def setUp(self):
+        super().setUp()
+        gate = admission.Gate("checkout", concurrency=1, rate=100, burst=100, queue=True)
+        patcher = mock.patch.dict(admission.GATES, {"checkout": gate})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.gate = gate
+        self.student = User.objects.create_user("stu", password="x")
+        self.client.force_login(self.student)
+
+    def tearDown(self):
+        admission._cache().clear()
+
+    def test_full_checkout_waits_in_line_and_lifecycle_passes(self):
+        lease = admission.acquire(self.gate)
+        response = self.client.get("/checkout/")
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, "my_canteen/waiting_room.html")
+        self.assertEqual(admission.stats()["checkout"]["queue_depth"], 1)
+
+        seed_orders(1)
+        vendor = User.objects.create_user("ven", password="x")
+        profile = vendor.userprofile
+        profile.role = "vendor"
+        profile.save()
+        staff = self.client_class()
+        staff.force_login(vendor)
+        order = Order.objects.get()
+        self.assertEqual(staff.post(f"/orders/{order.pk}/accept/").status_code, 302)
+
+        admission.release(lease)
+        response = self.client.get("/checkout/")  # the ticket cookie gets its turn
+        self.assertNotEqual(response.status_code, 503)
+        self.assertEqual(admission.stats()["checkout"], {
+            "in_use": 0, "concurrency": 1, "queue_depth": 0, "shed_rate": 0, "shed_busy": 0, "queued": 1,
+        })
+        self.assertTrue(response.cookies["canteen_wr_pass"].value)
+
+        # the admitted page's POST goes straight through, even with others now waiting
+        other = self.client_class()
+        other.force_login(User.objects.create_user("stu2"))
+        lease = admission.acquire(self.gate)
+        self.assertEqual(other.get("/checkout/").status_code, 503)
+        admission.release(lease)
+        response = self.client.post("/checkout/", {"payment_method": "cash"})
+        self.assertNotEqual(response.status_code, 503)
+        self.assertEqual(response.cookies["canteen_wr_pass"].value, "")
+
+    def test_posts_are_shed_with_retry_after_never_queued(self):
+        lease = admission.acquire(self.gate)
+        response = self.client.post("/checkout/", {"payment_method": "cash"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], str(admission.RETRY))
+        self.assertTemplateNotUsed(response, "my_canteen/waiting_room.html")
+        self.assertEqual(admission.stats()["checkout"]["queue_depth"], 0)
+
+        # while someone waits in line, a POST without a pass does not jump the queue
+        self.assertEqual(self.client.get("/checkout/").status_code, 503)
+        admission.release(lease)
+        stranger = self.client_class()
+        stranger.force_login(User.objects.create_user("stu2"))
+        self.assertEqual(stranger.post("/checkout/", {"payment_method": "cash"}).status_code, 503)
+
+    def test_token_bucket_answers_429(self):
+        gate = admission.Gate("cart", concurrency=5, rate=0.01, burst=2)
+        self.assertEqual(admission.take_token(gate, "u1", now=100), (True, 0))
+        self.assertEqual(admission.take_token(gate, "u1", now=100), (True, 0))
+        self.assertEqual(admission.take_token(gate, "u1", now=100), (False, 100))
+        self.assertEqual(admission.take_token(gate, "u2", now=100), (True, 0))
+
+
+
+@FAST_HASHER
+class MetricsTests(CanteenTestCase):
+    def test_requests_are_counted_and_workers_add_up(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(CANTEEN_METRICS_DIR=directory):
+            other = {"counters": [["canteen_orders_created_total", [["method", "cash"]], 5]], "histograms": []}
+            with open(f"{directory}/1-1.json", "w") as fh:
+                json.dump(other, fh)
+            metrics.inc("canteen_orders_created_total", method="cash")
+            self.client.get("/about/")
+            text = self.client.get("/metrics").content.decode()
+
+        self.assertIn('canteen_orders_created_total{method="cash"} ', text)
+        created = next(line for line in text.splitlines() if line.startswith("canteen_orders_created_total{"))
+        self.assertGreaterEqual(float(created.split()[-1]), 6)
+        self.assertIn('canteen_http_request_duration_seconds_bucket{view="about",le="+Inf"}', text)
+        self.assertIn('canteen_open_orders{status="pending"} 0', text)
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 403)
+
+    def test_token_is_required_from_every_address_once_set(self):
+        with self.settings(CANTEEN_METRICS_TOKEN="s3cret"):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)  # 127.0.0.1, e.g. a local proxy
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    def test_finished_threads_fold_into_the_process_totals(self):
+        before = len(metrics._shards)
+        workers = [
+            threading.Thread(target=metrics.inc, args=("canteen_orders_created_total",), kwargs={"method": "thread"})
+            for _ in range(5)
+        ]
+        for worker in workers:
+            worker.start()
+            worker.join()
+        del workers, worker
+        gc.collect()
+        self.assertEqual(len(metrics._shards), before)
+        self.assertEqual(metrics.snapshot()["counters"][("canteen_orders_created_total", (("method", "thread"),))], 5)
+
+
+@FAST_HASHER
+class ProfilingTests(CanteenTestCase):
+    def test_signed_header_profiles_one_request_per_mode(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(CANTEEN_PROFILE_DIR=directory):
+            for mode in profiling.MODES:
+                header = {"HTTP_X_CANTEEN_PROFILE": profiling.make_token(mode)}
+                self.assertEqual(self.client.get("/menu/", **header).status_code, 200)
+            self.client.get("/menu/", HTTP_X_CANTEEN_PROFILE="forged")  # ignored
+            files = sorted(p.suffix for p in Path(directory).iterdir())
+            self.assertEqual(files, [".collapsed", ".pstats"])
+
+            out = io.StringIO()
+            call_command("profile_report", view="menu", role="anon", stdout=out)
+            self.assertIn("cProfile: 1 request(s)", out.getvalue())
+            self.assertIn("menu_page", out.getvalue())
+
+    def test_sampling_rates_are_read_per_request(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(
+            CANTEEN_PROFILE_DIR=directory, CANTEEN_PROFILE_VIEWS="menu:1", CANTEEN_PROFILE_MODE="cprofile"
+        ):
+            self.client.get("/menu/")
+            self.client.get("/about/")
+            self.assertEqual([p.suffix for p in Path(directory).iterdir()], [".pstats"])
+
+
+class SlowQueryLogTests(CanteenTestCase):
+    def test_fingerprint_folds_literals_and_in_lists(self):
+        a = "SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"
+        b = "SELECT  * FROM t WHERE id IN (%s) AND name = 'yy' LIMIT 5"
+        self.assertEqual(querylog.fingerprint(a), querylog.fingerprint(b))
+        self.assertEqual(querylog.normalize(a), "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?")
+
+    def test_slow_queries_are_logged_per_view_and_ranked(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(CANTEEN_SLOW_QUERY_LOG=Path(directory) / "slow.jsonl", CANTEEN_SLOW_QUERY_MS=0), \
+                mock.patch.object(querylog, "_seen", set()):
+            for price in ("10", "25"):
+                self.assertEqual(self.client.get("/menu/", {"min_price": price}).status_code, 200)
+            entries = list(querylog.read(querylog.log_files()))
+            menu = [e for e in entries if e["view"] == "menu" and "price" in e["sql"] and ">= ?" in e["sql"]]
+            # both price filters land on the same fingerprints, one entry per request
+            self.assertTrue(menu)
+            self.assertTrue(all(g["count"] == 2 for g in querylog.rank(menu)))
+            self.assertTrue(any(e.get("plan") for e in menu))  # captured once, first time seen
+            self.assertTrue(any("views.py" in frame for frame in menu[0]["stack"]))
+
+            out = io.StringIO()
+            call_command("slow_queries", view="menu", explain=True, stdout=out)
+            self.assertIn(menu[0]["fingerprint"], out.getvalue())
+            self.assertIn("plan:", out.getvalue())
+
+
+@FAST_HASHER
+class DashboardFragmentTests(CanteenTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_orders(3)
+        Order.objects.update(status="accepted")
+        self.cook = User.objects.create_user("cook", password="x")
+        profile = self.cook.userprofile
+        profile.role = "staff"
+        profile.save()
+        self.client.force_login(self.cook)
+
+    def test_status_click_returns_only_the_row(self):
+        order = Order.objects.order_by("id").first()
+        path = reverse("order_preparing", args=[order.id])
+        response = self.client.post(path, HTTP_X_CANTEEN_FRAGMENT="row")
+        self.assertEqual(response["X-Canteen-Fragment"], "row")
+        self.assertEqual(response["X-Canteen-Message"], f"Order #{order.id} set to Preparing.")
+        self.assertContains(response, f'id="order-{order.id}"', count=1)
+        self.assertContains(response, 'class="status preparing"')
+        self.assertLess(len(response.content), 2000)
+
+        # ready leaves the staff list: the row comes back empty, flagged for removal
+        response = self.client.post(reverse("order_ready", args=[order.id]), HTTP_X_CANTEEN_FRAGMENT="row")
+        self.assertContains(response, f'<tr id="order-{order.id}" data-removed></tr>')
+        # without the header it is still the classic post-redirect
+        self.assertRedirects(self.client.post(path), reverse("dashboard"), fetch_redirect_response=False)
+
+    def test_changes_returns_rows_modified_after_the_cursor(self):
+        cursor = self.client.get(reverse("dashboard")).context["orders_cursor"]
+        order = Order.objects.order_by("id").last()
+        sla.transition(order, "preparing", self.cook)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("dashboard_changes"), {"since": cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'id="order-{order.id}"')
+        self.assertTrue(response["X-Canteen-Cursor"].isdigit())
+        order_queries = [q for q in ctx.captured_queries if 'FROM "my_canteen_order"' in q["sql"]]
+        self.assertEqual(len(order_queries), 1)
+
+        later = views.make_cursor(timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self.client.get(reverse("dashboard_changes"), {"since": later}).status_code, 204)
+        self.assertEqual(self.client.get(reverse("dashboard_changes"), {"since": "soon"}).status_code, 400)
+
+        self.client.force_login(Order.objects.first().user)  # a student
+        self.assertEqual(self.client.get(reverse("dashboard_changes"), {"since": cursor}).status_code, 403)
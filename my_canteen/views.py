@@ -1,9 +1,13 @@
 # my_canteen/views.py
 
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Q, Avg, Count
+from django.db import transaction
+from django.db.models import Q, Max
 from django.contrib import messages
 from django.http import (
     HttpResponseForbidden,
@@ -11,12 +15,15 @@ from django.http import (
     JsonResponse,
     HttpResponse,
 )
+from django.core.paginator import Paginator
 from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.conf import settings
 
 # ✅ Email verification imports
+from django.utils.crypto import constant_time_compare
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.core.mail import send_mail
@@ -25,8 +32,22 @@ from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.contrib.auth import login
 from django.contrib.auth import views as auth_views
 
-from .models import MenuItem, Category, UserProfile, Order, OrderItem, Review, Payment
+from .models import MenuItem, UserProfile, Order, OrderItem, Review, Payment
 from .forms import CustomSignupForm, ReviewForm, CheckoutPaymentForm
+from .cache import (
+    available_stock, catalog_version, category_chips, item_review_summary, popular_items, save_cart,
+    sold_out_items, stock_version,
+)
+from .search import get_index
+from . import catalog_sync
+from .popularity import popular_filter, ranked, record_sale
+from . import forecast
+from . import exports
+from . import stock
+from . import slots
+from . import sla
+from . import eta
+from . import metrics
 
 
 # ========== Email Verification Token ==========
@@ -49,7 +70,8 @@ def send_verification_email(request, user):
 
     subject = "Verify your email - Canteen"
     message = f"Hello {user.username},\n\nPlease verify your account by clicking the link below:\n{verify_url}\n\nThanks!"
-    send_mail(subject, message, None, [user.email])
+    with metrics.timed_email("verification"):
+        send_mail(subject, message, None, [user.email])
 
 
 # ========== Custom Login View ==========
@@ -172,13 +194,71 @@ def can_user_cancel(order, user) -> bool:
     return order.status in {"pending", "accepted"}
 
 
+# ---------- Conditional GET validators ----------
+# Computed without rendering; unchanged pages answer 304 via @condition.
+def _viewer_key(request):
+    """Pages show the navbar (user + cart pill), so validators include both."""
+    return f"{request.user.pk}-{request.session.get('cart_version', 0)}"
+
+
+def menu_etag(request):
+    # cards show availability, which moves with holds and sales but not the catalog version
+    return f"menu-{catalog_version()}-{stock_version()}-{_viewer_key(request)}-{request.GET.urlencode()}"
+
+
+def _item_stamps(request, item_id):
+    if not hasattr(request, "_item_stamps"):
+        row = (
+            MenuItem.objects.filter(id=item_id, is_active=True)
+            .annotate(last_review=Max("reviews__updated_at"))
+            .values_list("updated_at", "last_review")
+            .first()
+        )
+        request._item_stamps = row
+    return request._item_stamps
+
+
+def item_detail_etag(request, item_id):
+    stamps = _item_stamps(request, item_id)
+    if stamps is None:
+        return None
+    updated, last_review = stamps
+    etag = f"item-{item_id}-{updated.timestamp()}-{last_review and last_review.timestamp()}-{_viewer_key(request)}"
+    if request.user.is_authenticated:
+        # can_review flips when one of the user's orders gets delivered
+        last_order = Order.objects.filter(user=request.user).aggregate(m=Max("updated_at"))["m"]
+        etag += f"-{last_order and last_order.timestamp()}"
+    return etag
+
+
+def item_detail_last_modified(request, item_id):
+    stamps = _item_stamps(request, item_id)
+    if stamps is None:
+        return None
+    return max(filter(None, stamps))
+
+
+def catalog_etag(request):
+    return f"catalog-{catalog_sync.current_version()}-{request.GET.get('since', '')}"
+
+
+def order_status_etag(request, order_id):
+    row = (
+        Order.objects.filter(id=order_id, user_id=request.user.pk)
+        .values_list("version", "payment__status", "payment__transaction_id")
+        .first()
+    )
+    # the queue signature moves the tag when the ready-time estimate may have changed
+    return row and "order-{}-{}-{}-{}-{}".format(order_id, *row, eta.get_model().signature)
+
+
 # ---------- Home ----------
 def home(request):
-    popular_items = MenuItem.objects.filter(is_popular=True, is_active=True)[:6]
-    return render(request, "my_canteen/home.html", {"popular_items": popular_items})
+    return render(request, "my_canteen/home.html", {"popular_items": popular_items()})
 
 
 # ---------- Menu ----------
+@condition(etag_func=menu_etag)
 def menu_page(request):
     # query params
     q = request.GET.get('q', '').strip()
@@ -213,18 +293,24 @@ def menu_page(request):
     elif sort == "price_desc":
         items = items.order_by("-price")
     else:
-        items = items.order_by("-is_popular", "name")
+        items = ranked(items)
 
     # all categories for chips
-    categories = Category.objects.all().order_by("name")
+    categories = category_chips()
 
     # simple recommended block (bottom section)
     recommended = (
-        MenuItem.objects.filter(is_active=True, is_popular=True)
+        ranked(MenuItem.objects.filter(popular_filter(), is_active=True))
         .exclude(id__in=items.values_list("id", flat=True)[:12])
         [:6]
     )
 
+    # stock minus checkout holds, from one cached dict instead of per-item queries
+    items, recommended = list(items), list(recommended)
+    available = available_stock()
+    for item in items + recommended:
+        item.in_stock = available.get(item.id, item.stock) > 0
+
     context = {
         "items": items,
         "categories": categories,
@@ -238,15 +324,60 @@ def menu_page(request):
     return render(request, 'my_canteen/menu.html', context)
 
 
+# ---------- Search-as-you-type ----------
+def menu_suggest(request):
+    """JSON suggestions for the menu search box, served from the in-memory prefix index."""
+    started = time.perf_counter()
+    q = request.GET.get("q", "").strip()[:64]
+    results = get_index().suggest(q) if q else []
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for r in results:
+        r["url"] = reverse("item_detail", args=[r["id"]])
+    response = JsonResponse({"q": q, "results": results})
+    response["Server-Timing"] = f"suggest;dur={elapsed_ms:.3f}"
+    response["Cache-Control"] = "public, max-age=60"
+    return response
+
+
+# ---------- Live availability ----------
+def menu_stock(request):
+    """
+    Sold-out item ids for the menu script. Availability is applied in the
+    browser, so pre-rendered and cached menu HTML survives stock changes.
+    """
+    response = JsonResponse({"sold_out": sold_out_items()})
+    response["Cache-Control"] = "public, max-age=5"
+    return response
+
+
+# ---------- Catalog sync API (kiosk / mobile) ----------
+COMPACT_JSON = {"separators": (",", ":")}
+
+
+@condition(etag_func=catalog_etag)
+def catalog_snapshot(request):
+    return JsonResponse(catalog_sync.snapshot(), json_dumps_params=COMPACT_JSON)
+
+
+@condition(etag_func=catalog_etag)
+def catalog_changes(request):
+    try:
+        since = int(request.GET.get("since", ""))
+    except ValueError:
+        return JsonResponse({"error": "since must be a catalog version"}, status=400)
+    return JsonResponse(catalog_sync.changes_since(since), json_dumps_params=COMPACT_JSON)
+
+
 # ---------- Item Detail + Reviews (ফিডব্যাক ও রেটিং সিস্টেম) ----------
+@condition(etag_func=item_detail_etag, last_modified_func=item_detail_last_modified)
 def item_detail(request, item_id):
     item = get_object_or_404(MenuItem, id=item_id, is_active=True)
 
     # ✅ এই আইটেমের সব রিভিউ এবং গড় রেটিং লোড করুন
     reviews = Review.objects.filter(item=item).select_related("user").order_by("-created_at")
-    agg = reviews.aggregate(avg=Avg("rating"), cnt=Count("id"))
-    avg_rating = round(agg["avg"] or 0, 1)
-    total_reviews = agg["cnt"] or 0
+    summary = item_review_summary(item.id)
+    avg_rating = summary["avg"]
+    total_reviews = summary["cnt"]
 
     can_review, already, form = False, False, None
     
@@ -357,7 +488,7 @@ def delete_review(request, item_id):
 def add_to_cart(request, item_id):
     cart = request.session.get("cart", {})
     cart[str(item_id)] = cart.get(str(item_id), 0) + 1
-    request.session["cart"] = cart
+    save_cart(request, cart)
     messages.success(request, "Item added to cart!")
     return redirect("menu")
 
@@ -367,7 +498,7 @@ def add_to_cart_qty(request, item_id, qty):
     qty = max(int(qty), 1)
     cart = request.session.get("cart", {})
     cart[str(item_id)] = cart.get(str(item_id), 0) + qty
-    request.session["cart"] = cart
+    save_cart(request, cart)
     messages.success(request, f"Added {qty} item(s) to cart.")
     return redirect("menu")
 
@@ -376,7 +507,7 @@ def add_to_cart_qty(request, item_id, qty):
 def remove_from_cart(request, item_id):
     cart = request.session.get("cart", {})
     cart.pop(str(item_id), None)
-    request.session["cart"] = cart
+    save_cart(request, cart)
     messages.info(request, "Item removed from cart.")
     return redirect("cart")
 
@@ -386,7 +517,7 @@ def increase_cart_qty(request, item_id):
     cart = request.session.get("cart", {})
     if str(item_id) in cart:
         cart[str(item_id)] += 1
-    request.session["cart"] = cart
+    save_cart(request, cart)
     return redirect("cart")
 
 
@@ -397,7 +528,7 @@ def decrease_cart_qty(request, item_id):
         cart[str(item_id)] -= 1
         if cart[str(item_id)] <= 0:
             cart.pop(str(item_id))
-    request.session["cart"] = cart
+    save_cart(request, cart)
     return redirect("cart")
 
 
@@ -410,7 +541,7 @@ def update_cart(request, item_id):
             cart[str(item_id)] = qty
         else:
             cart.pop(str(item_id), None)
-        request.session["cart"] = cart
+        save_cart(request, cart)
         messages.success(request, "Cart updated successfully!")
     return redirect("cart")
 
@@ -440,38 +571,69 @@ def checkout(request):
         messages.error(request, "Your cart is empty!")
         return redirect("menu")
 
+    held_until = None
+    if request.method != "POST":
+        # hold the cart while the user fills in payment; the POST converts the holds
+        try:
+            held_until = stock.reserve(request.user, cart)
+        except stock.OutOfStock as exc:
+            messages.error(request, f"{exc.name} is out of stock!")
+            return redirect("cart")
+
     total = 0
     cart_items = []
     for item_id, qty in cart.items():
         item = get_object_or_404(MenuItem, id=item_id, is_active=True)
-        if item.stock < qty:
-            messages.error(request, f"{item.name} is out of stock!")
-            return redirect("cart")
         subtotal = float(item.price) * qty
         cart_items.append({"item": item, "qty": qty, "subtotal": subtotal})
         total += subtotal
 
+    item_count, items_summary = Order.summarize([(row["item"].name, row["qty"]) for row in cart_items])
+
+    # pickup slots with room for this cart, from the cached slot table
+    prep_units = slots.units_for(cart)
+    open_slots = slots.open_slots(prep_units)
+    if not open_slots:
+        messages.warning(request, "No pickup slots left today. Please try again later.")
+
     if request.method == "POST":
-        form = CheckoutPaymentForm(request.POST)
+        form = CheckoutPaymentForm(request.POST, slots=open_slots)
         if form.is_valid():
             method = form.cleaned_data["payment_method"]
 
-            order = Order.objects.create(
-                user=request.user,
-                total_price=total,
-                address="Default Address",
-                status="pending",
-                payment_status="unpaid",
-                payment_method=method,
-            )
-
-            for item_id, qty in cart.items():
-                item = get_object_or_404(MenuItem, id=item_id)
-                item.stock -= qty
-                item.save()
-                OrderItem.objects.create(
-                    order=order, item=item, quantity=qty, unit_price=item.price
-                )
+            try:
+                with transaction.atomic():
+                    # conditional increment on the slot's counter row; full -> nothing is written
+                    slots.book(form.cleaned_data["pickup_slot"], prep_units)
+                    order = Order.objects.create(
+                        user=request.user,
+                        total_price=total,
+                        address="Default Address",
+                        status="pending",
+                        payment_status="unpaid",
+                        payment_method=method,
+                        pickup_slot_id=form.cleaned_data["pickup_slot"],
+                        prep_units=prep_units,
+                        # list pages render these instead of joining lines / users
+                        item_count=item_count,
+                        items_summary=items_summary,
+                        customer_name=request.user.username,
+                    )
+                    OrderItem.objects.bulk_create(
+                        OrderItem(order=order, item=row["item"], quantity=row["qty"], unit_price=row["item"].price)
+                        for row in cart_items
+                    )
+                    # conditional decrements + ledger rows; rolls the order back if anything ran out
+                    stock.take(cart, order=order, user=request.user)
+                    sla.record(order, "", "pending", request.user)
+            except stock.OutOfStock as exc:
+                messages.error(request, f"{exc.name} is out of stock!")
+                return redirect("cart")
+            except slots.SlotFull:
+                messages.error(request, "That pickup time just filled up. Please pick another.")
+                return redirect("checkout")
+            catalog_sync.record_bulk(cart.keys(), stock_only=True)  # update() skips post_save
+            record_sale(cart)
 
             payment = Payment.objects.create(
                 order=order, method=method, amount=order.total_price, status="pending"
@@ -484,7 +646,7 @@ def checkout(request):
                 payment.save()
                 order.payment_status = "paid"
                 order.save()
-                request.session["cart"] = {}
+                save_cart(request, {})
                 messages.success(
                     request, f"Order placed successfully! Total: {total} Tk (Cash)"
                 )
@@ -497,19 +659,19 @@ def checkout(request):
                 payment.save()
                 order.payment_status = "paid"
                 order.save()
-                request.session["cart"] = {}
+                save_cart(request, {})
                 messages.success(request, f"Payment successful! Order #{order.id}")
                 return redirect("payment_success")
 
-            request.session["cart"] = {}
+            save_cart(request, {})
             return redirect("payment_start", order_id=order.id)
     else:
-        form = CheckoutPaymentForm()
+        form = CheckoutPaymentForm(slots=open_slots)
 
     return render(
         request,
         "my_canteen/checkout.html",
-        {"items": cart_items, "total": total, "form": form},
+        {"items": cart_items, "total": total, "form": form, "held_until": held_until},
     )
 
 
@@ -574,6 +736,8 @@ def sslcommerz_ipn(request):
     return HttpResponse(status=200)
 
 
+@login_required
+@condition(etag_func=order_status_etag)
 def order_status_api(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     data = {
@@ -582,7 +746,13 @@ def order_status_api(request, order_id):
         "transaction_id": getattr(order.payment, "transaction_id", None),
         "order_status": order.status,
     }
-    return JsonResponse(data)
+    ready_at, retry_after = eta.for_order(order)
+    data["estimated_ready_at"] = ready_at and ready_at.isoformat()
+    data["retry_after"] = retry_after
+    response = JsonResponse(data)
+    if retry_after:
+        response["Retry-After"] = str(retry_after)
+    return response
 
 
 # ---------- Orders list page ----------
@@ -591,6 +761,15 @@ def orders_page(request):
     profile = UserProfile.objects.select_related("user").get(user=request.user)
     role = get_role(request.user)
 
+    # "older orders": the user's own archived history, a page at a time
+    if request.GET.get("older"):
+        page = Paginator(Order.history.for_user(request.user, archived=True), 50).get_page(request.GET.get("page"))
+        return render(
+            request,
+            "my_canteen/orders.html",
+            {"orders": page, "page": page, "profile": profile, "cancelable_ids": set(), "older": True},
+        )
+
     if role in ["vendor", "admin"]:
         orders = Order.objects.all().order_by("-created_at")
     elif role == "staff":
@@ -598,7 +777,7 @@ def orders_page(request):
             status__in=["accepted", "preparing"]
         ).order_by("-created_at")
     else:
-        orders = Order.objects.filter(user=request.user).order_by("-created_at")
+        orders = Order.history.for_user(request.user)
 
     # smart cancel: যে অর্ডারগুলো end-user ক্যানসেল করতে পারবে
     cancelable_ids = {o.id for o in orders if can_user_cancel(o, request.user)}
@@ -640,13 +819,14 @@ def dashboard(request):
     effective_role = get_effective_role(real_role)
 
     # ডেটা লোডিং effective_role দিয়ে
+    forecast_date, forecasts, kitchen_sla = None, [], None
     if effective_role in ["admin", "vendor"]:
-        orders = Order.objects.all().order_by("-created_at")
+        orders = slots.by_slot(Order.objects.all())  # open orders by pickup time
         items = MenuItem.objects.all()
+        forecast_date, forecasts = forecast.upcoming()
+        kitchen_sla = sla.summary()  # today's hourly rollups, one query
     elif effective_role == "staff":
-        orders = Order.objects.filter(
-            status__in=["accepted", "preparing"]
-        ).order_by("-created_at")
+        orders = slots.by_slot(Order.objects.filter(status__in=KITCHEN_SCOPES["staff"]))
         items = None
     else:
         orders = Order.objects.filter(user=request.user).order_by("-created_at")
@@ -673,10 +853,92 @@ def dashboard(request):
         "real_role": real_role,
         "effective_role": effective_role,
         "dashboard_title": dashboard_title,
+        "forecast_date": forecast_date,
+        "forecasts": forecasts,
+        "kitchen_sla": kitchen_sla,
+        "orders_cursor": make_cursor(timezone.now()),
+        "poll_seconds": DASHBOARD_POLL_SECONDS,
     }
     return render(request, template_name, ctx)
 
 
+# ---------- Dashboard live updates ----------
+# effective role -> statuses its order table lists (None: every order)
+KITCHEN_SCOPES = {"admin": None, "vendor": None, "staff": ("accepted", "preparing")}
+FRAGMENT_HEADER = "X-Canteen-Fragment"
+DASHBOARD_POLL_SECONDS = 10
+CHANGES_OVERLAP = timedelta(seconds=2)  # re-send recent rows: a slow commit may carry an older updated_at
+CHANGES_LIMIT = 200                     # more than this and the client just reloads
+ROW_FIELDS = (
+    "id", "status", "payment_status", "total_price", "customer_name", "items_summary",
+    "updated_at", "pickup_slot__starts_at",
+)
+
+
+def make_cursor(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def parse_cursor(value):
+    return datetime.fromtimestamp(int(value) / 1_000_000, tz=dt_timezone.utc)
+
+
+def order_rows(request, effective_role, orders):
+    """
+    ``<tr id="order-N">`` rows of the role's dashboard table for ``orders``;
+    orders that dropped out of the role's list come back as empty
+    ``data-removed`` rows so the page deletes them.
+    """
+    statuses = KITCHEN_SCOPES[effective_role]
+    shown = [o for o in orders if statuses is None or o.status in statuses]
+    return render(request, "my_canteen/dashboard/_order_rows.html", {
+        "orders": shown,
+        "removed": [o.id for o in orders if statuses is not None and o.status not in statuses],
+        "row_template": f"my_canteen/dashboard/_order_row_{effective_role}.html",
+    })
+
+
+@login_required
+def dashboard_changes(request):
+    """
+    Rows of orders changed since ``?since=<cursor>`` (one range scan on the
+    ``updated_at`` index); 204 when nothing did. The next cursor comes back in
+    ``X-Canteen-Cursor``.
+    """
+    effective_role = get_effective_role(get_role(request.user))
+    if effective_role not in KITCHEN_SCOPES:
+        return HttpResponseForbidden("Not allowed")
+    try:
+        since = parse_cursor(request.GET["since"])
+    except (KeyError, ValueError, OverflowError):
+        return HttpResponse("since must be a cursor from the dashboard", status=400)
+    cursor = make_cursor(timezone.now())
+    changed = list(
+        Order.objects.filter(updated_at__gt=since - CHANGES_OVERLAP)
+        .select_related("pickup_slot").only(*ROW_FIELDS).order_by("updated_at")[:CHANGES_LIMIT + 1]
+    )
+    if len(changed) > CHANGES_LIMIT:
+        response = HttpResponse(status=205)
+    elif not changed:
+        response = HttpResponse(status=204)
+    else:
+        response = order_rows(request, effective_role, changed)
+    response["X-Canteen-Cursor"] = cursor
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+def lifecycle_done(request, order, level, text):
+    """Plain form posts go back to the dashboard; the dashboard's fetches get the order's new row."""
+    if request.headers.get(FRAGMENT_HEADER) != "row":
+        getattr(messages, level)(request, text)
+        return redirect("dashboard")
+    response = order_rows(request, get_effective_role(get_role(request.user)), [order])
+    response[FRAGMENT_HEADER] = "row"
+    response["X-Canteen-Message"] = text
+    return response
+
+
 # ---------- Optional vendor-only view (unused) ----------
 @login_required
 def vendor_dashboard(request):
@@ -708,17 +970,56 @@ def settings_page(request):
     return render(request, "my_canteen/settings.html", {"profile": profile})
 
 
+# ---------- Metrics ----------
+def metrics_view(request):
+    """
+    Prometheus text exposition. With ``CANTEEN_METRICS_TOKEN`` set the bearer
+    token is required from everyone: behind a reverse proxy on the same host
+    every request arrives from 127.0.0.1. Without one, INTERNAL_IPS only.
+    """
+    token = settings.CANTEEN_METRICS_TOKEN
+    if token:
+        allowed = constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    else:
+        allowed = request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
+    if not allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ---------- Data exports (admin) ----------
+@login_required
+def export_data(request, dataset):
+    """
+    Streams orders / order_items / payments as CSV or JSONL.
+    ?format=csv|jsonl&from=YYYY-MM-DD&to=YYYY-MM-DD&status=...&method=...
+    """
+    if not (request.user.is_staff or require_roles(request.user, ["admin", "vendor"])):
+        return HttpResponseForbidden("Not allowed")
+    fmt = request.GET.get("format", "csv")
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        return HttpResponse("Unknown dataset or format", status=400)
+    try:
+        date_from = date.fromisoformat(request.GET["from"]) if request.GET.get("from") else None
+        date_to = date.fromisoformat(request.GET["to"]) if request.GET.get("to") else None
+    except ValueError:
+        return HttpResponse("Dates must be YYYY-MM-DD", status=400)
+    queryset = exports.filtered(
+        dataset, date_from=date_from, date_to=date_to,
+        status=request.GET.get("status") or None, method=request.GET.get("method") or None,
+    )
+    return exports.streaming_response(dataset, fmt, queryset)
+
+
 # ---------- Order lifecycle (vendor & admin) ----------
 @login_required
 def order_accept(request, order_id):
     if not require_roles(request.user, ["vendor", "admin"]):
         messages.error(request, "Not authorized.")
         return redirect("dashboard")
-    order = get_object_or_404(Order, id=order_id)
-    order.status = "accepted"
-    order.save()
-    messages.success(request, f"Order #{order.id} accepted.")
-    return redirect("dashboard")
+    order = get_object_or_404(Order.objects.select_related("pickup_slot"), id=order_id)
+    sla.transition(order, "accepted", request.user)
+    return lifecycle_done(request, order, "success", f"Order #{order.id} accepted.")
 
 
 @login_required
@@ -726,11 +1027,9 @@ def order_preparing(request, order_id):
     if not require_roles(request.user, ["vendor", "admin", "staff"]):
         messages.error(request, "Not authorized.")
         return redirect("dashboard")
-    order = get_object_or_404(Order, id=order_id)
-    order.status = "preparing"
-    order.save()
-    messages.success(request, f"Order #{order.id} set to Preparing.")
-    return redirect("dashboard")
+    order = get_object_or_404(Order.objects.select_related("pickup_slot"), id=order_id)
+    sla.transition(order, "preparing", request.user)
+    return lifecycle_done(request, order, "success", f"Order #{order.id} set to Preparing.")
 
 
 @login_required
@@ -738,11 +1037,9 @@ def order_ready(request, order_id):
     if not require_roles(request.user, ["vendor", "admin", "staff"]):
         messages.error(request, "Not authorized.")
         return redirect("dashboard")
-    order = get_object_or_404(Order, id=order_id)
-    order.status = "ready"
-    order.save()
-    messages.success(request, f"Order #{order.id} marked Ready.")
-    return redirect("dashboard")
+    order = get_object_or_404(Order.objects.select_related("pickup_slot"), id=order_id)
+    sla.transition(order, "ready", request.user)
+    return lifecycle_done(request, order, "success", f"Order #{order.id} marked Ready.")
 
 
 @login_required
@@ -750,11 +1047,9 @@ def order_delivered(request, order_id):
     if not require_roles(request.user, ["vendor", "admin"]):
         messages.error(request, "Not authorized.")
         return redirect("dashboard")
-    order = get_object_or_404(Order, id=order_id)
-    order.status = "delivered"
-    order.save()
-    messages.success(request, f"Order #{order.id} marked Delivered.")
-    return redirect("dashboard")
+    order = get_object_or_404(Order.objects.select_related("pickup_slot"), id=order_id)
+    sla.transition(order, "delivered", request.user)
+    return lifecycle_done(request, order, "success", f"Order #{order.id} marked Delivered.")
 
 
 @login_required
@@ -762,14 +1057,11 @@ def order_completed(request, order_id):
     if not require_roles(request.user, ["vendor", "admin"]):
         messages.error(request, "Not authorized.")
         return redirect("dashboard")
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.select_related("pickup_slot"), id=order_id)
     if order.payment_status != "paid":
-        messages.warning(request, "Mark as Paid before completing.")
-        return redirect("dashboard")
-    order.status = "completed"
-    order.save()
-    messages.success(request, f"Order #{order.id} Completed.")
-    return redirect("dashboard")
+        return lifecycle_done(request, order, "warning", "Mark as Paid before completing.")
+    sla.transition(order, "completed", request.user)
+    return lifecycle_done(request, order, "success", f"Order #{order.id} Completed.")
 
 
 @login_required
@@ -777,11 +1069,11 @@ def order_cancel(request, order_id):
     if not require_roles(request.user, ["vendor", "admin"]):
         messages.error(request, "Not authorized.")
         return redirect("dashboard")
-    order = get_object_or_404(Order, id=order_id)
-    order.status = "cancelled"
-    order.save()
-    messages.info(request, f"Order #{order.id} Cancelled.")
-    return redirect("dashboard")
+    order = get_object_or_404(Order.objects.select_related("pickup_slot"), id=order_id)
+    if order.status != "cancelled":
+        slots.release(order)
+    sla.transition(order, "cancelled", request.user)
+    return lifecycle_done(request, order, "info", f"Order #{order.id} Cancelled.")
 
 
 @login_required
@@ -789,11 +1081,10 @@ def order_mark_paid(request, order_id):
     if not require_roles(request.user, ["vendor", "admin"]):
         messages.error(request, "Not authorized.")
         return redirect("dashboard")
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.select_related("pickup_slot"), id=order_id)
     order.payment_status = "paid"
-    order.save()
-    messages.success(request, f"Order #{order.id} marked as PAID.")
-    return redirect("dashboard")
+    order.save(update_fields=["payment_status"])
+    return lifecycle_done(request, order, "success", f"Order #{order.id} marked as PAID.")
 
 
 # ---------- End-user Smart Cancel ----------
@@ -810,13 +1101,13 @@ def user_order_cancel(request, order_id):
         return redirect("orders")
 
     # স্টক ফেরত দাও
-    for oi in OrderItem.objects.filter(order=order).select_related("item"):
-        oi.item.stock += oi.quantity
-        oi.item.save(update_fields=["stock"])
+    lines = dict(OrderItem.objects.filter(order=order).values_list("item_id", "quantity"))
+    stock.give(lines, kind="cancel", order=order, user=request.user)
+    catalog_sync.record_bulk(lines, stock_only=True)
 
     # অর্ডারের স্ট্যাটাস আপডেট
-    order.status = "cancelled"
-    order.save(update_fields=["status"])
+    sla.transition(order, "cancelled", request.user)
+    slots.release(order)
 
     messages.success(request, f"Order #{order.id} cancelled successfully.")
     return redirect("orders")
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Environment driven database profiles for mysite.
+
+CANTEEN_DB_ENGINE selects the backend:
+
+- ``sqlite`` (default): a SQLite file tuned for concurrent web traffic
+  (WAL journal, relaxed fsync, busy timeout, mmap + page cache) and
+  ``BEGIN IMMEDIATE`` transactions so writers queue on the busy timeout
+  instead of failing with ``database is locked`` on lock upgrade.
+- ``postgres``: PostgreSQL through psycopg 3 with a server-side connection
+  pool. Neither is in requirements.txt (SQLite needs no driver); install
+  ``psycopg[binary,pool]`` or set CANTEEN_PG_POOL=0 to go without the pool.
+
+Read replicas come from CANTEEN_DB_REPLICAS (comma separated SQLite paths) or
+CANTEEN_PG_REPLICA_HOSTS (comma separated hosts sharing the primary's
+credentials) and are exposed as ``replica1``, ``replica2``, ... for
+``my_canteen.routers.PrimaryReplicaRouter``.
+
+All knobs are plain environment variables so the same settings file works
+for development, the benchmarks in ``benchmarks/`` and production.
+"""
+
+import os
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def sqlite_pragmas():
+    """PRAGMAs applied on every new SQLite connection (``init_command``)."""
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={env_int('CANTEEN_SQLITE_BUSY_TIMEOUT_MS', 5000)}",
+        f"PRAGMA mmap_size={env_int('CANTEEN_SQLITE_MMAP_SIZE', 128 * 1024 * 1024)}",
+        # negative cache_size = KiB instead of pages
+        f"PRAGMA cache_size=-{env_int('CANTEEN_SQLITE_CACHE_KB', 20000)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def sqlite_database(name, tuned=True):
+    options = {}
+    if tuned:
+        options = {
+            "init_command": ";".join(sqlite_pragmas()),
+            "transaction_mode": "IMMEDIATE",
+            # python sqlite3 busy handler (seconds); mirrors busy_timeout
+            "timeout": env_int("CANTEEN_SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000,
+        }
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": name,
+        "OPTIONS": options,
+        "CONN_MAX_AGE": env_int("CANTEEN_CONN_MAX_AGE", 600),
+        "CONN_HEALTH_CHECKS": True,
+    }
+
+
+def postgres_database():
+    use_pool = env_bool("CANTEEN_PG_POOL", True)
+    if find_spec("psycopg") is None or (use_pool and find_spec("psycopg_pool") is None):
+        raise ImproperlyConfigured(
+            "CANTEEN_DB_ENGINE=postgres needs psycopg 3 and, unless CANTEEN_PG_POOL=0, psycopg_pool: "
+            "pip install 'psycopg[binary,pool]'"
+        )
+    pool = {
+        "min_size": env_int("CANTEEN_PG_POOL_MIN", 2),
+        "max_size": env_int("CANTEEN_PG_POOL_MAX", 20),
+        "timeout": env_int("CANTEEN_PG_POOL_TIMEOUT", 10),
+    }
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("CANTEEN_PG_NAME", "canteen"),
+        "USER": os.environ.get("CANTEEN_PG_USER", "canteen"),
+        "PASSWORD": os.environ.get("CANTEEN_PG_PASSWORD", ""),
+        "HOST": os.environ.get("CANTEEN_PG_HOST", "localhost"),
+        "PORT": os.environ.get("CANTEEN_PG_PORT", "5432"),
+        # The pool owns connection lifetime; Django refuses CONN_MAX_AGE != 0 with a pool.
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"pool": pool} if use_pool else {},
+    }
+
+
+def replica_databases(primary):
+    """Replica aliases mirroring ``primary`` (tests run everything on default)."""
+    if primary["ENGINE"].endswith("postgresql"):
+        hosts = os.environ.get("CANTEEN_PG_REPLICA_HOSTS", "")
+        targets = [{**primary, "HOST": h.strip()} for h in hosts.split(",") if h.strip()]
+    else:
+        paths = os.environ.get("CANTEEN_DB_REPLICAS", "")
+        tuned = env_bool("CANTEEN_SQLITE_TUNING", True)
+        targets = [sqlite_database(p.strip(), tuned=tuned) for p in paths.split(",") if p.strip()]
+
+    replicas = {}
+    for idx, db in enumerate(targets, start=1):
+        db["TEST"] = {"MIRROR": "default"}
+        replicas[f"replica{idx}"] = db
+    return replicas
+
+
+def database_from_env(base_dir):
+    engine = os.environ.get("CANTEEN_DB_ENGINE", "sqlite").lower()
+    if engine in {"postgres", "postgresql"}:
+        return postgres_database()
+    name = os.environ.get("CANTEEN_DB_NAME") or base_dir / "db.sqlite3"
+    return sqlite_database(name, tuned=env_bool("CANTEEN_SQLITE_TUNING", True))
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_from_env, env_int, replica_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,28 +44,43 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'my_canteen.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'my_canteen.middleware.PrerenderedPageMiddleware',
+    'my_canteen.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'my_canteen.middleware.AdmissionControlMiddleware',
+    'my_canteen.middleware.SlowQueryMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'my_canteen.middleware.ProfilingMiddleware',  # keep last: it calls the view
 ]
 
 ROOT_URLCONF = 'mysite.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # compiled templates are kept in memory outside of development
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'my_canteen.context_processors.cart_count',
+                'my_canteen.context_processors.fragment_keys',
             ],
         },
     },
@@ -73,15 +91,116 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Profile is picked from CANTEEN_DB_* environment variables (see mysite/database.py).
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': database_from_env(BASE_DIR),
+}
+DATABASES.update(replica_databases(DATABASES['default']))
+
+# Reads of canteen models go to replicas; writes (and reads right after them) stay on default.
+DATABASE_ROUTERS = ['my_canteen.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = env_int('CANTEEN_REPLICA_PIN_SECONDS', 5)
+
+
+# Cache
+# Shared tier of my_canteen.cache.TieredCache. File based by default so every
+# worker on the box shares it; CANTEEN_MEMCACHED=host:port switches to memcached.
+
+if os.environ.get('CANTEEN_MEMCACHED'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['CANTEEN_MEMCACHED'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CANTEEN_CACHE_DIR', BASE_DIR / '.cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
     }
+
+# {% cache %} fragments (navbar, profile cards, menu cards) are small and read
+# hundreds of times per page, so they live in process memory.
+CACHES['template_fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'canteen-fragments',
+    'TIMEOUT': 600,
+    'OPTIONS': {'MAX_ENTRIES': 5000},
+}
+
+# Entries kept in each process' in-memory LRU in front of CACHES['default'].
+CANTEEN_LOCAL_CACHE_SIZE = env_int('CANTEEN_LOCAL_CACHE_SIZE', 1024)
+
+
+# Pre-rendered anonymous home/menu pages (python manage.py publish_static).
+PRERENDER_ROOT = os.environ.get('CANTEEN_PRERENDER_ROOT', BASE_DIR / 'prerendered')
+PRERENDER_AUTO_PUBLISH = True
+PRERENDER_DEBOUNCE_SECONDS = 2
+
+
+# How long opening checkout holds the cart's stock (my_canteen/stock.py);
+# run manage.py sweep_reservations every minute to release expired holds.
+CANTEEN_RESERVATION_SECONDS = env_int('CANTEEN_RESERVATION_SECONDS', 600)
+
+
+# Pickup slots (my_canteen/slots.py): slot length, default kitchen capacity per
+# slot in prep units, local opening hours and the earliest bookable lead time.
+CANTEEN_SLOT_MINUTES = env_int('CANTEEN_SLOT_MINUTES', 10)
+CANTEEN_SLOT_CAPACITY = env_int('CANTEEN_SLOT_CAPACITY', 30)
+CANTEEN_PICKUP_HOURS = (env_int('CANTEEN_PICKUP_OPEN', 8), env_int('CANTEEN_PICKUP_CLOSE', 20))
+CANTEEN_PICKUP_LEAD_MINUTES = env_int('CANTEEN_PICKUP_LEAD_MINUTES', 10)
+
+
+# Completed / cancelled orders older than this move to the archive tables
+# (python manage.py archive_orders, see my_canteen/archive.py).
+CANTEEN_ARCHIVE_AFTER_DAYS = env_int('CANTEEN_ARCHIVE_AFTER_DAYS', 90)
+
+
+# order_status_api ready-time estimates (my_canteen/eta.py): how often each
+# process re-reads the open queue, and how many orders the kitchen cooks at once.
+CANTEEN_ETA_REFRESH_SECONDS = env_int('CANTEEN_ETA_REFRESH_SECONDS', 5)
+CANTEEN_KITCHEN_PARALLEL = env_int('CANTEEN_KITCHEN_PARALLEL', 3)
+
+
+# Admission control for checkout / add to cart (my_canteen/admission.py): leases
+# in flight per gate, per-user token bucket (requests per second, burst), and
+# whether a full gate sends people to the waiting room instead of a 503.
+CANTEEN_ADMISSION = {
+    'checkout': {
+        'concurrency': env_int('CANTEEN_CHECKOUT_CONCURRENCY', 4), 'rate': 0.5, 'burst': 3, 'queue': True,
+    },
+    'cart': {'concurrency': env_int('CANTEEN_CART_CONCURRENCY', 16), 'rate': 5, 'burst': 10},
 }
 
 
+# /metrics (my_canteen/metrics.py). With several worker processes point this at a
+# directory they share so a scrape sees all of them. Once CANTEEN_METRICS_TOKEN is
+# set every scrape needs "Authorization: Bearer <token>" (set it whenever a proxy runs
+# on the same host); without a token, scrapes are allowed from INTERNAL_IPS only.
+CANTEEN_METRICS_DIR = os.environ.get('CANTEEN_METRICS_DIR') or None
+CANTEEN_METRICS_TOKEN = os.environ.get('CANTEEN_METRICS_TOKEN', '')
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
+
+# On-demand profiling (my_canteen/profiling.py): "url_name:rate,..." views to
+# sample without a header, the default mode (sample | cprofile) and where the
+# profiles go. Read them with python manage.py profile_report.
+CANTEEN_PROFILE_VIEWS = os.environ.get('CANTEEN_PROFILE_VIEWS', '')
+CANTEEN_PROFILE_MODE = os.environ.get('CANTEEN_PROFILE_MODE', 'sample')
+CANTEEN_PROFILE_INTERVAL_MS = env_int('CANTEEN_PROFILE_INTERVAL_MS', 5)
+CANTEEN_PROFILE_DIR = os.environ.get('CANTEEN_PROFILE_DIR', BASE_DIR / 'profiles')
+
+
+# Slow query log (my_canteen/querylog.py): statements slower than this go to a
+# rotating JSONL file; python manage.py slow_queries ranks them.
+CANTEEN_SLOW_QUERY_MS = env_int('CANTEEN_SLOW_QUERY_MS', 100)
+CANTEEN_SLOW_QUERY_LOG = os.environ.get('CANTEEN_SLOW_QUERY_LOG', BASE_DIR / 'logs' / 'slow_queries.jsonl')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -116,7 +235,6 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
-import os
 STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [
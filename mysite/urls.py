@@ -14,6 +14,12 @@ urlpatterns = [
     # Core
     path('', views.home, name='home'),
     path('menu/', views.menu_page, name='menu'),
+    path('menu/suggest/', views.menu_suggest, name='menu_suggest'),
+    path('menu/stock/', views.menu_stock, name='menu_stock'),
+
+    # Catalog delta sync (kiosk / mobile clients)
+    path('api/catalog/', views.catalog_snapshot, name='catalog_snapshot'),
+    path('api/catalog/changes/', views.catalog_changes, name='catalog_changes'),
 
     # --- Item detail + feedback (ফিডব্যাক ও রেটিং সিস্টেম) ---
     # ✅ এই URL-টি একটি আইটেমের বিস্তারিত পাতা দেখায় (যেখানে রিভিউগুলো লিস্ট করা থাকে)
@@ -62,6 +68,9 @@ urlpatterns = [
     # (optional) Real-time status polling
     path('orders/<int:order_id>/status/', views.order_status_api, name='order_status_api'),
 
+    # Prometheus scrape target
+    path('metrics', views.metrics_view, name='metrics'),
+
     # About/Contact -> home anchors
     path('about/', views.about_anchor, name='about'),
     path('contact/', views.contact_anchor, name='contact'),
@@ -77,6 +86,8 @@ urlpatterns = [
 
     # Dashboard & profile
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/changes/', views.dashboard_changes, name='dashboard_changes'),
+    path('exports/<str:dataset>/', views.export_data, name='export_data'),
     path('profile/', views.profile_page, name='profile'),
     path('settings/', views.settings_page, name='settings'),
 